@@ -1,25 +1,86 @@
-import binaryninja as bn
-from .riscv import *
-from .calling_conventions import RiscVWithFloats, RiscVWithoutFloats
-
-variants = [
-    (RiscV32, "riscv32"), (RiscV32F, "riscv32f"), (RiscV32D, "riscv32d"), (RiscV32Q, "riscv32q"),
-    (RiscV64, "riscv64"), (RiscV64F, "riscv64f"), (RiscV64D, "riscv64d"), (RiscV64Q, "riscv64q"),
-    (RiscV128, "riscv128"), (RiscV128F, "riscv128f"), (RiscV128D, "riscv128d"), (RiscV128Q, "riscv128q"),
-]
-
-DEFAULT_VARIANT = "riscv32"
-
-for (Risc, name) in variants:
-    Risc.register()
-    riscv = bn.architecture.Architecture[name]
-    if name[-1] not in ["f", "d", "q"]:
-        riscv.register_calling_convention(RiscVWithoutFloats(riscv, 'default'))
-    else:
-        riscv.register_calling_convention(RiscVWithFloats(riscv, 'default'))
-    riscv.standalone_platform.default_calling_convention = riscv.calling_conventions['default']
-
-    if name == DEFAULT_VARIANT:
-        bn.binaryview.BinaryViewType['ELF'].register_arch(
-            243, bn.enums.Endianness.LittleEndian, riscv
-        )
\ No newline at end of file
+import atexit
+import json
+import logging
+
+try:
+    import binaryninja as bn
+except ImportError:
+    # Imported outside of Binary Ninja, e.g. `python -m` for the headless
+    # disassembler. Only the pure decoder modules are usable then.
+    bn = None
+
+
+class BinjaLogHandler(logging.Handler):
+    def emit(self, record):
+        msg = self.format(record)
+        if record.levelno >= logging.ERROR:
+            bn.log.log_error(msg)
+        elif record.levelno >= logging.WARNING:
+            bn.log.log_warn(msg)
+        elif record.levelno >= logging.INFO:
+            bn.log.log_info(msg)
+        else:
+            bn.log.log_debug(msg)
+
+
+if bn is not None:
+    from .riscv import *
+    from .calling_conventions import RiscVWithFloats, RiscVWithoutFloats
+    from . import instrument
+    from .elf import elf_isa
+    from .recognizer import RiscVJumpTableRecognizer
+
+    logger = logging.getLogger(__name__)
+    logger.addHandler(BinjaLogHandler())
+    logger.setLevel(logging.DEBUG)
+    logger.propagate = False
+
+    settings = bn.Settings()
+    settings.register_group("riscv", "RISC-V")
+    settings.register_setting("riscv.instrumentation", json.dumps({
+        "title": "Instrument the RISC-V plugin",
+        "description": "Record call counts, latencies and decode statistics of the "
+                       f"architecture callbacks. Same as setting {instrument.ENV_VAR}=1, "
+                       "takes effect on restart.",
+        "type": "boolean",
+        "default": False,
+    }))
+    if instrument.enabled(settings.get_bool("riscv.instrumentation")):
+        instrument.instrument(RiscV32)
+        atexit.register(instrument.report)
+
+    variants = [
+        (RiscV32, "riscv32"), (RiscV32F, "riscv32f"), (RiscV32D, "riscv32d"), (RiscV32Q, "riscv32q"),
+        (RiscV64, "riscv64"), (RiscV64F, "riscv64f"), (RiscV64D, "riscv64d"), (RiscV64Q, "riscv64q"),
+        (RiscV128, "riscv128"), (RiscV128F, "riscv128f"), (RiscV128D, "riscv128d"), (RiscV128Q, "riscv128q"),
+    ]
+
+    DEFAULT_VARIANT = "riscv32"
+
+    for (Risc, name) in variants:
+        Risc.register()
+        riscv = bn.architecture.Architecture[name]
+        if name[-1] not in ["f", "d", "q"]:
+            riscv.register_calling_convention(RiscVWithoutFloats(riscv, 'default'))
+        else:
+            riscv.register_calling_convention(RiscVWithFloats(riscv, 'default'))
+        riscv.standalone_platform.default_calling_convention = riscv.calling_conventions['default']
+        RiscVJumpTableRecognizer.register_arch(riscv)
+
+        if name == DEFAULT_VARIANT:
+            bn.binaryview.BinaryViewType['ELF'].register_arch(
+                243, bn.enums.Endianness.LittleEndian, riscv
+            )
+
+    def recognize_elf(view, metadata):
+        # The variant of an ELF file comes from its .riscv.attributes ISA
+        # string, or its class and float ABI without one.
+        raw = view.parent_view if view.parent_view is not None else view
+        isa = elf_isa(raw.read)
+        if isa is None:
+            return None
+        return bn.architecture.Architecture[isa.variant].standalone_platform
+
+    bn.binaryview.BinaryViewType['ELF'].register_platform_recognizer(
+        243, bn.enums.Endianness.LittleEndian, recognize_elf
+    )
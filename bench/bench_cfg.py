@@ -0,0 +1,91 @@
+import argparse
+import importlib
+import random
+import sys
+import time
+
+from struct import pack
+
+from bench_decode import ROOT, load_plugin
+from bench_emu import A0, RA, SP, T0, ZERO, _b, _i, _j, _s
+from bench_jumptable import _absolute
+
+CODE = 0x10000
+CASES = 8
+
+
+def _function(addr, table, callee, rng, switch):
+    # Prologue, straight-line code, an if, a call, optionally a switch of
+    # CASES cases and the epilogue. Returns the words and the case targets.
+    words = [_i(0x13, 0, SP, SP, -16), _s(2, SP, RA, 12)]
+    words += [_i(0x13, 0, A0, A0, rng.randrange(1, 100)) for _ in range(rng.randrange(2, 12))]
+    words += [_b(0, A0, ZERO, 8), _i(0x13, 0, A0, A0, 1)]
+    words.append(_j(RA, callee - (addr + 4 * len(words))))
+    targets = []
+    if switch:
+        dispatch, _relative = _absolute(addr + 4 * len(words), table, CASES)
+        words += dispatch
+        cases = addr + 4 * len(words)
+        epilogue = cases + 8 * CASES
+        for n in range(CASES):
+            targets.append(cases + 8 * n)
+            words += [_i(0x13, 0, A0, A0, n), _j(ZERO, epilogue - (cases + 8 * n + 4))]
+    words += [_i(0x03, 2, RA, SP, 12), _i(0x13, 0, SP, SP, 16), _i(0x67, 0, ZERO, RA, 0)]
+    return words, targets
+
+
+def make_image(functions, seed):
+    # Every function calls the next one and every fourth has a switch, so
+    # everything is reachable from the first. Returns the code, the jump
+    # tables and the number of instructions.
+    sizes = []
+    for n in range(functions):
+        words, _targets = _function(0, 0, 0, random.Random(n + seed), n % 4 == 0)
+        sizes.append(4 * len(words))
+    starts = [CODE]
+    for size in sizes:
+        starts.append(starts[-1] + size)
+    data = starts[-1]
+
+    code = []
+    tables = []
+    for n in range(functions):
+        callee = starts[min(n + 1, functions - 1)]
+        table = data + 4 * len(tables)
+        words, targets = _function(starts[n], table, callee, random.Random(n + seed), n % 4 == 0)
+        code += words
+        tables += targets
+    return (b"".join(pack("<I", w) for w in code), data,
+            b"".join(pack("<I", t) for t in tables), len(code))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Time of the recursive descent CFG builder over growing images")
+    parser.add_argument("--tree", default=ROOT, help="checkout to benchmark (default: this tree)")
+    parser.add_argument("--functions", type=int, nargs="+", default=[1000, 4000, 16000])
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    cfg = importlib.import_module(f"{load_plugin(args.tree).__name__}.cfg")
+
+    failures = 0
+    for functions in args.functions:
+        code, data, tables, insns = make_image(functions, args.seed)
+        image = cfg.Image([(code, CODE, True), (tables, data, False)])
+        start = time.perf_counter()
+        graph = cfg.build_cfg(image, 4, None, [CODE])
+        elapsed = time.perf_counter() - start
+        found = sum(graph.blocks["insns"])
+        print(f"{functions:>6} functions {insns:>8} insns: {elapsed:7.3f}s, "
+              f"{elapsed / insns * 1e6:5.2f} us/insn, {len(graph.blocks['start'])} blocks, "
+              f"{len(graph.edges['src'])} edges")
+        if found != insns or len(graph.functions["start"]) != functions:
+            print(f"  expected {insns} insns in {functions} functions, found {found} in "
+                  f"{len(graph.functions['start'])}")
+            failures += 1
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,77 @@
+import argparse
+import importlib.util
+import os
+import random
+import sys
+import time
+
+from struct import pack
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Major opcodes of RV32I, so that both decoders see the same valid words.
+OPCODES = [
+    0b0110011, 0b1100111, 0b0000011, 0b0010011, 0b1110011, 0b0001111,
+    0b0100011, 0b1100011, 0b0110111, 0b0010111, 0b1101111,
+]
+
+
+def load_plugin(tree):
+    # Import the checkout as a package under a unique name, so that several
+    # trees can be compared in one process.
+    name = f"riscv_{abs(hash(tree))}"
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.spec_from_file_location(
+        name, os.path.join(tree, "__init__.py"), submodule_search_locations=[tree])
+    package = importlib.util.module_from_spec(spec)
+    sys.modules[name] = package
+    spec.loader.exec_module(package)
+    return package
+
+
+def load_rv32(tree):
+    return importlib.import_module(f"{load_plugin(tree).__name__}.variants.rv32")
+
+
+def make_corpus(count, seed):
+    rng = random.Random(seed)
+    words = []
+    for _ in range(count):
+        word = (rng.getrandbits(25) << 7) | rng.choice(OPCODES)
+        words.append(pack("<I", word))
+    return words
+
+
+def bench(from_bytes, corpus, rounds):
+    best = None
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for data in corpus:
+            from_bytes(data, 0)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Time variants/rv32.py:from_bytes of one or more trees")
+    parser.add_argument("--tree", action="append", default=[],
+                        help="checkout to benchmark (default: this tree)")
+    parser.add_argument("--count", type=int, default=200000)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    corpus = make_corpus(args.count, args.seed)
+    for tree in args.tree or [ROOT]:
+        module = load_rv32(tree)
+        elapsed = bench(module.from_bytes, corpus, args.rounds)
+        print(f"{tree}: {elapsed / len(corpus) * 1e9:8.1f} ns/insn "
+              f"{len(corpus) / elapsed:12.0f} insn/s")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,88 @@
+import argparse
+import importlib
+import sys
+import time
+
+from bench_decode import ROOT, load_plugin
+
+
+def _from_tokens(rv32, liveness, insn):
+    # What analyses did before the masks: the register tokens of the
+    # rendered text, the first one written unless it's a store or branch.
+    regs = [t.text for t in insn.get_text(0)[0] if t.type == rv32.TokenType.RegisterToken]
+    defs = uses = 0
+    for i, name in enumerate(regs):
+        if name == "zero":
+            continue
+        bit = 1 << liveness.REG_BITS[name]
+        if i == 0 and insn.sem not in ("store", "eq", "ne", "lt", "ge", "ltu", "geu", "jalr"):
+            defs |= bit
+        else:
+            uses |= bit
+    return defs, uses
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Register def/use masks of a random corpus: per instruction, over "
+                    "the bulk arrays and from the rendered tokens, plus block summaries")
+    parser.add_argument("--tree", default=ROOT, help="checkout to benchmark (default: this tree)")
+    parser.add_argument("--count", type=int, default=1 << 20, help="instructions")
+    parser.add_argument("--block", type=int, default=6, help="mean block length")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    name = load_plugin(args.tree).__name__
+    bulk = importlib.import_module(f"{name}.bulk")
+    corpus = importlib.import_module(f"{name}.corpus")
+    liveness = importlib.import_module(f"{name}.liveness")
+    rv32 = importlib.import_module(f"{name}.variants.rv32")
+    import numpy as np
+
+    generated = corpus.generate(args.count, args.seed, 8, 8, "realistic", 1.0)
+    decoded = bulk.decode_buffer(generated.data, 0, 8, 8)
+    decoder = rv32.get_decoder(8, 8)
+    insns = [decoder.from_bytes(generated.data[a:a + 4], a) for a in decoded.addr.tolist()]
+    print(f"{len(insns)} instructions, riscv64d")
+
+    start = time.perf_counter()
+    defs, uses = bulk.def_use(decoded)
+    vectorized = time.perf_counter() - start
+    start = time.perf_counter()
+    masks = [insn.def_use() for insn in insns]
+    first = time.perf_counter() - start
+    start = time.perf_counter()
+    masks = [insn.def_use() for insn in insns]
+    cached = time.perf_counter() - start
+    sample = insns[:len(insns) // 16]
+    start = time.perf_counter()
+    for insn in sample:
+        _from_tokens(rv32, liveness, insn)
+    tokens = (time.perf_counter() - start) * len(insns) / len(sample)
+
+    bad = int((np.array([d for d, _u in masks], dtype=np.uint64) != defs).sum() +
+              (np.array([u for _d, u in masks], dtype=np.uint64) != uses).sum())
+    for label, elapsed in (("tokens", tokens), ("def_use() first", first),
+                           ("def_use() again", cached), ("bulk.def_use()", vectorized)):
+        print(f"{label:<16} {elapsed:7.3f}s {len(insns) / elapsed / 1e6:8.2f}M insn/s")
+
+    rng = np.random.default_rng(args.seed)
+    starts = np.unique(np.concatenate((
+        [0], rng.integers(1, len(insns), len(insns) // args.block))))
+    start = time.perf_counter()
+    block_defs, block_uses = bulk.block_def_use(defs, uses, starts)
+    vectorized = time.perf_counter() - start
+    start = time.perf_counter()
+    ends = starts[1:].tolist() + [len(insns)]
+    summaries = [liveness.block_def_use(masks[s:e]) for s, e in zip(starts.tolist(), ends)]
+    scalar = time.perf_counter() - start
+    bad += sum(
+        (d, u) != (int(vd), int(vu))
+        for (d, u), vd, vu in zip(summaries, block_defs.tolist(), block_uses.tolist()))
+    print(f"{len(starts)} blocks: block_def_use() {scalar:6.3f}s, bulk {vectorized:6.3f}s")
+    print(f"{bad} mismatches")
+    return 1 if bad else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
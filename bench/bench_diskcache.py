@@ -0,0 +1,78 @@
+import argparse
+import importlib
+import multiprocessing
+import sys
+import tempfile
+import time
+
+from bench_decode import ROOT, load_plugin
+from bench_parallel import make_image
+
+BASE = 0x80000000
+
+
+def _modules(tree):
+    name = load_plugin(tree).__name__
+    return (importlib.import_module(f"{name}.diskcache"), importlib.import_module(f"{name}.bulk"))
+
+
+def _hammer(tree, path, max_bytes, images, rounds, seed):
+    # Loads or stores random images, checking every load against a fresh
+    # decode. Returns the number of mismatches.
+    import random
+    diskcache, bulk = _modules(tree)
+    cache = diskcache.DiskCache(path, max_bytes)
+    rng = random.Random(seed)
+    bad = 0
+    for _ in range(rounds):
+        image = images[rng.randrange(len(images))]
+        decoded = diskcache.cached_decode_buffer(cache, image, BASE, 4, None)
+        expected = bulk.decode_buffer(image, BASE, 4, None)
+        for name, _dtype in bulk.FIELDS:
+            bad += not (getattr(decoded, name) == getattr(expected, name)).all()
+    return bad
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Cold and warm bulk decodes through the disk cache, and several "
+                    "processes sharing a small cache")
+    parser.add_argument("--tree", default=ROOT, help="checkout to benchmark (default: this tree)")
+    parser.add_argument("--size", type=int, default=16, help="image size in MB")
+    parser.add_argument("--processes", type=int, default=4)
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args(argv)
+
+    diskcache, bulk = _modules(args.tree)
+    image = make_image(args.size << 20, 0)
+    # Build the decode tables outside of the timing.
+    bulk.decode_buffer(b"\0" * 4, BASE, 4, None)
+    with tempfile.TemporaryDirectory() as path:
+        cache = diskcache.DiskCache(path)
+        start = time.perf_counter()
+        bulk.decode_buffer(image, BASE, 4, None)
+        plain = time.perf_counter() - start
+        start = time.perf_counter()
+        diskcache.cached_decode_buffer(cache, image, BASE, 4, None)
+        cold = time.perf_counter() - start
+        start = time.perf_counter()
+        decoded = diskcache.cached_decode_buffer(cache, image, BASE, 4, None)
+        warm = time.perf_counter() - start
+        print(f"{args.size} MB, {len(decoded)} insns, {cache.size() >> 20} MB cached")
+        print(f"decode {plain:6.3f}s, cold {cold:6.3f}s, warm {warm:6.3f}s ({plain / warm:.0f}x)")
+
+    # Room for about two of the images, so entries are evicted all the time.
+    images = [make_image(64 << 10, seed) for seed in range(8)]
+    with tempfile.TemporaryDirectory() as path:
+        with multiprocessing.Pool(args.processes) as pool:
+            bad = sum(pool.starmap(_hammer, [
+                (args.tree, path, 2 * 20 * len(images[0]), images, args.rounds, seed)
+                for seed in range(args.processes)]))
+        size = diskcache.DiskCache(path).size()
+    print(f"{args.processes} processes x {args.rounds} rounds, {size >> 10} KB left, "
+          f"{bad} mismatches")
+    return 1 if bad else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
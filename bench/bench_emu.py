@@ -0,0 +1,132 @@
+import argparse
+import importlib
+import sys
+import time
+
+from struct import pack
+
+from bench_decode import ROOT, load_plugin
+
+
+# Just enough of an assembler for the guest programs below.
+def _r(funct3, funct7, rd, rs1, rs2, opcode=0x33):
+    return opcode | rd << 7 | funct3 << 12 | rs1 << 15 | rs2 << 20 | funct7 << 25
+
+
+def _i(opcode, funct3, rd, rs1, imm):
+    return opcode | rd << 7 | funct3 << 12 | rs1 << 15 | (imm & 0xfff) << 20
+
+
+def _s(funct3, rs1, rs2, imm):
+    imm &= 0xfff
+    return 0x23 | (imm & 0x1f) << 7 | funct3 << 12 | rs1 << 15 | rs2 << 20 | (imm >> 5) << 25
+
+
+def _b(funct3, rs1, rs2, offset):
+    imm = offset & 0x1fff
+    return (0x63 | (imm >> 11 & 1) << 7 | (imm >> 1 & 0xf) << 8 | funct3 << 12 | rs1 << 15
+            | rs2 << 20 | (imm >> 5 & 0x3f) << 25 | (imm >> 12) << 31)
+
+
+def _u(rd, imm):
+    return 0x37 | rd << 7 | imm & 0xfffff000
+
+
+def _j(rd, offset):
+    imm = offset & 0x1fffff
+    return (0x6f | rd << 7 | (imm >> 12 & 0xff) << 12 | (imm >> 11 & 1) << 20
+            | (imm >> 1 & 0x3ff) << 21 | (imm >> 20) << 31)
+
+
+ZERO, RA, SP, S0, S1, A0, A1, A2, T0, T1 = 0, 1, 2, 8, 9, 10, 11, 12, 5, 6
+
+
+def fib_program():
+    # a0 = fib(a0), recursively. Call heavy: jal, jalr, stack loads/stores.
+    return [
+        _i(0x13, 0, SP, SP, -16), _s(2, SP, RA, 12), _s(2, SP, S0, 8), _s(2, SP, S1, 4),
+        _i(0x13, 0, S0, A0, 0), _i(0x13, 0, T0, ZERO, 2), _b(4, S0, T0, 32),
+        _i(0x13, 0, A0, S0, -1), _j(RA, -32),
+        _i(0x13, 0, S1, A0, 0), _i(0x13, 0, A0, S0, -2), _j(RA, -44),
+        _r(0, 0, A0, A0, S1),
+        _i(0x03, 2, RA, SP, 12), _i(0x03, 2, S0, SP, 8), _i(0x03, 2, S1, SP, 4),
+        _i(0x13, 0, SP, SP, 16), _i(0x67, 0, ZERO, RA, 0),
+    ]
+
+
+def fnv_program():
+    # a0 = FNV-1a of the a1 bytes at a0. A tight loop of lbu, xor, mul.
+    return [
+        _i(0x13, 0, T0, A0, 0), _r(0, 0, T1, A0, A1),
+        _u(A0, 0x811ca000), _i(0x13, 0, A0, A0, -0x23b),
+        _u(A2, 0x01000000), _i(0x13, 0, A2, A2, 0x193),
+        _b(0, T0, T1, 24),
+        _i(0x03, 4, A1, T0, 0), _r(4, 0, A0, A0, A1), _r(0, 1, A0, A0, A2),
+        _i(0x13, 0, T0, T0, 1), _j(ZERO, -20),
+        _i(0x67, 0, ZERO, RA, 0),
+    ]
+
+
+def fnv(data):
+    h = 0x811c9dc5
+    for b in data:
+        h = (h ^ b) * 16777619 & 0xffffffff
+    return h
+
+
+def fib(n):
+    a, b = 0, 1
+    for _ in range(n):
+        a, b = b, a + b
+    return a
+
+
+CODE = 0x10000
+DATA = 0x20000
+STACK = 0x80000
+
+
+def make_emulator(emu):
+    e = emu.Emulator(4)
+    e.memory.map(STACK - 0x10000, 0x10000)
+    return e
+
+
+def run_fib(emu, n):
+    e = make_emulator(emu)
+    e.memory.map(CODE, 0x1000, b"".join(pack("<I", w) for w in fib_program()))
+    start = time.perf_counter()
+    result = e.call(CODE, n, stack=STACK)
+    elapsed = time.perf_counter() - start
+    assert result == fib(n), (result, fib(n))
+    return e, elapsed
+
+
+def run_fnv(emu, size):
+    e = make_emulator(emu)
+    data = bytes(i * 7 & 0xff for i in range(size))
+    e.memory.map(CODE, 0x1000, b"".join(pack("<I", w) for w in fnv_program()))
+    e.memory.map(DATA, size, data)
+    start = time.perf_counter()
+    result = e.call(CODE, DATA, size, stack=STACK)
+    elapsed = time.perf_counter() - start
+    assert result == fnv(data), (hex(result), hex(fnv(data)))
+    return e, elapsed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Guest MIPS of emu.py")
+    parser.add_argument("--tree", default=ROOT, help="checkout to benchmark (default: this tree)")
+    parser.add_argument("--fib", type=int, default=22, help="fib(n) to compute")
+    parser.add_argument("--fnv", type=int, default=1 << 16, help="bytes to hash")
+    args = parser.parse_args(argv)
+
+    emu = importlib.import_module(f"{load_plugin(args.tree).__name__}.emu")
+    for name, (e, elapsed) in (("fib", run_fib(emu, args.fib)), ("fnv", run_fnv(emu, args.fnv))):
+        print(f"{name}: {e.instret} insns in {elapsed:.3f}s, {e.instret / elapsed / 1e6:.2f} MIPS, "
+              f"{e.translations} blocks translated")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
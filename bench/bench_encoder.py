@@ -0,0 +1,94 @@
+import argparse
+import importlib
+import random
+import sys
+import time
+
+from bench_decode import ROOT, load_plugin
+
+VARIANTS = [(4, None), (4, 8), (8, 8), (16, 16)]
+
+
+def _random_operands(encoder, spec, xlen, rng):
+    args = []
+    for name in encoder.operands(spec, xlen):
+        if name == "imm":
+            _place, _bits, lowest, highest, align = encoder.imm_range(spec, xlen)
+            args.append(rng.randrange(lowest // align, highest // align + 1) * align)
+        else:
+            args.append(rng.randrange(32))
+    return args
+
+
+def check_encoder(encoder, rv32, xlen, flen, per_row, seed):
+    # Encodes random operands of every row of the variant, decodes the
+    # words and their compressed forms, returns (mismatches, encoded,
+    # compressed, seconds spent encoding).
+    rng = random.Random(seed)
+    decoder = rv32.get_decoder(xlen, flen)
+    bad = encoded = compressed = 0
+    elapsed = 0.0
+    for spec, _mask in decoder.rows:
+        names = encoder.operands(spec, xlen)
+        for _ in range(per_row):
+            args = _random_operands(encoder, spec, xlen, rng)
+            start = time.perf_counter()
+            word = encoder.encode(spec.mnemonic, xlen=xlen, **dict(zip(names, args)))
+            elapsed += time.perf_counter() - start
+            encoded += 1
+            insns = [decoder.decode_word(word)]
+            half = encoder.compress(word, xlen)
+            if half is not None:
+                compressed += 1
+                insns.append(decoder.decode_compressed(half))
+            for insn in insns:
+                if (insn is None or insn.spec != spec or
+                        [getattr(insn, name) for name in names] != args):
+                    bad += 1
+                    if bad <= 5:
+                        print(f"  {spec.mnemonic} {args} -> {word:#010x} {half} decodes to "
+                              f"{insn and insn.mnemonic}")
+    return bad, encoded, compressed, elapsed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Encodes every instruction row and random corpora, decodes them "
+                    "again and checks the round trip")
+    parser.add_argument("--tree", default=ROOT, help="checkout to benchmark (default: this tree)")
+    parser.add_argument("--per-row", type=int, default=200, help="random encodings per row")
+    parser.add_argument("--count", type=int, default=1 << 22, help="instructions per corpus")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    name = load_plugin(args.tree).__name__
+    encoder = importlib.import_module(f"{name}.encoder")
+    corpus = importlib.import_module(f"{name}.corpus")
+    rv32 = importlib.import_module(f"{name}.variants.rv32")
+
+    failures = 0
+    print("encode():")
+    for xlen, flen in VARIANTS:
+        bad, encoded, compressed, elapsed = check_encoder(
+            encoder, rv32, xlen, flen, args.per_row, args.seed)
+        failures += bad
+        print(f"  xlen={xlen:<2} flen={flen!s:<4} {encoded:7} words {compressed:6} compressed "
+              f"{encoded / elapsed / 1e3:6.0f}K/s, {bad} mismatches")
+
+    print(f"generate() + round_trip(), {args.count} instructions:")
+    for xlen, flen in VARIANTS:
+        for mix in sorted(corpus.MIXES):
+            for share in (0.0, 1.0):
+                start = time.perf_counter()
+                generated = corpus.generate(args.count, args.seed, xlen, flen, mix, share)
+                elapsed = time.perf_counter() - start
+                bad = len(corpus.round_trip(generated, xlen, flen))
+                failures += bad
+                short = (generated.length == 2).mean()
+                print(f"  xlen={xlen:<2} flen={flen!s:<4} {mix:<9} {short:4.0%} compressed "
+                      f"{args.count / elapsed / 1e6:5.2f}M/s, {bad} mismatches")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
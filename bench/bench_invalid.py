@@ -0,0 +1,77 @@
+import argparse
+import importlib
+import random
+import sys
+import time
+
+from struct import pack
+
+from bench_decode import ROOT, load_plugin
+
+
+def make_valid_corpus(rv32, count, seed):
+    rng = random.Random(seed)
+    words = [
+        (rng.getrandbits(32) & ~mask) | spec.match for spec, mask in rv32.RV32.rows
+    ]
+    return [pack("<I", words[i % len(words)]) for i in range(count)]
+
+
+def make_invalid_corpus(rv32, count, seed):
+    # What a sweep runs into between functions: zero padding, erased flash,
+    # strings and words of opcodes nothing is defined for.
+    rng = random.Random(seed)
+    unused = [op for op in range(3, 128, 4) if not rv32.RV32.valid_opcodes[op]]
+    text = b"Lorem ipsum dolor sit amet, consectetur adipiscing elit. "
+    words = []
+    while len(words) < count:
+        kind = rng.randrange(4)
+        run = rng.randrange(8, 64)
+        for i in range(run):
+            if kind == 0:
+                words.append(bytes(4))
+            elif kind == 1:
+                words.append(b"\xff" * 4)
+            elif kind == 2:
+                offset = (4 * i) % (len(text) - 4)
+                words.append(text[offset:offset + 4])
+            else:
+                words.append(pack("<I", (rng.getrandbits(25) << 7) | rng.choice(unused)))
+    return words[:count]
+
+
+def bench(from_bytes, corpus, rounds):
+    best = None
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for i, data in enumerate(corpus):
+            from_bytes(data, 0x1000 + 4 * i, 4, None)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Time insn.py:from_bytes on valid and on invalid words, "
+                    "with the plugin logging at debug level as in Binary Ninja")
+    parser.add_argument("--tree", action="append", default=[],
+                        help="checkout to benchmark (default: this tree)")
+    parser.add_argument("--count", type=int, default=200000)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    rv32 = importlib.import_module(f"{load_plugin(ROOT).__name__}.variants.rv32")
+    valid = make_valid_corpus(rv32, args.count, args.seed)
+    invalid = make_invalid_corpus(rv32, args.count, args.seed)
+    for tree in args.tree or [ROOT]:
+        insn = importlib.import_module(f"{load_plugin(tree).__name__}.insn")
+        valid_ns = bench(insn.from_bytes, valid, args.rounds) / len(valid) * 1e9
+        invalid_ns = bench(insn.from_bytes, invalid, args.rounds) / len(invalid) * 1e9
+        print(f"{tree}: valid {valid_ns:6.1f} ns/word, invalid {invalid_ns:6.1f} ns/word, "
+              f"invalid/valid {invalid_ns / valid_ns:.2f}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,130 @@
+import argparse
+import importlib
+import random
+import sys
+import time
+
+from struct import pack
+
+from bench_decode import ROOT, load_plugin
+from bench_emu import A0, A1, T0, T1, ZERO, _b, _i, _r, _u
+
+A4, A5 = 14, 15
+
+CODE = 0x10000
+
+
+def _auipc(rd, imm):
+    return 0x17 | rd << 7 | imm & 0xfffff000
+
+
+def _hi_lo(value):
+    hi = (value + 0x800) & ~0xfff
+    return hi, value - hi
+
+
+def _absolute(addr, table, count):
+    # GCC: bgtu idx, n - 1 + slli + lui/addi + add + lw + jr
+    hi, lo = _hi_lo(table)
+    return [
+        _i(0x13, 0, T0, ZERO, count - 1), _b(6, T0, A0, 0x100),
+        _i(0x13, 1, A5, A0, 2), _u(A4, hi), _i(0x13, 0, A4, A4, lo),
+        _r(0, 0, A5, A5, A4), _i(0x03, 2, A5, A5, 0), _i(0x67, 0, ZERO, A5, 0),
+    ], False
+
+
+def _relative(addr, table, count):
+    # PIC: bgeu idx, n + slli + auipc/addi + add + lw + add + jr
+    hi, lo = _hi_lo(table - (addr + 12))
+    return [
+        _i(0x13, 0, T0, ZERO, count), _b(7, A0, T0, 0x100),
+        _i(0x13, 1, A0, A0, 2), _auipc(A1, hi), _i(0x13, 0, A1, A1, lo),
+        _r(0, 0, A0, A0, A1), _i(0x03, 2, A0, A0, 0), _r(0, 0, A0, A0, A1),
+        _i(0x67, 0, ZERO, A0, 0),
+    ], True
+
+
+def _sltiu(addr, table, count):
+    # sltiu + beqz, the low half of the table address folded into the lw
+    hi, lo = _hi_lo(table)
+    return [
+        _i(0x13, 3, T1, A0, count), _b(0, T1, ZERO, 0x100),
+        _i(0x13, 1, A5, A0, 2), _u(A4, hi),
+        _r(0, 0, A5, A5, A4), _i(0x03, 2, A5, A5, lo), _i(0x67, 0, ZERO, A5, 0),
+    ], False
+
+
+SHAPES = (_absolute, _relative, _sltiu)
+
+
+def make_binary(switches, seed):
+    # switches dispatch sequences, each followed by some filler and its
+    # case code, with all the tables after the code. Returns the image and
+    # the expected (jr address, targets) of each switch.
+    rng = random.Random(seed)
+    layout = []
+    addr = CODE
+    for n in range(switches):
+        count = rng.randrange(2, 64)
+        shape = SHAPES[n % len(SHAPES)]
+        length = len(shape(0, 0, count)[0])
+        filler = rng.randrange(0, 16)
+        layout.append((addr, shape, count, filler))
+        addr += 4 * (length + filler + count)
+    tables = addr
+
+    words = []
+    data = []
+    expected = []
+    for addr, shape, count, filler in layout:
+        table = tables + 4 * len(data)
+        code, relative = shape(addr, table, count)
+        cases = addr + 4 * (len(code) + filler)
+        targets = [cases + 4 * rng.randrange(count) for _ in range(count)]
+        data += [t - table if relative else t for t in targets]
+        words += code + [_i(0x13, 0, ZERO, ZERO, 0)] * (filler + count)
+        expected.append((addr + 4 * (len(code) - 1), targets))
+    image = b"".join(pack("<I", w) for w in words) + b"".join(pack("<i", d) for d in data)
+    return image, tables, expected
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Jump table recovery over a linear sweep, against the sweep alone")
+    parser.add_argument("--tree", default=ROOT, help="checkout to benchmark (default: this tree)")
+    parser.add_argument("--switches", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    name = load_plugin(args.tree).__name__
+    jumptable = importlib.import_module(f"{name}.jumptable")
+    sweep = importlib.import_module(f"{name}.sweep")
+
+    image, tables, expected = make_binary(args.switches, args.seed)
+    code = memoryview(image)[:tables - CODE]
+
+    start = time.perf_counter()
+    insns = sum(1 for _ in sweep.linear_sweep(code, CODE, 4, None))
+    swept = time.perf_counter() - start
+
+    read = jumptable.buffer_reader(image, CODE)
+    start = time.perf_counter()
+    found = list(jumptable.scan_jump_tables(code, CODE, 4, None, read))
+    scanned = time.perf_counter() - start
+
+    got = {t.source: t.targets for t in found}
+    missing = sum(got.get(source) != targets for source, targets in expected)
+    cases = sum(len(targets) for _, targets in expected)
+    print(f"{insns} insns, {args.switches} switches, {cases} cases")
+    print(f"sweep          {swept:.3f}s")
+    print(f"sweep + tables {scanned:.3f}s, {(scanned - swept) / swept:+.0%}, "
+          f"{args.switches / scanned:.0f} switches/s")
+    if missing or len(found) != len(expected):
+        print(f"{missing} of {len(expected)} switches not recovered, {len(found)} tables found")
+        return 1
+    print("all switches recovered")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
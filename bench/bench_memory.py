@@ -0,0 +1,61 @@
+import argparse
+import os
+import random
+import sys
+import tracemalloc
+
+from struct import pack, unpack_from
+
+from bench_decode import ROOT, load_rv32, make_corpus
+
+
+TEXT_START = 0x2000
+TEXT_END = 0x2160
+
+
+def make_realistic_corpus(count, seed):
+    # Mostly words from the compiled test binary, which repeat the way
+    # prologues, epilogues and spills do in real code, plus some noise.
+    with open(os.path.join(ROOT, "tests", "rv32i"), "rb") as f:
+        text = f.read()[TEXT_START:TEXT_END]
+    words = [pack("<I", unpack_from("<I", text, i)[0]) for i in range(0, len(text), 4)]
+
+    rng = random.Random(seed)
+    noise = make_corpus(count // 5, seed)
+    return [rng.choice(words) for _ in range(count - len(noise))] + noise
+
+
+def bytes_per_insn(from_bytes, corpus):
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    decoded = [from_bytes(data, 0) for data in corpus]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return (after - before) / len(decoded)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Measure memory held per decoded instruction")
+    parser.add_argument("--tree", action="append", default=[],
+                        help="checkout to measure (default: this tree)")
+    parser.add_argument("--count", type=int, default=100000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--max-bytes", type=float,
+                        help="fail if any tree needs more bytes per instruction")
+    args = parser.parse_args(argv)
+
+    corpus = make_realistic_corpus(args.count, args.seed)
+    failed = False
+    for tree in args.tree or [ROOT]:
+        module = load_rv32(tree)
+        per_insn = bytes_per_insn(module.from_bytes, corpus)
+        print(f"{tree}: {per_insn:8.1f} bytes/insn")
+        if args.max_bytes is not None and per_insn > args.max_bytes:
+            failed = True
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,68 @@
+import argparse
+import hashlib
+import importlib
+import os
+import sys
+import time
+
+from bench_decode import ROOT, load_plugin
+from bench_throughput import make_random_corpus
+
+BASE = 0x80000000
+
+
+def make_image(size, seed):
+    # Random RV32I words and compressed halfwords, padded to size bytes.
+    parts = []
+    total = 0
+    for data, _addr in make_random_corpus(1 << 16, seed):
+        data = data[:2] if data[0] & 0b11 != 0b11 else data
+        parts.append(data)
+        total += len(data)
+    block = b"".join(parts)
+    return (block * (size // total + 1))[:size]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Serial against multi-process disassembly of one large image, "
+                    "checks that the output is identical")
+    parser.add_argument("--tree", default=ROOT, help="checkout to benchmark (default: this tree)")
+    parser.add_argument("--size", type=int, default=16, help="image size in MB")
+    parser.add_argument("--workers", type=int, nargs="+",
+                        default=sorted({1, 2, 4, os.cpu_count() or 1}))
+    parser.add_argument("--format", default="objdump")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    name = load_plugin(args.tree).__name__
+    sweep = importlib.import_module(f"{name}.sweep")
+    parallel = importlib.import_module(f"{name}.parallel")
+    image = make_image(args.size << 20, args.seed)
+
+    fmt = sweep.FORMATTERS[args.format]
+    start = time.perf_counter()
+    digest = hashlib.sha256()
+    for addr, raw, insn in sweep.linear_sweep(image, BASE, 4, None):
+        digest.update((fmt(addr, raw, insn) + "\n").encode())
+    serial = time.perf_counter() - start
+    expected = digest.hexdigest()
+    print(f"{args.size} MB, {os.cpu_count()} CPUs")
+    print(f"serial      {serial:7.2f}s {args.size / serial:6.2f} MB/s")
+
+    failures = 0
+    for workers in args.workers:
+        start = time.perf_counter()
+        digest = hashlib.sha256()
+        for text in parallel.parallel_sweep([(image, BASE, 4, None, None, None)], args.format, workers):
+            digest.update(text.encode())
+        elapsed = time.perf_counter() - start
+        same = digest.hexdigest() == expected
+        failures += not same
+        print(f"{workers:>2} workers {elapsed:7.2f}s {args.size / elapsed:6.2f} MB/s "
+              f"{serial / elapsed:5.2f}x {'identical' if same else 'DIFFERENT'}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
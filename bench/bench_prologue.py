@@ -0,0 +1,114 @@
+import argparse
+import importlib
+import os
+import random
+import sys
+import time
+
+from struct import pack
+
+from bench_decode import ROOT, load_plugin
+from bench_emu import A0, RA, S0, SP, ZERO, _i, _s
+
+BASE = 0x80000000
+C_RET = 0x8082
+
+
+def _c_addi16sp(imm):
+    imm &= 0x3ff
+    return (0b011 << 13 | (imm >> 9 & 1) << 12 | SP << 7 | (imm >> 4 & 1) << 6
+            | (imm >> 6 & 1) << 5 | (imm >> 7 & 0b11) << 3 | (imm >> 5 & 1) << 2 | 0b01)
+
+
+def _c_swsp(rs2, offset):
+    return 0b110 << 13 | (offset >> 2 & 0xf) << 9 | (offset >> 6 & 0b11) << 7 | rs2 << 2 | 0b10
+
+
+def _c_lwsp(rd, offset):
+    return (0b010 << 13 | (offset >> 5 & 1) << 12 | rd << 7 | (offset >> 2 & 0b111) << 4
+            | (offset >> 6 & 0b11) << 2 | 0b10)
+
+
+def _c_addi4spn_s0(imm):
+    return (imm >> 4 & 0b11) << 11 | (imm >> 6 & 0xf) << 7 | (imm >> 2 & 1) << 6 | (imm >> 3 & 1) << 5
+
+
+def _full(words):
+    return b"".join(pack("<I", w) for w in words)
+
+
+def _half(halves):
+    return b"".join(pack("<H", h) for h in halves)
+
+
+def _function(rng):
+    # A function with a frame, with 32-bit or compressed prologue and
+    # epilogue, and a body of 32-bit and compressed instructions.
+    frame = 16 * rng.randrange(1, 8)
+    body = b"".join(
+        _full([_i(0x13, 0, A0, A0, rng.randrange(1, 100))]) if rng.random() < 0.5 else _half([0x0505])
+        for _ in range(rng.randrange(4, 40)))
+    if rng.random() < 0.5:
+        prologue = _full([
+            _i(0x13, 0, SP, SP, -frame), _s(2, SP, RA, frame - 4), _s(2, SP, S0, frame - 8),
+            _i(0x13, 0, S0, SP, frame)])
+        epilogue = _full([
+            _i(0x03, 2, RA, SP, frame - 4), _i(0x03, 2, S0, SP, frame - 8),
+            _i(0x13, 0, SP, SP, frame), _i(0x67, 0, ZERO, RA, 0)])
+    else:
+        prologue = _half([
+            _c_addi16sp(-frame), _c_swsp(RA, frame - 4), _c_swsp(S0, frame - 8),
+            _c_addi4spn_s0(frame)])
+        epilogue = _half([
+            _c_lwsp(RA, frame - 4), _c_lwsp(S0, frame - 8), _c_addi16sp(frame), C_RET])
+    return prologue + body + epilogue
+
+
+def make_image(size, seed):
+    # Functions with frames, frameless leaf functions and blocks of random
+    # data. Returns the image and the start of every function with a frame.
+    rng = random.Random(seed)
+    parts = []
+    starts = []
+    addr = BASE
+    while addr - BASE < size:
+        kind = rng.random()
+        if kind < 0.8:
+            part = _function(rng)
+            starts.append(addr)
+        elif kind < 0.9:
+            part = _full([_i(0x13, 0, A0, A0, 1), _i(0x67, 0, ZERO, RA, 0)])
+        else:
+            part = os.urandom(2 * rng.randrange(8, 256))
+        parts.append(part)
+        addr += len(part)
+    return b"".join(parts), starts
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Prologue scanner throughput and accuracy on synthetic images")
+    parser.add_argument("--tree", default=ROOT, help="checkout to benchmark (default: this tree)")
+    parser.add_argument("--size", type=int, nargs="+", default=[1, 4, 16], help="image sizes in MB")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    prologue = importlib.import_module(f"{load_plugin(args.tree).__name__}.prologue")
+    # Build the decode tables outside of the timing.
+    prologue.scan_prologues(b"\0" * 4, BASE, 4, None)
+
+    for mb in args.size:
+        image, starts = make_image(mb << 20, args.seed)
+        start = time.perf_counter()
+        candidates = prologue.scan_prologues(image, BASE, 4, None)
+        elapsed = time.perf_counter() - start
+        found = {c.addr for c in candidates}
+        hits = len(found.intersection(starts))
+        print(f"{mb:>4} MB: {elapsed:7.3f}s, {len(image) / elapsed / 1e6:6.1f} MB/s, "
+              f"{len(candidates)} candidates, recall {hits / len(starts):.3f}, "
+              f"precision {hits / max(len(found), 1):.3f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,119 @@
+import argparse
+import asyncio
+import importlib
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from bench_decode import ROOT, load_plugin
+from bench_parallel import make_image
+
+BASE = 0x80000000
+
+
+def _start(server_module, address, workers):
+    # Runs a Server on its own event loop in a daemon thread, returns once
+    # it is listening.
+    listening = threading.Event()
+
+    def run():
+        server = server_module.Server(workers)
+        asyncio.run(server.serve(address, ready=lambda _server: listening.set()))
+
+    threading.Thread(target=run, daemon=True).start()
+    if not listening.wait(10):
+        raise RuntimeError("the server didn't start")
+
+
+def _client(server_module, address, packed, batches, expected, pipeline, errors, timings):
+    # Sends every batch, keeping up to pipeline requests in flight, and
+    # checks each reply against the direct result.
+    start = time.perf_counter()
+    with server_module.Client(address, packed, timeout=60) as client:
+        sent = 0
+        received = 0
+        while received < len(batches):
+            while sent < len(batches) and sent - received < pipeline:
+                client.send(batches[sent])
+                sent += 1
+            if client.receive() != expected[received]:
+                errors.append(received)
+            received += 1
+    timings.append(time.perf_counter() - start)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Requests per second of the disassembly server with concurrent "
+                    "clients, against starting the CLI for every request")
+    parser.add_argument("--tree", default=ROOT, help="checkout to benchmark (default: this tree)")
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=200, help="requests per client")
+    parser.add_argument("--items", type=int, default=4, help="items per request")
+    parser.add_argument("--item-size", type=int, default=256, help="bytes of code per item")
+    parser.add_argument("--pipeline", type=int, default=4, help="requests in flight per client")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--spawn", type=int, default=5, help="CLI runs for the baseline")
+    args = parser.parse_args(argv)
+
+    plugin = load_plugin(args.tree)
+    server_module = importlib.import_module(f"{plugin.__name__}.server")
+    packed_modes = [False] + ([True] if server_module.msgpack is not None else [])
+
+    image = make_image(args.item_size * args.items * args.requests, 0)
+    batches = []
+    expected = []
+    for r in range(args.requests):
+        items = []
+        for i in range(args.items):
+            offset = (r * args.items + i) * args.item_size
+            items.append({"data": image[offset:offset + args.item_size], "addr": BASE + offset,
+                          "variant": "riscv32", "outputs": ["text", "info"]})
+        batches.append(items)
+        expected.append([server_module.disassemble(item) for item in items])
+    insns = sum(len(result) for results in expected for result in results)
+
+    failures = 0
+    with tempfile.TemporaryDirectory() as path:
+        address = f"unix:{os.path.join(path, 'riscv.sock')}"
+        _start(server_module, address, args.workers)
+        for packed in packed_modes:
+            errors = []
+            timings = []
+            threads = [
+                threading.Thread(target=_client, args=(
+                    server_module, address, packed, batches, expected, args.pipeline, errors, timings))
+                for _ in range(args.clients)]
+            start = time.perf_counter()
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            elapsed = time.perf_counter() - start
+            failures += len(errors) + (len(timings) != args.clients)
+            total = args.clients * args.requests
+            print(f"{'msgpack' if packed else 'json':>7} {args.clients} clients x {args.requests} "
+                  f"requests: {total / elapsed:8.1f} req/s {args.clients * insns / elapsed:9.0f} insn/s, "
+                  f"{len(errors)} mismatches")
+
+    # What the server saves: a fresh interpreter per request.
+    with tempfile.NamedTemporaryFile(suffix=".bin") as f:
+        f.write(image[:args.item_size * args.items])
+        f.flush()
+        tree = os.path.abspath(args.tree)
+        command = [sys.executable, "-m", os.path.basename(tree), "--raw", "--xlen", "32",
+                   "--base", hex(BASE), f.name]
+        start = time.perf_counter()
+        for _ in range(args.spawn):
+            subprocess.run(command, cwd=os.path.dirname(tree), check=True,
+                           stdout=subprocess.DEVNULL)
+        elapsed = time.perf_counter() - start
+        print(f"    cli {args.spawn} runs: {args.spawn / elapsed:8.1f} req/s")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
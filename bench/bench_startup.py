@@ -0,0 +1,59 @@
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+from bench_decode import ROOT
+
+
+BENCH = os.path.dirname(os.path.abspath(__file__))
+
+# Run in a fresh interpreter each time, so nothing is cached yet. Prints
+# the plugin import time and the time of the first decode with the
+# riscv64d decoder, in ms.
+CHILD = """
+import sys, time
+sys.path.insert(0, {bench!r})
+start = time.perf_counter()
+from bench_decode import load_plugin
+plugin = load_plugin({tree!r})
+loaded = time.perf_counter()
+import importlib
+insn = importlib.import_module(plugin.__name__ + ".insn")
+insn.from_bytes(b"\\x13\\x05\\x15\\x00", 0, 8, 8)
+decoded = time.perf_counter()
+print((loaded - start) * 1e3, (decoded - loaded) * 1e3)
+"""
+
+
+def measure(tree, runs):
+    results = []
+    for _ in range(runs):
+        out = subprocess.run(
+            [sys.executable, "-c", CHILD.format(bench=BENCH, tree=tree)],
+            check=True, capture_output=True, text=True).stdout
+        results.append([float(v) for v in out.split()])
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Plugin import time and first decode latency, against the "
+                    "stub Binary Ninja API")
+    parser.add_argument("--tree", action="append", default=[],
+                        help="checkout to benchmark (default: this tree)")
+    parser.add_argument("--runs", type=int, default=10)
+    args = parser.parse_args(argv)
+
+    for tree in args.tree or [ROOT]:
+        results = measure(tree, args.runs)
+        load = [r[0] for r in results]
+        first = [r[1] for r in results]
+        print(f"{tree}: import {min(load):7.1f} ms min {statistics.median(load):7.1f} ms median, "
+              f"first riscv64d decode {statistics.median(first):6.1f} ms median")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
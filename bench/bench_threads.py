@@ -0,0 +1,138 @@
+import argparse
+import importlib
+import sys
+import threading
+import time
+
+from bench_decode import ROOT, load_plugin
+from bench_throughput import make_random_corpus, make_realistic_corpus
+
+from binaryninja import LowLevelILFunction, LowLevelILLabel
+
+
+OPERATIONS = ("from_bytes", "text", "lift")
+
+
+def _normalize(expr):
+    # Labels are new objects on every lift, compare them by position only.
+    if isinstance(expr, LowLevelILLabel):
+        return "label"
+    if isinstance(expr, tuple):
+        return tuple(_normalize(e) for e in expr)
+    return expr
+
+
+def _from_bytes(modules, arch):
+    from_bytes = modules["insn"].from_bytes
+    render = modules["tokens"].render
+
+    def run(data, addr):
+        insn = from_bytes(data, addr, 4, None)
+        return None if insn is None else render(insn.get_text(addr)[0])
+    return run
+
+
+def _text(modules, arch):
+    def run(data, addr):
+        result = arch.get_instruction_text(data, addr)
+        if result is None:
+            return None
+        tokens, length = result
+        return [(t.type, t.text, t.value) for t in tokens], length
+    return run
+
+
+def _lift(modules, arch):
+    def run(data, addr):
+        il = LowLevelILFunction(arch)
+        arch.get_instruction_low_level_il(data, addr, il)
+        return _normalize(tuple(il.instructions))
+    return run
+
+
+RUNNERS = {"from_bytes": _from_bytes, "text": _text, "lift": _lift}
+
+
+def hammer(modules, arch, corpus, operation, threads):
+    # Every thread runs the whole corpus, each starting at a different
+    # offset, and keeps its results in corpus order. Returns the elapsed
+    # time and the results of every thread.
+    results = [None] * threads
+    barrier = threading.Barrier(threads + 1)
+
+    def worker(index):
+        run = RUNNERS[operation](modules, arch)
+        count = len(corpus)
+        start = index * count // threads
+        out = [None] * count
+        barrier.wait()
+        for i in range(start, start + count):
+            i %= count
+            data, addr = corpus[i]
+            out[i] = run(data, addr)
+        results[index] = out
+
+    workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    for w in workers:
+        w.start()
+    barrier.wait()
+    begin = time.perf_counter()
+    for w in workers:
+        w.join()
+    return time.perf_counter() - begin, results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Run from_bytes, get_instruction_text and lifting from many "
+                    "threads at once, check the results against a single thread "
+                    "and report how throughput scales")
+    parser.add_argument("--tree", default=ROOT, help="checkout to test (default: this tree)")
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    parser.add_argument("--count", type=int, default=10000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    plugin = load_plugin(args.tree)
+    modules = {
+        name: importlib.import_module(f"{plugin.__name__}.{name}")
+        for name in ("cache", "disas", "insn", "lifter", "riscv", "tokens")
+    }
+    corpus = make_realistic_corpus(plugin, args.count // 2) + \
+        make_random_corpus(args.count - args.count // 2, args.seed)
+
+    gil = getattr(sys, "_is_gil_enabled", lambda: True)()
+    print(f"python {sys.version.split()[0]}, GIL {'enabled' if gil else 'disabled'}")
+    print(f"{'threads':<10}" + "".join(f"{op + ' insn/s':>18}{'scaling':>9}" for op in OPERATIONS))
+
+    failures = 0
+    single = {}
+    reference = {}
+    for threads in args.threads:
+        row = f"{threads:<10}"
+        for operation in OPERATIONS:
+            # A fresh architecture, so no thread starts with a warm cache.
+            cache = modules["cache"].DecodeCache()
+            arch = modules["riscv"].RiscV32()
+            arch.disassembler = modules["disas"].RiscVDisassembler(4, cache=cache)
+            arch.lifter = modules["lifter"].RiscVLifter(4, cache=cache)
+            elapsed, results = hammer(modules, arch, corpus, operation, threads)
+            if operation not in reference:
+                reference[operation] = results[0]
+            for out in results:
+                if out != reference[operation]:
+                    failures += sum(a != b for a, b in zip(out, reference[operation]))
+            rate = threads * len(corpus) / elapsed
+            single.setdefault(operation, rate)
+            row += f"{rate:>18.0f}{rate / single[operation]:>8.2f}x"
+        print(row)
+
+    if failures:
+        print(f"{failures} results differ from the single threaded run")
+        return 1
+    print("all results match")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,230 @@
+import argparse
+import importlib
+import json
+import os
+import platform
+import random
+import sys
+import time
+
+from struct import pack
+
+from bench_decode import OPCODES, ROOT, load_plugin
+
+from binaryninja import BinaryView, Function, LowLevelILFunction
+
+
+OPERATIONS = ("info", "text", "render", "lift")
+
+
+def make_fixed_corpus(rv32, count, seed):
+    # Every RV32 instruction once, with operand bits chosen per row.
+    rng = random.Random(seed)
+    words = [
+        (rng.getrandbits(32) & ~spec.mask) | spec.match
+        for spec in rv32.INSTRUCTIONS
+        if spec.xlen <= 32 and spec.ext not in rv32.FP_EXTENSIONS
+    ]
+    return [(pack("<I", words[i % len(words)]), 0x1000 + 4 * i) for i in range(count)]
+
+
+def make_realistic_corpus(plugin, count):
+    # The code of the compiled test binary, at its own addresses.
+    elf = importlib.import_module(f"{plugin.__name__}.elf")
+    sweep = importlib.import_module(f"{plugin.__name__}.sweep")
+    code = []
+    with elf.ElfFile.open(os.path.join(ROOT, "tests", "rv32i")) as f:
+        for section in f.executable_sections():
+            data = f.section_data(section)
+            for addr, raw, insn in sweep.linear_sweep(data, section.addr, 4, None):
+                if insn is not None:
+                    code.append((raw + bytes(4 - len(raw)), addr))
+    return [code[i % len(code)] for i in range(count)]
+
+
+def make_random_corpus(count, seed):
+    # A quarter compressed halfwords, the rest 32-bit words of RV32I opcodes.
+    rng = random.Random(seed)
+    corpus = []
+    for i in range(count):
+        if rng.random() < 0.25:
+            data = pack("<H", rng.getrandbits(16) & ~0b11 | rng.randrange(3)) + bytes(2)
+        else:
+            data = pack("<I", (rng.getrandbits(25) << 7) | rng.choice(OPCODES))
+        corpus.append((data, 0x1000 + 4 * i))
+    return corpus
+
+
+def _run_info(arch, corpus):
+    get_insn_info = arch.disassembler.get_insn_info
+    for data, addr in corpus:
+        get_insn_info(data, addr)
+
+
+def _run_text(arch, corpus):
+    get_insn_text = arch.disassembler.get_insn_text
+    for data, addr in corpus:
+        get_insn_text(data, addr)
+
+
+def _run_render(arch, corpus):
+    # The decoder's own tokens, without the conversion to Binary Ninja ones.
+    for insn, addr in corpus:
+        insn.get_text(addr)
+
+
+_functions = {}
+
+
+def _corpus_function(corpus):
+    # A function over a view holding the corpus at its addresses, which the
+    # lifter reads the first half of lui/auipc pairs from. Built once per
+    # corpus, in the warm-up pass.
+    func = _functions.get(id(corpus))
+    if func is not None:
+        return func
+    start = min(addr for _data, addr in corpus)
+    image = bytearray(max(addr for _data, addr in corpus) + 4 - start)
+    for data, addr in corpus:
+        image[addr - start:addr - start + len(data)] = data
+    func = _functions[id(corpus)] = Function(BinaryView(image, start))
+    return func
+
+
+def _run_lift(arch, corpus):
+    get_insn_low_level_il = arch.lifter.get_insn_low_level_il
+    il = LowLevelILFunction(arch, source_function=_corpus_function(corpus))
+    for data, addr in corpus:
+        get_insn_low_level_il(data, addr, il)
+
+
+RUNNERS = {
+    "info": _run_info, "text": _run_text, "render": _run_render, "lift": _run_lift,
+}
+
+
+def _inputs(rv32, corpus, operation):
+    if operation != "render":
+        return corpus
+    decoded = ((rv32.from_bytes(data, addr), addr) for data, addr in corpus)
+    return [(insn, addr) for insn, addr in decoded if insn is not None]
+
+
+def measure(plugins, corpus, operation, rounds):
+    # Best of `rounds` after one warm-up pass of every (arch, rv32) of
+    # plugins, in instructions per second. The plugins take turns each
+    # round, so they see the same machine load and clock speed.
+    run = RUNNERS[operation]
+    inputs = [_inputs(rv32, corpus, operation) for _arch, rv32 in plugins]
+    for (arch, _rv32), data in zip(plugins, inputs):
+        run(arch, data)
+    best = [None] * len(plugins)
+    for _ in range(rounds):
+        for i, ((arch, _rv32), data) in enumerate(zip(plugins, inputs)):
+            start = time.perf_counter()
+            run(arch, data)
+            elapsed = time.perf_counter() - start
+            best[i] = elapsed if best[i] is None else min(best[i], elapsed)
+    return [len(data) / elapsed for data, elapsed in zip(inputs, best)]
+
+
+def compare(baseline, results, tolerance):
+    # (name, measured, expected) of every measurement of results more than
+    # `tolerance` slower than the same one of baseline, both measured here
+    # in the same run.
+    regressions = []
+    for corpus, operations in baseline.items():
+        for operation, expected in operations.items():
+            measured = results.get(corpus, {}).get(operation)
+            if measured is not None and measured < expected * (1 - tolerance):
+                regressions.append((f"{corpus}/{operation}", measured, expected))
+    return regressions
+
+
+def run_trees(trees, corpora, rounds):
+    # {corpus: {operation: insn/s}} of every tree.
+    plugins = []
+    for tree in trees:
+        plugin = load_plugin(tree)
+        rv32 = importlib.import_module(f"{plugin.__name__}.variants.rv32")
+        riscv = importlib.import_module(f"{plugin.__name__}.riscv")
+        plugins.append((riscv.RiscV32(), rv32))
+    results = [{name: {} for name in corpora} for _ in trees]
+    for name, corpus in corpora.items():
+        for op in OPERATIONS:
+            for result, rate in zip(results, measure(plugins, corpus, op, rounds)):
+                result[name][op] = round(rate)
+    return results
+
+
+def print_table(title, results, fmt):
+    print(f"{title:<12}" + "".join(f"{op:>12}" for op in OPERATIONS))
+    for name, operations in results.items():
+        print(f"{name:<12}" + "".join(f"{fmt(operations[op]):>12}" for op in OPERATIONS))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Instructions/sec of instruction info, text and lifting")
+    parser.add_argument("--tree", action="append", default=[],
+                        help="checkout to benchmark (default: this tree); with "
+                        "several, speedups are relative to the first and the "
+                        "last one is written and checked")
+    parser.add_argument("--count", type=int, default=20000)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the results as JSON")
+    parser.add_argument("--check", action="store_true",
+                        help="fail when the last tree is slower than the first one, "
+                        "a baseline checkout measured on this machine")
+    parser.add_argument("--tolerance", type=float, default=0.3,
+                        help="allowed slowdown against the first tree (default: 0.3)")
+    args = parser.parse_args(argv)
+    if args.check and len(args.tree) < 2:
+        parser.error("--check needs a baseline --tree and the one to check")
+
+    # The corpora come from this tree, so all trees see the same input.
+    plugin = load_plugin(ROOT)
+    rv32 = importlib.import_module(f"{plugin.__name__}.variants.rv32")
+    corpora = {
+        "fixed": make_fixed_corpus(rv32, args.count, args.seed),
+        "realistic": make_realistic_corpus(plugin, args.count),
+        "random": make_random_corpus(args.count, args.seed),
+    }
+
+    trees = args.tree or [ROOT]
+    per_tree = run_trees(trees, corpora, args.rounds)
+    for tree, results in zip(trees, per_tree):
+        print(tree)
+        print_table("insn/s", results, str)
+    if len(trees) > 1:
+        first = per_tree[0]
+        speedup = {
+            name: {op: ops[op] / first[name][op] for op in OPERATIONS}
+            for name, ops in per_tree[-1].items()
+        }
+        print(f"{trees[-1]} against {trees[0]}")
+        print_table("speedup", speedup, lambda x: f"{x:.2f}x")
+
+    results = {
+        "python": platform.python_version(),
+        "count": args.count,
+        "results": per_tree[-1],
+    }
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+            f.write("\n")
+
+    if args.check:
+        regressions = compare(per_tree[0], per_tree[-1], args.tolerance)
+        for name, measured, expected in regressions:
+            print(f"regression: {name} {measured} insn/s, {trees[0]} {expected} insn/s")
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
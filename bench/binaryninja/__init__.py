@@ -0,0 +1,12 @@
+# Stand-in for the small part of the Binary Ninja API the plugin uses, so the
+# plugin can be imported and benchmarked without Binary Ninja. The bench
+# scripts pick it up because their directory is first on sys.path.
+from . import architecture, binaryview, enums, function, log, lowlevelil, settings
+from .architecture import Architecture, IntrinsicInfo, IntrinsicInput, RegisterInfo
+from .binaryview import BinaryView, BinaryViewType
+from .callingconvention import CallingConvention
+from .enums import BranchType, Endianness, InstructionTextTokenType
+from .function import Function, FunctionRecognizer, InstructionInfo, InstructionTextToken
+from .lowlevelil import LLIL_TEMP, LowLevelILFunction, LowLevelILLabel
+from .settings import Settings
+from .types import Type
@@ -0,0 +1,42 @@
+from types import SimpleNamespace
+
+
+class _ArchitectureMeta(type):
+    _registered = {}
+
+    def __getitem__(cls, name):
+        return cls._registered[name]
+
+
+class Architecture(metaclass=_ArchitectureMeta):
+    name = None
+
+    def __init__(self):
+        self.calling_conventions = {}
+        self.standalone_platform = SimpleNamespace(default_calling_convention=None)
+
+    @classmethod
+    def register(cls):
+        _ArchitectureMeta._registered[cls.name] = cls()
+
+    def register_calling_convention(self, cc):
+        self.calling_conventions[cc.name] = cc
+
+
+class RegisterInfo(object):
+    def __init__(self, full_width_reg, size, offset=0, extend=None, index=None):
+        self.full_width_reg = full_width_reg
+        self.size = size
+        self.offset = offset
+
+
+class IntrinsicInput(object):
+    def __init__(self, type, name=""):
+        self.type = type
+        self.name = name
+
+
+class IntrinsicInfo(object):
+    def __init__(self, inputs, outputs, index=None):
+        self.inputs = inputs
+        self.outputs = outputs
@@ -0,0 +1,28 @@
+class BinaryViewType(object):
+    _types = {}
+
+    def __class_getitem__(cls, name):
+        return cls._types.setdefault(name, cls())
+
+    def __init__(self):
+        self.arches = {}
+        self.platform_recognizers = []
+
+    def register_arch(self, ident, endian, arch):
+        self.arches[(ident, endian)] = arch
+
+    def register_platform_recognizer(self, ident, endian, callback):
+        self.platform_recognizers.append((ident, endian, callback))
+
+
+class BinaryView(object):
+    # Bytes at consecutive addresses from start, read as the real view does.
+    def __init__(self, data=b"", start=0):
+        self.data = bytes(data)
+        self.start = start
+
+    def read(self, addr, length):
+        offset = addr - self.start
+        if offset < 0:
+            return b""
+        return self.data[offset:offset + length]
@@ -0,0 +1,7 @@
+class CallingConvention(object):
+    name = None
+
+    def __init__(self, arch=None, name=None):
+        self.arch = arch
+        if name is not None:
+            self.name = name
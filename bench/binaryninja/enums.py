@@ -0,0 +1,32 @@
+from enum import IntEnum
+
+
+class Endianness(IntEnum):
+    LittleEndian = 0
+    BigEndian = 1
+
+
+class BranchType(IntEnum):
+    UnconditionalBranch = 0
+    FalseBranch = 1
+    TrueBranch = 2
+    CallDestination = 3
+    FunctionReturn = 4
+    SystemCall = 5
+    IndirectBranch = 6
+    ExceptionBranch = 7
+    UnresolvedBranch = 127
+    UserDefinedBranch = 128
+
+
+class InstructionTextTokenType(IntEnum):
+    TextToken = 0
+    InstructionToken = 1
+    OperandSeparatorToken = 2
+    RegisterToken = 3
+    IntegerToken = 4
+    PossibleAddressToken = 5
+    BeginMemoryOperandToken = 6
+    EndMemoryOperandToken = 7
+    FloatingPointToken = 8
+    CodeRelativeAddressToken = 64
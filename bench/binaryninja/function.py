@@ -0,0 +1,35 @@
+from .enums import InstructionTextTokenType
+
+
+class InstructionInfo(object):
+    def __init__(self):
+        self.length = 0
+        self.branches = []
+
+    def add_branch(self, branch_type, target=0, arch=None):
+        self.branches.append((branch_type, target, arch))
+
+
+class InstructionTextToken(object):
+    def __init__(self, token_type, text, value=0, size=0, operand=0xffffffff):
+        self.type = token_type
+        self.text = text
+        self.value = value
+        self.size = size
+        self.operand = operand
+
+    def __repr__(self):
+        return f"<{self.type.name} {self.text!r}>"
+
+
+class Function(object):
+    def __init__(self, view=None):
+        self.view = view
+
+
+class FunctionRecognizer(object):
+    _registered = []
+
+    @classmethod
+    def register_arch(cls, arch):
+        cls._registered.append((arch, cls()))
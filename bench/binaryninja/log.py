@@ -0,0 +1,14 @@
+def log_debug(msg):
+    pass
+
+
+def log_info(msg):
+    pass
+
+
+def log_warn(msg):
+    pass
+
+
+def log_error(msg):
+    pass
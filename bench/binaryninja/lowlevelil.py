@@ -0,0 +1,37 @@
+def LLIL_TEMP(n):
+    return 0x80000000 | n
+
+
+class LowLevelILLabel(object):
+    pass
+
+
+class LowLevelILFunction(object):
+    # Records expressions as tuples. Expression builders (il.add, il.reg,
+    # ...) are created on first use, so every operation the lifter emits is
+    # accepted without listing them here.
+    def __init__(self, arch=None, labels=None, source_function=None):
+        self.arch = arch
+        self.labels = labels if labels is not None else {}
+        self.source_function = source_function
+        self.instructions = []
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+
+        def expr(self, *operands):
+            return (name,) + operands
+
+        setattr(LowLevelILFunction, name, expr)
+        return getattr(self, name)
+
+    def append(self, expr):
+        self.instructions.append(expr)
+        return len(self.instructions) - 1
+
+    def get_label_for_address(self, arch, addr):
+        return self.labels.get(addr)
+
+    def mark_label(self, label):
+        self.instructions.append(("label", label))
@@ -0,0 +1,19 @@
+import json
+
+
+class Settings(object):
+    _values = {}
+
+    def register_group(self, group, title):
+        return True
+
+    def register_setting(self, key, properties):
+        Settings._values.setdefault(key, json.loads(properties).get("default"))
+        return True
+
+    def get_bool(self, key):
+        return bool(Settings._values.get(key))
+
+    def set_bool(self, key, value):
+        Settings._values[key] = value
+        return True
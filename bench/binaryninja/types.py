@@ -0,0 +1,9 @@
+from collections import namedtuple
+
+
+class Type(object):
+    Integer = namedtuple("Integer", ["width", "signed"])
+
+    @staticmethod
+    def int(width, sign=True, altname=""):
+        return Type.Integer(width, sign)
@@ -0,0 +1,301 @@
+import numpy as np
+
+from .variants.rv32 import (
+    CSR_SEMS, DISPATCH_MASK, INSTRUCTIONS, REG_FILE_BASES, RESERVED_ROUNDING_MODES,
+    InstructionType, VARIANTS, decode_rows, has_rounding_mode, register_operands, shamt_width
+)
+from .variants.rvc import expansion_table
+
+
+# Bump when decode_buffer() gives different arrays for the same input
+# without the instruction table changing, it invalidates cached results.
+DECODER_VERSION = 2
+
+# Buffers are decoded in chunks of this many halfwords so that temporaries
+# stay small for large sections.
+CHUNK_HALFWORDS = 1 << 20
+
+FMT_NONE = -1
+
+IMM_NONE = 0
+IMM_I = 1
+IMM_SHIFT = 2
+IMM_CSR = 3
+IMM_S = 4
+IMM_B = 5
+IMM_U = 6
+IMM_J = 7
+IMM_SHIFT6 = 8
+IMM_SHIFT7 = 9
+
+SHIFT_KINDS = {5: IMM_SHIFT, 6: IMM_SHIFT6, 7: IMM_SHIFT7}
+SHIFT_MASKS = {IMM_SHIFT: 0x1f, IMM_SHIFT6: 0x3f, IMM_SHIFT7: 0x7f}
+
+LUT_INVALID = -1
+LUT_SCAN = -2
+
+# Bit offset into the register masks of the rd, rs1, rs2 and rs3 fields of
+# every row, -1 where the field isn't a register. The last row is for
+# invalid instructions.
+REG_BASES = np.array([
+    [-1 if f is None else REG_FILE_BASES[f] for f in register_operands(spec)]
+    for spec in INSTRUCTIONS
+] + [[-1] * 4], dtype=np.int8)
+
+FIELDS = (
+    ("addr", np.uint64), ("opcode", np.uint8), ("rd", np.uint8), ("rs1", np.uint8),
+    ("rs2", np.uint8), ("funct3", np.uint8), ("funct7", np.uint8),
+    ("imm", np.int32), ("fmt", np.int8), ("length", np.uint8),
+    ("valid", np.bool_), ("spec", np.int16),
+)
+
+
+def _imm_kind(spec, xlen):
+    fmt = spec.fmt
+    if fmt == InstructionType.IType:
+        width = shamt_width(spec, xlen)
+        if width is not None:
+            return SHIFT_KINDS[width]
+        if spec.sem in CSR_SEMS:
+            return IMM_CSR
+        return IMM_I
+    return {
+        InstructionType.SType: IMM_S,
+        InstructionType.BType: IMM_B,
+        InstructionType.UType: IMM_U,
+        InstructionType.JType: IMM_J,
+    }.get(fmt, IMM_NONE)
+
+
+class _Tables(object):
+    def __init__(self, rows, xlen):
+        # (opcode | funct3 << 7 | funct7 << 10) -> index into INSTRUCTIONS,
+        # LUT_SCAN for keys whose rows look at further bits. Rows are
+        # (index, spec, mask) with the mask adjusted for XLEN.
+        keys = np.arange(1 << 17, dtype=np.uint32)
+        words = (keys & 0x7f) | (((keys >> 7) & 0b111) << 12) | ((keys >> 10) << 25)
+
+        scan_opcodes = {
+            spec.match & 0x7f for _index, spec, mask in rows
+            if mask & ~DISPATCH_MASK
+        }
+        reserved = np.isin((keys >> 7) & 0b111, RESERVED_ROUNDING_MODES)
+        lut = np.full(1 << 17, LUT_INVALID, dtype=np.int16)
+        scan_rows = []
+        for index, spec, mask in rows:
+            hit = (words & (mask & DISPATCH_MASK)) == (spec.match & DISPATCH_MASK)
+            if has_rounding_mode(spec):
+                hit &= ~reserved
+            if spec.match & 0x7f in scan_opcodes:
+                scan_rows.append((index, mask, spec.match, has_rounding_mode(spec)))
+                lut[hit] = LUT_SCAN
+            else:
+                lut[hit] = index
+        self.lut = lut
+        self.scan_rows = sorted(scan_rows, key=lambda row: -bin(row[1]).count("1"))
+
+        fmt = np.full(len(INSTRUCTIONS) + 1, FMT_NONE, dtype=np.int8)
+        imm_kind = np.zeros(len(INSTRUCTIONS) + 1, dtype=np.int8)
+        for index, spec, _mask in rows:
+            fmt[index] = spec.fmt.value[0]
+            imm_kind[index] = _imm_kind(spec, xlen)
+        # Index -1 (invalid) picks the trailing FMT_NONE/IMM_NONE entry.
+        self.fmt = fmt
+        self.imm_kind = imm_kind
+
+
+_tables = {}
+
+
+def _get_tables(xlen, flen):
+    key = (xlen, flen)
+    tables = _tables.get(key)
+    if tables is None:
+        index = {spec: i for i, spec in enumerate(INSTRUCTIONS)}
+        rows = [(index[spec], spec, mask) for spec, mask in decode_rows(xlen, flen)]
+        tables = _tables[key] = _Tables(rows, xlen)
+    return tables
+
+
+def _sign_extend(x, b):
+    m = 1 << (b - 1)
+    return ((x & ((1 << b) - 1)) ^ m) - m
+
+
+def _immediates(w, kind):
+    imm = np.zeros(len(w), dtype=np.int64)
+    for k in np.unique(kind):
+        sel = kind == k
+        x = w[sel]
+        if k == IMM_I:
+            imm[sel] = _sign_extend(x >> 20, 12)
+        elif k in SHIFT_MASKS:
+            imm[sel] = (x >> 20) & SHIFT_MASKS[k]
+        elif k == IMM_CSR:
+            imm[sel] = x >> 20
+        elif k == IMM_S:
+            imm[sel] = _sign_extend(((x >> 25) << 5) | ((x >> 7) & 0b11111), 12)
+        elif k == IMM_B:
+            imm[sel] = _sign_extend(
+                ((x >> 31) << 12) | (((x >> 7) & 1) << 11) |
+                (((x >> 25) & 0b111111) << 5) | ((x >> 7) & 0b11110), 13)
+        elif k == IMM_U:
+            imm[sel] = _sign_extend(x & 0xfffff000, 32)
+        elif k == IMM_J:
+            imm[sel] = _sign_extend(
+                ((x >> 31) << 20) | (((x >> 12) & 0xff) << 12) |
+                (((x >> 20) & 1) << 11) | (((x >> 21) & 0x3ff) << 1), 21)
+    return imm
+
+
+class DecodedBuffer(object):
+    def __init__(self, base_addr, xlen, flen, arrays):
+        self.base_addr = base_addr
+        self.xlen = xlen
+        self.flen = flen
+        for name, _dtype in FIELDS:
+            setattr(self, name, arrays[name])
+
+    def __len__(self):
+        return len(self.valid)
+
+    def arrays(self):
+        return {name: getattr(self, name) for name, _dtype in FIELDS}
+
+
+def _as_halfwords(buf):
+    if isinstance(buf, np.ndarray):
+        buf = buf.view(np.uint8).reshape(-1)
+    count = len(memoryview(buf).cast("B")) // 2
+    return np.frombuffer(buf, dtype="<u2", count=count)
+
+
+def sweep_starts(full, first):
+    # Indices of the halfwords a linear sweep starts an instruction at.
+    # full[i] says halfword i would start a 32-bit instruction, first
+    # whether index 0 is a start. Halfword i starts an instruction unless
+    # i - 1 started a 32-bit one, so it only depends on the parity of the
+    # run of full halfwords since the last compressed one.
+    idx = np.arange(len(full), dtype=np.int64)
+    last = np.maximum.accumulate(np.where(full, -1 if first else -2, idx))
+    prev = np.empty_like(last)
+    prev[0] = -1 if first else -2
+    prev[1:] = last[:-1]
+    return np.nonzero(((idx - prev - 1) & 1) == 0)[0]
+
+
+def _decode_words(w, tables, arrays, out):
+    opcode = w & 0x7f
+    funct3 = (w >> 12) & 0b111
+    funct7 = w >> 25
+    spec = tables.lut[opcode | (funct3 << 7) | (funct7 << 10)]
+
+    scan = np.nonzero(spec == LUT_SCAN)[0]
+    if len(scan):
+        sub = w[scan]
+        reserved = np.isin(funct3[scan], RESERVED_ROUNDING_MODES)
+        found = np.full(len(scan), LUT_INVALID, dtype=np.int16)
+        for index, mask, match, rounding in tables.scan_rows:
+            hit = (found == LUT_INVALID) & ((sub & mask) == match)
+            if rounding:
+                hit &= ~reserved
+            found[hit] = index
+        spec[scan] = found
+
+    arrays["opcode"][out] = opcode
+    arrays["rd"][out] = (w >> 7) & 0b11111
+    arrays["rs1"][out] = (w >> 15) & 0b11111
+    arrays["rs2"][out] = (w >> 20) & 0b11111
+    arrays["funct3"][out] = funct3
+    arrays["funct7"][out] = funct7
+    arrays["imm"][out] = _immediates(w, tables.imm_kind[spec])
+    arrays["fmt"][out] = tables.fmt[spec]
+    arrays["valid"][out] = spec >= 0
+    arrays["spec"][out] = spec
+
+
+def decode_buffer(buf, base_addr, xlen, flen):
+    halves = _as_halfwords(buf)
+    count = len(halves)
+    supported = (xlen, flen) in VARIANTS and base_addr % 2 == 0
+    if supported:
+        tables = _get_tables(xlen, flen)
+        expand = np.frombuffer(expansion_table(xlen * 8), dtype=np.uint32)
+
+    chunks = []
+    first = True
+    for start in range(0, count, CHUNK_HALFWORDS):
+        h = halves[start:start + CHUNK_HALFWORDS]
+        full = (h & 0b11) == 0b11
+        starts = sweep_starts(full, first)
+        # The next chunk starts with an instruction unless the last
+        # halfword of this one begins a 32-bit instruction.
+        first = not (len(starts) and starts[-1] == len(h) - 1 and full[-1])
+
+        arrays = {name: np.zeros(len(starts), dtype=dtype) for name, dtype in FIELDS}
+        arrays["spec"][:] = -1
+        arrays["fmt"][:] = FMT_NONE
+        arrays["addr"][:] = base_addr + 2 * (start + starts)
+        is_full = full[starts]
+        arrays["length"][:] = np.where(is_full, 4, 2)
+
+        if supported:
+            # 32-bit instructions take the following halfword, compressed
+            # ones are decoded as their 32-bit expansion.
+            pos = start + starts
+            truncated = is_full & (pos + 1 >= count)
+            upper = halves[np.minimum(pos + 1, count - 1)].astype(np.int64)
+            lower = h[starts].astype(np.int64)
+            w = np.where(is_full, lower | (upper << 16), expand[lower])
+            _decode_words(w, tables, arrays, slice(None))
+            arrays["valid"] &= ~truncated
+        chunks.append(arrays)
+
+    if not chunks:
+        arrays = {name: np.zeros(0, dtype=dtype) for name, dtype in FIELDS}
+    else:
+        arrays = {
+            name: np.concatenate([c[name] for c in chunks]) for name, _dtype in FIELDS
+        }
+    return DecodedBuffer(base_addr, xlen, flen, arrays)
+
+
+def def_use(decoded):
+    # (defs, uses) uint64 register bitmasks of every decoded instruction,
+    # the same as RiscVInstruction.def_use(). Invalid ones have neither.
+    bases = REG_BASES[decoded.spec]
+    fields = (decoded.rd, decoded.rs1, decoded.rs2, decoded.funct7 >> 2)
+    masks = [np.zeros(len(decoded), dtype=np.uint64) for _ in range(2)]
+    one = np.uint64(1)
+    for i, reg in enumerate(fields):
+        base = bases[:, i]
+        on = decoded.valid & (base >= 0) & ((reg != 0) | (base > 0))
+        shift = reg.astype(np.uint64) + np.maximum(base, 0).astype(np.uint64)
+        masks[i > 0] |= np.where(on, one << shift, np.uint64(0))
+    return masks[0], masks[1]
+
+
+def block_def_use(defs, uses, starts):
+    # (defs, upward exposed uses) of every block, the blocks starting at the
+    # indices starts (ascending, the first 0) into the per-instruction
+    # masks: what each block writes, and what it reads before writing it.
+    # The running OR of the defs within each block is a segmented scan in
+    # log2(longest block) steps.
+    count = len(defs)
+    if not count:
+        return np.zeros(0, dtype=np.uint64), np.zeros(0, dtype=np.uint64)
+    block = np.zeros(count, dtype=np.int64)
+    block[starts[1:]] = 1
+    block = np.cumsum(block)
+    before = np.zeros(count, dtype=np.uint64)
+    before[1:] = defs[:-1]
+    before[starts] = 0
+    step = 1
+    while step < count:
+        same = block[step:] == block[:-step]
+        if not same.any():
+            break
+        before[step:] |= np.where(same, before[:-step], np.uint64(0))
+        step *= 2
+    exposed = uses & ~before
+    return (np.bitwise_or.reduceat(defs, starts), np.bitwise_or.reduceat(exposed, starts))
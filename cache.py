@@ -0,0 +1,105 @@
+import threading
+
+from collections import OrderedDict
+
+from .insn import from_bytes
+
+
+DEFAULT_CACHE_SIZE = 1 << 16
+
+_MISSING = object()
+
+
+class _ThreadCache(object):
+    __slots__ = ("entries", "hits", "misses")
+
+    def __init__(self):
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+
+class DecodeCache(object):
+    # Binary Ninja calls the architecture from all of its analysis threads,
+    # so every thread gets an LRU of its own instead of all of them taking
+    # a lock around one. Decoded instructions are immutable once rendered
+    # and are shared freely. maxsize is per thread.
+    def __init__(self, maxsize=DEFAULT_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._local = threading.local()
+        # Every thread's cache, for the statistics. Only taken when a
+        # thread decodes for the first time.
+        self._lock = threading.Lock()
+        self._threads = []
+
+    def _thread_cache(self):
+        try:
+            return self._local.cache
+        except AttributeError:
+            cache = self._local.cache = _ThreadCache()
+            with self._lock:
+                self._threads.append(cache)
+            return cache
+
+    def decode(self, data, addr, xlen, flen):
+        # Decoding only depends on the raw instruction and the alignment of
+        # addr, branch targets etc. are computed from addr later on.
+        raw = data[:2] if data and data[0] & 0b11 != 0b11 else data[:4]
+        key = (bytes(raw), addr & 1, xlen, flen)
+        try:
+            cache = self._local.cache
+        except AttributeError:
+            cache = self._thread_cache()
+        entries = cache.entries
+
+        insn = entries.get(key, _MISSING)
+        if insn is not _MISSING:
+            cache.hits += 1
+            entries.move_to_end(key)
+            return insn
+
+        cache.misses += 1
+        insn = from_bytes(data, addr, xlen, flen)
+        entries[key] = insn
+        if len(entries) > self.maxsize:
+            entries.popitem(last=False)
+        return insn
+
+    def clear(self):
+        # Not meant to race with decode() in other threads.
+        with self._lock:
+            for cache in self._threads:
+                cache.entries.clear()
+                cache.hits = 0
+                cache.misses = 0
+
+    def __len__(self):
+        return sum(len(cache.entries) for cache in list(self._threads))
+
+    @property
+    def hits(self):
+        return sum(cache.hits for cache in list(self._threads))
+
+    @property
+    def misses(self):
+        return sum(cache.misses for cache in list(self._threads))
+
+    @property
+    def hit_rate(self):
+        hits, misses = self.hits, self.misses
+        total = hits + misses
+        return hits / total if total else 0.0
+
+    def stats(self):
+        hits, misses = self.hits, self.misses
+        return {
+            "size": len(self),
+            "maxsize": self.maxsize,
+            "threads": len(self._threads),
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / (hits + misses) if hits + misses else 0.0,
+        }
+
+
+decode_cache = DecodeCache()
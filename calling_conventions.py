@@ -1,4 +1,8 @@
-from binaryninja import CallingConvention
+try:
+    from binaryninja import CallingConvention
+except ImportError:
+    # Headless, only the register lists are used (liveness.py).
+    CallingConvention = object
 
 
 class RiscVWithoutFloats(CallingConvention):
@@ -0,0 +1,384 @@
+import bisect
+import json
+
+from array import array
+from collections import deque
+
+from .elf import SHF_EXECINSTR
+from .info import BranchType
+from .jumptable import WINDOW, find_jump_table
+from .pairs import pair_branch, resolve_pair
+from .variants.rv32 import InstructionType, get_decoder
+
+
+# Bump when build_cfg() gives a different graph for the same input, it
+# invalidates cached graphs.
+CFG_VERSION = 1
+
+# Only these may have branches in get_info, everything else falls through.
+CONTROL_TYPES = (InstructionType.BType, InstructionType.JType)
+CONTROL_SEMS = ("jalr", "ecall", "ebreak")
+
+# How a block ends besides the BranchType of its last instruction: it
+# falls into the next block, or into a word that doesn't decode or lies
+# outside the image.
+END_FALLTHROUGH = -1
+END_INVALID = -2
+
+# Bits of the per-halfword marks of a code segment.
+MARK_LENGTH = 0x07
+MARK_LEADER = 0x08
+MARK_END = 0x10
+
+# (name, array typecode) of every column of the tables.
+BLOCK_FIELDS = (("start", "Q"), ("end", "Q"), ("insns", "I"), ("kind", "b"), ("function", "i"))
+EDGE_FIELDS = (("src", "i"), ("dst", "i"), ("target", "Q"), ("type", "b"))
+FUNCTION_FIELDS = (("start", "Q"), ("block", "i"), ("blocks", "I"))
+CALL_FIELDS = (("site", "Q"), ("block", "i"), ("target", "Q"))
+TABLE_FIELDS = {
+    "blocks": BLOCK_FIELDS, "edges": EDGE_FIELDS, "functions": FUNCTION_FIELDS, "calls": CALL_FIELDS,
+}
+
+
+class Image(object):
+    # The loaded segments of a binary, (data, addr, executable). Code is
+    # only decoded from executable ones, jump tables are read from all.
+    def __init__(self, segments):
+        self.segments = sorted(((memoryview(d), a, x) for d, a, x in segments), key=lambda s: s[1])
+        self.starts = [addr for _data, addr, _exec in self.segments]
+
+    @classmethod
+    def from_elf(cls, elf):
+        return cls(
+            (elf.section_data(s), s.addr, bool(s.flags & SHF_EXECINSTR))
+            for s in elf.allocated_sections())
+
+    def find(self, addr):
+        # Index of the segment holding addr, -1 if there is none.
+        i = bisect.bisect_right(self.starts, addr) - 1
+        if i >= 0:
+            data, start, _exec = self.segments[i]
+            if addr < start + len(data):
+                return i
+        return -1
+
+    def read(self, addr, size):
+        i = self.find(addr)
+        if i < 0:
+            return None
+        data, start, _exec = self.segments[i]
+        if addr + size > start + len(data):
+            return None
+        return data[addr - start:addr - start + size]
+
+    def is_code(self, addr):
+        i = self.find(addr)
+        return i >= 0 and self.segments[i][2]
+
+
+class ControlFlowGraph(object):
+    # Basic blocks, edges, functions and calls as columns of flat arrays,
+    # one row each. Blocks are sorted by address, edges by source block.
+    # A block reached from several functions belongs to the first of them
+    # by address, function is -1 for blocks no function reaches.
+    def __init__(self, xlen, flen, blocks, edges, functions, calls, names):
+        self.xlen = xlen
+        self.flen = flen
+        self.blocks = blocks
+        self.edges = edges
+        self.functions = functions
+        self.calls = calls
+        self.names = names
+
+    def tables(self):
+        return {
+            "blocks": self.blocks, "edges": self.edges,
+            "functions": self.functions, "calls": self.calls,
+        }
+
+    def to_json(self):
+        result = {"xlen": self.xlen, "flen": self.flen}
+        for name, table in self.tables().items():
+            result[name] = {column: values.tolist() for column, values in table.items()}
+        result["functions"]["name"] = self.names
+        return result
+
+    def save_json(self, path):
+        with open(path, "w") as f:
+            json.dump(self.to_json(), f)
+
+    def arrays(self):
+        # Every column as a NumPy array named "table.column".
+        import numpy as np
+        arrays = {"xlen": np.array(self.xlen), "flen": np.array(self.flen or 0)}
+        for name, table in self.tables().items():
+            for column, values in table.items():
+                if isinstance(values, array):
+                    values = np.frombuffer(values, dtype=values.typecode)
+                arrays[f"{name}.{column}"] = values
+        arrays["functions.name"] = np.array(self.names, dtype=str)
+        return arrays
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        # The inverse of arrays(), columns stay NumPy arrays.
+        tables = {
+            name: {column: arrays[f"{name}.{column}"] for column, _code in fields}
+            for name, fields in TABLE_FIELDS.items()
+        }
+        return cls(
+            int(arrays["xlen"]), int(arrays["flen"]) or None, tables["blocks"], tables["edges"],
+            tables["functions"], tables["calls"], arrays["functions.name"].tolist())
+
+    def save_npz(self, path):
+        import numpy as np
+        np.savez(path, **self.arrays())
+
+    def save(self, path):
+        if str(path).endswith(".npz"):
+            self.save_npz(path)
+        else:
+            self.save_json(path)
+
+
+def _columns(fields):
+    return {name: array(code) for name, code in fields}
+
+
+class _Builder(object):
+    def __init__(self, image, xlen, flen):
+        decoder = get_decoder(xlen, flen)
+        if decoder is None:
+            raise ValueError(f"no decoder for XLEN {xlen * 8}, FLEN {flen and flen * 8}")
+        self.image = image
+        self.xlen = xlen
+        self.flen = flen
+        self.decode = decoder.from_bytes
+        # Per code segment, one byte per halfword: the length of the
+        # instruction starting there and MARK_* bits, 0 if not decoded.
+        self.marks = [bytearray((len(d) + 1) // 2) if x else None for d, _a, x in image.segments]
+        # Address of every block ending instruction -> its (type, target)
+        # branches, kept for the edges.
+        self.ends = {}
+        self.leaders = []
+        self.calls = []
+        self.functions = set()
+        self.work = deque()
+
+    def function(self, addr):
+        if addr not in self.functions:
+            self.functions.add(addr)
+            self.work.append((addr, None))
+
+    def _leader(self, addr):
+        # Marks addr as a block start, returns (segment, marks, halfword)
+        # or None if it isn't code.
+        i = self.image.find(addr) if not addr & 1 else -1
+        marks = self.marks[i] if i >= 0 else None
+        if marks is None:
+            return None
+        h = (addr - self.image.starts[i]) >> 1
+        if not marks[h] & MARK_LEADER:
+            marks[h] |= MARK_LEADER
+            self.leaders.append(addr)
+        return i, marks, h
+
+    def run(self):
+        work = self.work
+        while work:
+            addr, window = work.popleft()
+            self._trace(addr, window)
+
+    def _trace(self, addr, window):
+        # Decodes from addr up to the first instruction ending a block or
+        # code decoded before, queueing the successors.
+        found = self._leader(addr)
+        if found is None:
+            return
+        i, marks, h = found
+        if marks[h] & MARK_LENGTH:
+            return
+        data, base, _exec = self.image.segments[i]
+        size = len(data)
+        decode = self.decode
+        window = deque(window or (), maxlen=WINDOW)
+        offset = addr - base
+        while True:
+            insn = decode(data[offset:offset + 4], addr)
+            if insn is None or offset + insn.length > size:
+                return
+            length = insn.length
+            marks[h] |= length
+            window.append((addr, insn))
+            if insn.insn_type in CONTROL_TYPES or insn.sem in CONTROL_SEMS:
+                if self._control(addr, insn, window):
+                    marks[h] |= MARK_END
+                    return
+            addr += length
+            offset += length
+            h = offset >> 1
+            if offset >= size:
+                return
+            if marks[h] & MARK_LENGTH:
+                self._leader(addr)
+                return
+
+    def _control(self, addr, insn, window):
+        # Handles the branches of insn, returns whether it ends the block.
+        branches = insn.get_info(addr).branches
+        tail = False
+        if insn.sem == "jalr" and len(window) > 1:
+            prev_addr, prev = window[-2]
+            value = resolve_pair(insn, addr, prev, prev_addr, self.xlen)
+            if value is not None:
+                branches = [pair_branch(insn, value)]
+                # auipc + jr, the tail pseudo-instruction.
+                tail = not insn.rd
+        ends = False
+        edges = []
+        mask = (1 << self.xlen * 8) - 1
+        for branch_type, target in branches:
+            if target is not None:
+                # Targets wrap around like the pc, those outside the image
+                # aren't followed or recorded.
+                target &= mask
+                if self.image.find(target) < 0:
+                    if branch_type not in (BranchType.CallDestination, BranchType.FalseBranch):
+                        ends = True
+                    continue
+            if tail:
+                edges.append((branch_type, target))
+                self.function(target)
+                ends = True
+            elif branch_type == BranchType.CallDestination:
+                self.calls.append((addr, target))
+                self.function(target)
+            elif branch_type == BranchType.FalseBranch:
+                # The bounds check of a switch is usually right before the
+                # block it falls into.
+                edges.append((branch_type, target))
+                self.work.append((target, tuple(window)))
+                ends = True
+            elif branch_type in (BranchType.TrueBranch, BranchType.UnconditionalBranch):
+                edges.append((branch_type, target))
+                self.work.append((target, None))
+                ends = True
+            elif branch_type == BranchType.IndirectBranch:
+                table = find_jump_table(window, self.image.read, self.xlen, self.image.is_code)
+                for target in dict.fromkeys(table.targets if table is not None else ()):
+                    edges.append((branch_type, target))
+                    self.work.append((target, None))
+                ends = True
+            elif branch_type in (BranchType.FunctionReturn, BranchType.ExceptionBranch):
+                ends = True
+        if ends:
+            # Conditional branches are recorded as TrueBranch.
+            kind = branches[0][0].value
+            self.ends[addr] = (kind, edges)
+        return ends
+
+    def blocks(self):
+        # Splits the decoded code at the leaders into blocks.
+        image = self.image
+        blocks = _columns(BLOCK_FIELDS)
+        block_of = {}
+        successors = []
+        for start in sorted(self.leaders):
+            i = image.find(start)
+            marks = self.marks[i]
+            base = image.starts[i]
+            h = (start - base) >> 1
+            if not marks[h] & MARK_LENGTH:
+                continue
+            limit = len(marks)
+            count = 0
+            offset = start - base
+            while True:
+                mark = marks[h]
+                count += 1
+                last = base + offset
+                offset += mark & MARK_LENGTH
+                h = offset >> 1
+                if mark & MARK_END:
+                    kind, edges = self.ends[last]
+                    break
+                if h >= limit or not marks[h] & MARK_LENGTH:
+                    kind, edges = END_INVALID, ()
+                    break
+                if marks[h] & MARK_LEADER:
+                    kind, edges = END_FALLTHROUGH, ((BranchType.UnconditionalBranch, base + offset),)
+                    break
+            block_of[start] = len(blocks["start"])
+            blocks["start"].append(start)
+            blocks["end"].append(base + offset)
+            blocks["insns"].append(count)
+            blocks["kind"].append(kind)
+            blocks["function"].append(-1)
+            successors.append(edges)
+
+        edges = _columns(EDGE_FIELDS)
+        for src, out in enumerate(successors):
+            for branch_type, target in out:
+                edges["src"].append(src)
+                edges["dst"].append(block_of.get(target, -1))
+                edges["target"].append(target)
+                edges["type"].append(branch_type.value)
+        return blocks, edges, block_of
+
+    def build(self, names):
+        self.run()
+        blocks, edges, block_of = self.blocks()
+
+        # Adjacency of the edges, which are sorted by source block.
+        first = array("I", bytes(4 * (len(blocks["start"]) + 1)))
+        for src in edges["src"]:
+            first[src + 1] += 1
+        for b in range(len(blocks["start"])):
+            first[b + 1] += first[b]
+
+        entry_blocks = {block_of.get(addr, -1) for addr in self.functions}
+        functions = _columns(FUNCTION_FIELDS)
+        owner = blocks["function"]
+        dst = edges["dst"]
+        for start in sorted(self.functions):
+            entry = block_of.get(start, -1)
+            index = len(functions["start"])
+            count = 0
+            if entry >= 0 and owner[entry] < 0:
+                owner[entry] = index
+                stack = [entry]
+                while stack:
+                    block = stack.pop()
+                    count += 1
+                    for e in range(first[block], first[block + 1]):
+                        succ = dst[e]
+                        # Tail calls into other functions aren't followed.
+                        if succ >= 0 and owner[succ] < 0 and succ not in entry_blocks:
+                            owner[succ] = index
+                            stack.append(succ)
+            functions["start"].append(start)
+            functions["block"].append(entry)
+            functions["blocks"].append(count)
+
+        calls = _columns(CALL_FIELDS)
+        starts = blocks["start"]
+        for site, target in self.calls:
+            calls["site"].append(site)
+            calls["block"].append(bisect.bisect_right(starts, site) - 1)
+            calls["target"].append(target)
+
+        return ControlFlowGraph(
+            self.xlen, self.flen, blocks, edges, functions, calls,
+            [names.get(addr, "") for addr in functions["start"]])
+
+
+def build_cfg(image, xlen, flen, entries, names=None):
+    # Recursive descent from entries, the addresses of known functions.
+    # Calls found on the way add functions, conditional, direct and
+    # resolved jump table branches add blocks. names maps function
+    # addresses to names for the output.
+    builder = _Builder(image, xlen, flen)
+    for addr in entries:
+        builder.function(addr)
+    return builder.build(names or {})
+
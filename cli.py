@@ -0,0 +1,217 @@
+import argparse
+import sys
+
+from .cfg import Image, build_cfg
+from .elf import ElfFile, map_file
+from .sweep import FORMATTERS, linear_sweep
+
+
+def _int(value):
+    return int(value, 0)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="python -m RiscV",
+        description="Headless RISC-V linear sweep disassembler")
+    parser.add_argument("file", nargs="?", help="ELF file or raw blob")
+    parser.add_argument("--raw", action="store_true",
+                        help="treat the input as a raw blob instead of an ELF file")
+    parser.add_argument("--base", type=_int, default=0,
+                        help="load address of a raw blob (default: 0)")
+    parser.add_argument("--section", action="append",
+                        help="ELF section to disassemble, may be repeated "
+                             "(default: all executable sections)")
+    parser.add_argument("--start", type=_int, help="first address to disassemble")
+    parser.add_argument("--end", type=_int, help="address to stop at (exclusive)")
+    parser.add_argument("--xlen", type=int, choices=(32, 64, 128),
+                        help="XLEN in bits (default: from the ELF ISA string or "
+                             "class, 32 for raw blobs)")
+    parser.add_argument("--flen", type=int, choices=(32, 64, 128),
+                        help="FLEN in bits (default: from the ELF ISA string or "
+                             "float ABI, no floating point for raw blobs)")
+    parser.add_argument("--format", choices=sorted(FORMATTERS), default="objdump",
+                        help="output format (default: objdump)")
+    parser.add_argument("--jobs", "-j", type=int, default=1,
+                        help="disassemble in this many processes, 0 for one per CPU "
+                             "(default: 1)")
+    parser.add_argument("--cfg", metavar="OUTPUT",
+                        help="build the control flow graph by recursive descent instead "
+                             "and write it to OUTPUT, as NPZ if it ends in .npz, JSON "
+                             "otherwise")
+    parser.add_argument("--entry", type=_int, action="append",
+                        help="function address to start the control flow graph at, may "
+                             "be repeated (default: the ELF entry point and function "
+                             "symbols, the base of raw blobs)")
+    parser.add_argument("--cache", nargs="?", const="", metavar="DIR",
+                        help="keep --cfg and --prologues results in a cache in DIR "
+                             "(default: $RISCV_CACHE_DIR or ~/.cache/riscv-binja) and "
+                             "reuse them for the same contents, needs NumPy")
+    parser.add_argument("--cache-size", type=int, default=1024,
+                        help="size limit of the cache in MB (default: 1024)")
+    parser.add_argument("--serve", metavar="ADDRESS",
+                        help="serve disassembly requests on a Unix socket (unix:PATH) or "
+                             "a localhost TCP port (tcp:127.0.0.1:PORT) instead")
+    parser.add_argument("--workers", type=int, default=4,
+                        help="requests --serve works on at once (default: 4)")
+    parser.add_argument("--prologues", action="store_true",
+                        help="list candidate function starts found by their prologue, "
+                             "best first, or add them to the --cfg entries (needs NumPy)")
+    return parser
+
+
+def _regions(args):
+    if args.raw:
+        yield map_file(args.file), args.base, 4, None
+        return
+
+    with ElfFile.open(args.file) as elf:
+        if not elf.is_riscv:
+            print(f"{args.file}: warning: e_machine is {elf.machine}, not RISC-V",
+                  file=sys.stderr)
+
+        if args.section:
+            sections = []
+            for name in args.section:
+                section = elf.section(name)
+                if section is None:
+                    raise SystemExit(f"{args.file}: no section {name}")
+                sections.append(section)
+        else:
+            sections = elf.executable_sections()
+
+        isa = elf.isa
+        for section in sections:
+            data = elf.section_data(section)
+            yield data, section.addr, isa.xlen, isa.flen
+            data.release()
+
+
+def _disk_cache(args):
+    if args.cache is None:
+        return None
+    from .diskcache import DiskCache, default_path
+    path = args.cache or default_path()
+    return DiskCache(path, args.cache_size << 20) if path else None
+
+
+def _scan_prologues(cache, data, addr, xlen, flen):
+    if cache is not None:
+        from .diskcache import cached_prologues
+        return cached_prologues(cache, data, addr, xlen, flen)
+    from .prologue import scan_prologues
+    return scan_prologues(data, addr, xlen, flen)
+
+
+def _prologue_entries(cache, image, xlen, flen):
+    return [
+        c.addr for data, addr, executable in image.segments if executable
+        for c in _scan_prologues(cache, data, addr, xlen, flen)
+    ]
+
+
+def _prologues(args):
+    cache = _disk_cache(args)
+    out = sys.stdout
+    for code, base_addr, xlen, flen in _regions(args):
+        if args.xlen is not None:
+            xlen = args.xlen // 8
+        if args.flen is not None:
+            flen = args.flen // 8
+        for c in _scan_prologues(cache, code, base_addr, xlen, flen):
+            out.write(f"{c.addr:8x}\t{c.score:4.1f}\t{c.frame_size}\t{', '.join(c.matches)}\n")
+    return 0
+
+
+def _cfg(args):
+    if args.raw:
+        code = map_file(args.file)
+        image = Image([(code, args.base, True)])
+        return _build_cfg(args, image, [args.base], {}, 4, None)
+    # The image maps the file, so the CFG is built before it's closed.
+    with ElfFile.open(args.file) as elf:
+        image = Image.from_elf(elf)
+        names = dict((addr, name) for addr, name in elf.function_symbols())
+        entries = [elf.entry] + sorted(names)
+        isa = elf.isa
+        return _build_cfg(args, image, entries, names, isa.xlen, isa.flen)
+
+
+def _build_cfg(args, image, entries, names, xlen, flen):
+    if args.xlen is not None:
+        xlen = args.xlen // 8
+    if args.flen is not None:
+        flen = args.flen // 8
+    cache = _disk_cache(args)
+    entries = args.entry or entries
+    if args.prologues:
+        entries = entries + _prologue_entries(cache, image, xlen, flen)
+    if cache is not None:
+        from .diskcache import cached_cfg
+        cfg = cached_cfg(cache, image, xlen, flen, entries, names)
+    else:
+        cfg = build_cfg(image, xlen, flen, entries, names)
+    cfg.save(args.cfg)
+    print(f"{len(cfg.functions['start'])} functions, {len(cfg.blocks['start'])} blocks, "
+          f"{len(cfg.edges['src'])} edges", file=sys.stderr)
+    return 0
+
+
+def _parallel(args):
+    from .parallel import parallel_sweep
+
+    def regions():
+        for code, base_addr, xlen, flen in _regions(args):
+            if args.xlen is not None:
+                xlen = args.xlen // 8
+            if args.flen is not None:
+                flen = args.flen // 8
+            yield code, base_addr, xlen, flen, args.start, args.end
+
+    out = sys.stdout
+    try:
+        for text in parallel_sweep(regions(), args.format, args.jobs or None):
+            out.write(text)
+        out.flush()
+    except BrokenPipeError:
+        sys.stderr.close()
+    return 0
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.serve:
+        from .server import parse_address, serve
+        try:
+            parse_address(args.serve)
+        except ValueError as e:
+            parser.error(f"--serve: {e}")
+        serve(args.serve, args.workers)
+        return 0
+    if args.file is None:
+        parser.error("the following arguments are required: file")
+    if args.cfg:
+        return _cfg(args)
+    if args.prologues:
+        return _prologues(args)
+
+    if args.jobs != 1:
+        return _parallel(args)
+
+    fmt = FORMATTERS[args.format]
+    out = sys.stdout
+    try:
+        for code, base_addr, xlen, flen in _regions(args):
+            if args.xlen is not None:
+                xlen = args.xlen // 8
+            if args.flen is not None:
+                flen = args.flen // 8
+            for addr, raw, insn in linear_sweep(code, base_addr, xlen, flen, args.start, args.end):
+                out.write(fmt(addr, raw, insn))
+                out.write("\n")
+        out.flush()
+    except BrokenPipeError:
+        # Output piped into head & co.
+        sys.stderr.close()
+    return 0
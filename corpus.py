@@ -0,0 +1,166 @@
+from collections import namedtuple
+
+import numpy as np
+
+from .bulk import decode_buffer
+from .encoder import REGISTERS, RM_DYN, ROUNDING_MODES, compression_table, imm_range, operands
+from .variants.rv32 import INSTRUCTIONS, MEMORY_WIDTHS, VARIANTS, decode_rows, has_rounding_mode
+
+
+# Relative frequency of each mnemonic, roughly the static mix of compiled
+# user code. Rows the variant lacks are left out; "uniform" weighs every
+# row the same.
+REALISTIC_MIX = {
+    "addi": 16, "lw": 8, "ld": 8, "sw": 5, "sd": 5, "lbu": 2, "lb": 0.5, "lhu": 0.5,
+    "lh": 0.3, "lwu": 0.5, "sb": 1.5, "sh": 0.5,
+    "add": 4, "sub": 1, "and": 1, "or": 1, "xor": 0.5, "andi": 2, "ori": 0.5, "xori": 0.5,
+    "slli": 2.5, "srli": 1.5, "srai": 0.5, "sll": 0.3, "srl": 0.3, "sra": 0.2,
+    "slt": 0.3, "sltu": 0.7, "slti": 0.2, "sltiu": 0.7,
+    "addiw": 2, "addw": 1, "subw": 0.5, "slliw": 0.5, "srliw": 0.3, "sraiw": 0.3,
+    "lui": 3, "auipc": 3, "jal": 6, "jalr": 3,
+    "beq": 3, "bne": 4, "blt": 1, "bge": 1, "bltu": 1, "bgeu": 1,
+    "mul": 0.5, "mulw": 0.3, "div": 0.1, "divu": 0.2, "rem": 0.1, "remu": 0.2,
+    "flw": 0.2, "fsw": 0.2, "fld": 0.5, "fsd": 0.5, "fadd.d": 0.2, "fmul.d": 0.2,
+    "fsgnj.d": 0.2, "fcvt.d.w": 0.1, "feq.d": 0.05, "fmadd.d": 0.05,
+    "ecall": 0.1, "ebreak": 0.05, "csrrs": 0.05, "fence": 0.05,
+}
+
+# The same for registers: the stack pointer, ra, s0 and the argument
+# registers dominate, which also makes more instructions compressible.
+REALISTIC_REGS = np.array([
+    4, 4, 8, 0.5, 0.5, 2, 2, 2, 6, 3, 8, 6, 4, 4, 4, 4,
+    1, 1, 1.5, 1.5, 1.5, 1.5, 1.5, 1.5, 1.5, 1.5, 1.5, 1.5, 1, 1, 1, 1,
+])
+
+MIXES = {"realistic": (REALISTIC_MIX, REALISTIC_REGS), "uniform": (None, None)}
+
+# Share of immediates drawn near zero in the realistic mix, and how near.
+SMALL_IMM = 0.85
+SMALL_IMM_RANGE = 32
+# Share of instructions whose rs1 is their rd (addi a0, a0, 1), which
+# compilers emit often and the compressed forms need.
+SAME_REG = 0.4
+
+# Operand columns of a corpus, -1 where the row has no such operand.
+OPERAND_FIELDS = ("rd", "rs1", "rs2", "rs3")
+
+
+Corpus = namedtuple("Corpus", ["data", "words", "spec", "rd", "rs1", "rs2", "rs3", "imm", "length"])
+
+
+def _rows(xlen, flen, mix):
+    # (index into INSTRUCTIONS, spec, weight) of every row the variant has.
+    weights, _regs = MIXES[mix]
+    index = {spec: i for i, spec in enumerate(INSTRUCTIONS)}
+    rows = []
+    for spec, _mask in decode_rows(xlen, flen):
+        weight = 1 if weights is None else weights.get(spec.mnemonic, 0)
+        if weight:
+            rows.append((index[spec], spec, weight))
+    return rows
+
+
+def _immediates(rng, spec, xlen, count, realistic):
+    _place, _bits, lowest, highest, align = imm_range(spec, xlen)
+    imm = rng.integers(lowest // align, highest // align + 1, count, dtype=np.int64) * align
+    if realistic:
+        # Memory offsets are multiples of the access size.
+        scale = MEMORY_WIDTHS.get(spec.mnemonic, (align, False))[0]
+        small = rng.integers(-SMALL_IMM_RANGE, SMALL_IMM_RANGE, count, dtype=np.int64) * scale
+        if lowest == 0:
+            small = np.abs(small)
+        small = np.clip(small, lowest - lowest % scale, highest - highest % scale)
+        imm = np.where(rng.random(count) < SMALL_IMM, small, imm)
+    return imm
+
+
+def generate(count, seed=0, xlen=4, flen=None, mix="realistic", compressed=0.0):
+    # count random instructions of the (XLEN, FLEN) variant drawn by mix,
+    # with their operands. compressed is the share of the instructions that
+    # have a compressed form which are emitted compressed. The same seed
+    # always gives the same corpus.
+    if (xlen, flen) not in VARIANTS:
+        raise ValueError(f"invalid variant XLEN={xlen}, FLEN={flen}")
+    rng = np.random.default_rng(seed)
+    rows = _rows(xlen, flen, mix)
+    realistic = MIXES[mix][1] is not None
+    weights = np.array([weight for _index, _spec, weight in rows], dtype=np.float64)
+    choice = rng.choice(len(rows), count, p=weights / weights.sum())
+
+    reg_p = None if not realistic else REALISTIC_REGS / REALISTIC_REGS.sum()
+    regs = {name: rng.choice(32, count, p=reg_p).astype(np.int64) for name in OPERAND_FIELDS}
+    if realistic:
+        regs["rs1"] = np.where(rng.random(count) < SAME_REG, regs["rd"], regs["rs1"])
+    imm = np.zeros(count, dtype=np.int64)
+    words = np.zeros(count, dtype=np.int64)
+    spec_index = np.zeros(count, dtype=np.int16)
+    # Compiled code leaves rounding to the dynamic mode.
+    if realistic:
+        rm = np.full(count, RM_DYN << 12, dtype=np.int64)
+    else:
+        rm = rng.choice(np.array(ROUNDING_MODES, dtype=np.int64), count) << 12
+
+    # Rows are filled in groups, one pass over the instructions of each.
+    order = np.argsort(choice, kind="stable")
+    bounds = np.concatenate(([0], np.cumsum(np.bincount(choice, minlength=len(rows)))))
+    for row, (index, spec, _weight) in enumerate(rows):
+        sel = order[bounds[row]:bounds[row + 1]]
+        if not len(sel):
+            continue
+        names = operands(spec, xlen)
+        word = np.full(len(sel), spec.match, dtype=np.int64)
+        for name in OPERAND_FIELDS:
+            if name in names:
+                word |= regs[name][sel] << REGISTERS[name][0]
+            else:
+                regs[name][sel] = -1
+        if "imm" in names:
+            value = _immediates(rng, spec, xlen, len(sel), realistic)
+            imm[sel] = value
+            word |= imm_range(spec, xlen)[0](value)
+        if has_rounding_mode(spec):
+            word |= rm[sel]
+        words[sel] = word & 0xffffffff
+        spec_index[sel] = index
+
+    words = words.astype(np.uint32)
+    length = np.full(count, 4, dtype=np.uint8)
+    halves = np.zeros(count, dtype=np.uint16)
+    if compressed:
+        table = compression_table(xlen)
+        keys = np.fromiter(table.keys(), dtype=np.uint32, count=len(table))
+        values = np.fromiter(table.values(), dtype=np.uint16, count=len(table))
+        by_key = np.argsort(keys)
+        keys, values = keys[by_key], values[by_key]
+        pos = np.minimum(np.searchsorted(keys, words), len(keys) - 1)
+        short = (keys[pos] == words) & (rng.random(count) < compressed)
+        halves = values[pos]
+        length[short] = 2
+
+    # Lay the instructions out back to back, as halfwords.
+    ends = np.cumsum(length // 2)
+    starts = ends - length // 2
+    out = np.empty(int(ends[-1]) if count else 0, dtype="<u2")
+    full = length == 4
+    out[starts[full]] = words[full] & 0xffff
+    out[starts[full] + 1] = words[full] >> 16
+    out[starts[~full]] = halves[~full]
+    return Corpus(out.tobytes(), words, spec_index, regs["rd"], regs["rs1"], regs["rs2"],
+                  regs["rs3"], imm, length)
+
+
+def round_trip(corpus, xlen=4, flen=None, base_addr=0):
+    # Decodes the corpus with decode_buffer() and returns the indices of
+    # the instructions that don't decode to the row and operands they were
+    # generated from.
+    decoded = decode_buffer(corpus.data, base_addr, xlen, flen)
+    if len(decoded) != len(corpus.spec):
+        raise ValueError(f"{len(decoded)} instructions decoded, {len(corpus.spec)} generated")
+    has_imm = np.array(["imm" in operands(spec, xlen) for spec in INSTRUCTIONS] + [False])
+    bad = (decoded.spec != corpus.spec) | (decoded.length != corpus.length)
+    bad |= has_imm[corpus.spec] & (decoded.imm != corpus.imm)
+    for name in ("rd", "rs1", "rs2"):
+        expected = getattr(corpus, name)
+        bad |= (expected >= 0) & (getattr(decoded, name) != expected)
+    bad |= (corpus.rs3 >= 0) & ((decoded.funct7 >> 2) != corpus.rs3)
+    return np.nonzero(bad)[0]
@@ -1,18 +1,60 @@
-from .insn import from_bytes
+from binaryninja.enums import BranchType
+from binaryninja.function import InstructionInfo
+from binaryninja.function import InstructionTextToken
+from binaryninja.function import InstructionTextTokenType
+
+from .cache import decode_cache
+from .info import BranchType as CoreBranchType
+from .tokens import TokenType as CoreTokenType
+
+
+BRANCH_TYPES = {t: BranchType[t.name] for t in CoreBranchType}
+TOKEN_TYPES = {t: InstructionTextTokenType[t.name] for t in CoreTokenType}
+
+
+def to_instruction_info(core_info):
+    info = InstructionInfo()
+    info.length = core_info.length
+    for branch_type, target in core_info.branches:
+        if target is None:
+            info.add_branch(BRANCH_TYPES[branch_type])
+        else:
+            info.add_branch(BRANCH_TYPES[branch_type], target)
+    return info
+
+
+# Binary Ninja tokens for the decoder's immutable ones. Branch targets
+# differ per address and are converted every time.
+_text_tokens = {}
+
+
+def to_text_tokens(core_tokens):
+    result = []
+    for t in core_tokens:
+        token = _text_tokens.get(t)
+        if token is None:
+            token = InstructionTextToken(TOKEN_TYPES[t.type], t.text, t.value)
+            if t.type is not CoreTokenType.PossibleAddressToken:
+                _text_tokens[t] = token
+        result.append(token)
+    return result
+
 
 class RiscVDisassembler(object):
-    def __init__(self, XLen, FLen=None):
+    def __init__(self, XLen, FLen=None, cache=decode_cache):
         self.XLen = XLen
         self.FLen = FLen
+        self.cache = cache
 
     def get_insn_info(self, data, addr):
-        insn = from_bytes(data, addr, self.XLen, self.FLen)
+        insn = self.cache.decode(data, addr, self.XLen, self.FLen)
         if insn is None:
             return None
-        return insn.get_info(addr)
+        return to_instruction_info(insn.get_info(addr))
 
     def get_insn_text(self, data, addr):
-        insn = from_bytes(data, addr, self.XLen, self.FLen)
+        insn = self.cache.decode(data, addr, self.XLen, self.FLen)
         if insn is None:
             return None
-        return insn.get_text(addr)
+        tokens, length = insn.get_text(addr)
+        return (to_text_tokens(tokens), length)
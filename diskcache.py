@@ -0,0 +1,196 @@
+import hashlib
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+from .bulk import DECODER_VERSION, FIELDS, DecodedBuffer, decode_buffer
+from .cfg import CFG_VERSION, ControlFlowGraph, build_cfg
+from .prologue import FRAME, PATTERNS, DEFAULT_MIN_SCORE, candidates, rank_prologues
+from .variants.rv32 import INSTRUCTIONS
+
+try:
+    import fcntl
+except ImportError:
+    # No flock on Windows: entries are still written atomically, but an
+    # eviction may race with a load in another process.
+    fcntl = None
+
+
+# Overrides the cache directory, "0" or "" turns the cache off.
+ENV_VAR = "RISCV_CACHE_DIR"
+
+DEFAULT_MAX_BYTES = 1 << 30
+
+# Changes whenever decoding would give different arrays: the version, the
+# instruction table and the layout of the bulk arrays.
+DECODER_FINGERPRINT = hashlib.sha256(
+    repr((DECODER_VERSION, INSTRUCTIONS, FIELDS)).encode()).hexdigest()[:16]
+
+
+def default_path():
+    path = os.environ.get(ENV_VAR)
+    if path is not None:
+        return path if path not in ("", "0") else None
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "riscv-binja")
+
+
+class _Lock(object):
+    def __init__(self, path, exclusive):
+        self.path = path
+        self.exclusive = exclusive
+        self.file = None
+
+    def __enter__(self):
+        if fcntl is not None:
+            self.file = open(self.path, "a+b")
+            fcntl.flock(self.file, fcntl.LOCK_EX if self.exclusive else fcntl.LOCK_SH)
+        return self
+
+    def __exit__(self, *exc):
+        if self.file is not None:
+            fcntl.flock(self.file, fcntl.LOCK_UN)
+            self.file.close()
+            self.file = None
+
+
+class DiskCache(object):
+    # Arrays of analysis results on disk, one directory of .npy files per
+    # entry, loaded memory mapped. Entries are written to a temporary
+    # directory and renamed into place under an exclusive flock, loads
+    # hold a shared one, so another process never sees half an entry or
+    # has one evicted while opening it; mappings stay valid after that.
+    # The least recently used entries go once the cache exceeds max_bytes.
+    def __init__(self, path=None, max_bytes=DEFAULT_MAX_BYTES):
+        self.path = path or default_path()
+        if self.path is None:
+            raise ValueError(f"the cache is turned off by {ENV_VAR}")
+        self.max_bytes = max_bytes
+        os.makedirs(os.path.join(self.path, "tmp"), exist_ok=True)
+        self._lock_path = os.path.join(self.path, "lock")
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, kind, xlen, flen, *parts):
+        # Content hash of parts, bytes-like objects or anything with a
+        # stable repr, for results of kind with the current decoder.
+        h = hashlib.sha256(repr((kind, DECODER_FINGERPRINT, xlen, flen)).encode())
+        for part in parts:
+            try:
+                data = memoryview(part).cast("B")
+            except TypeError:
+                data = repr(part).encode()
+            h.update(len(data).to_bytes(8, "little"))
+            h.update(data)
+        return f"{kind}-{h.hexdigest()[:40]}"
+
+    def _entry(self, key):
+        return os.path.join(self.path, key)
+
+    def load(self, key):
+        # name -> read-only memory mapped array, None if key isn't cached.
+        entry = self._entry(key)
+        with _Lock(self._lock_path, exclusive=False):
+            try:
+                names = os.listdir(entry)
+            except FileNotFoundError:
+                self.misses += 1
+                return None
+            arrays = {
+                name[:-4]: np.load(os.path.join(entry, name), mmap_mode="r")
+                for name in names if name.endswith(".npy")
+            }
+            try:
+                os.utime(entry)
+            except OSError:
+                pass
+        self.hits += 1
+        return arrays
+
+    def store(self, key, arrays):
+        tmp = tempfile.mkdtemp(prefix=key, dir=os.path.join(self.path, "tmp"))
+        try:
+            for name, values in arrays.items():
+                np.save(os.path.join(tmp, name + ".npy"), np.asarray(values), allow_pickle=False)
+            with _Lock(self._lock_path, exclusive=True):
+                try:
+                    os.replace(tmp, self._entry(key))
+                except OSError:
+                    # Another process stored the same entry first.
+                    pass
+                self._evict()
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)
+
+    def _entries(self):
+        # (last use, size, path) of every entry. Without fcntl nothing
+        # stops another process from removing entries meanwhile, those are
+        # left out.
+        result = []
+        for entry in os.scandir(self.path):
+            if not entry.is_dir() or entry.name == "tmp":
+                continue
+            try:
+                size = 0
+                for f in os.scandir(entry.path):
+                    size += f.stat().st_size
+                result.append((entry.stat().st_mtime, size, entry.path))
+            except FileNotFoundError:
+                continue
+        return result
+
+    def _evict(self):
+        entries = sorted(self._entries())
+        total = sum(size for _mtime, size, _path in entries)
+        for _mtime, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
+
+    def size(self):
+        with _Lock(self._lock_path, exclusive=False):
+            return sum(size for _mtime, size, _path in self._entries())
+
+    def clear(self):
+        with _Lock(self._lock_path, exclusive=True):
+            for _mtime, _size, path in self._entries():
+                shutil.rmtree(path, ignore_errors=True)
+
+    def cached(self, key, compute):
+        # The arrays of key, from compute() and stored if they aren't
+        # cached yet.
+        arrays = self.load(key)
+        if arrays is None:
+            arrays = compute()
+            self.store(key, arrays)
+        return arrays
+
+
+def cached_decode_buffer(cache, buf, base_addr, xlen, flen):
+    # decode_buffer() through cache, the arrays memory mapped when cached.
+    key = cache.key("decode", xlen, flen, base_addr, buf)
+    arrays = cache.cached(key, lambda: decode_buffer(buf, base_addr, xlen, flen).arrays())
+    return DecodedBuffer(base_addr, xlen, flen, arrays)
+
+
+def cached_prologues(cache, buf, base_addr, xlen, flen, patterns=PATTERNS, frame=FRAME,
+                     min_score=DEFAULT_MIN_SCORE):
+    # scan_prologues() through cache.
+    key = cache.key("prologues", xlen, flen, base_addr, patterns, frame, min_score, buf)
+    ranked = cache.cached(key, lambda: rank_prologues(
+        cached_decode_buffer(cache, buf, base_addr, xlen, flen), patterns, frame, min_score))
+    return candidates(ranked, patterns)
+
+
+def cached_cfg(cache, image, xlen, flen, entries, names=None):
+    # build_cfg() through cache, for the same image contents and entries.
+    parts = []
+    for data, addr, executable in image.segments:
+        parts += [addr, executable, data]
+    key = cache.key(
+        "cfg", CFG_VERSION, xlen, flen, list(entries), sorted((names or {}).items()), *parts)
+    arrays = cache.cached(key, lambda: build_cfg(image, xlen, flen, entries, names).arrays())
+    return ControlFlowGraph.from_arrays(arrays)
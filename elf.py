@@ -0,0 +1,175 @@
+import mmap
+
+from collections import namedtuple
+from struct import error as StructError, unpack_from
+
+from .isa import attributes_arch, isa_from_elf
+
+
+EM_RISCV = 243
+
+ELFCLASS32 = 1
+ELFCLASS64 = 2
+ELFDATA2LSB = 1
+
+SHT_SYMTAB = 2
+SHT_NOBITS = 8
+SHT_RISCV_ATTRIBUTES = 0x70000003
+SHF_ALLOC = 0x2
+SHF_EXECINSTR = 0x4
+
+STT_FUNC = 2
+
+# ELF header (after e_ident) and section header formats per class.
+FORMATS = {
+    ELFCLASS32: ("<HHIIIIIHHHHHH", "<IIIIIIIIII"),
+    ELFCLASS64: ("<HHIQQQIHHHHHH", "<IIQQQQIIQQ"),
+}
+# Symbol table entries per class: (name, value, info) at these positions.
+SYMBOL_FORMATS = {
+    ELFCLASS32: ("<IIIBBH", (0, 1, 3)),
+    ELFCLASS64: ("<IBBHQQ", (0, 4, 1)),
+}
+
+Section = namedtuple(
+    "Section", ["name", "type", "flags", "addr", "offset", "size", "link", "entsize"])
+
+
+def map_file(path):
+    # Read-only mapping of the whole file, pages are only faulted in while
+    # they are decoded so memory use doesn't grow with the image size.
+    with open(path, "rb") as f:
+        if not f.seek(0, 2):
+            return b""
+        mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    if hasattr(mapping, "madvise"):
+        mapping.madvise(mmap.MADV_SEQUENTIAL)
+    return mapping
+
+
+class ElfFile(object):
+    def __init__(self, buf):
+        self._buf = buf
+        self.data = data = memoryview(buf)
+        if data[:4] != b"\x7fELF":
+            raise ValueError("not an ELF file")
+        if data[5] != ELFDATA2LSB:
+            raise ValueError("only little endian ELF files are supported")
+
+        self.elf_class = data[4]
+        if self.elf_class not in FORMATS:
+            raise ValueError(f"unknown ELF class {self.elf_class}")
+        header, shdr = FORMATS[self.elf_class]
+
+        (_type, self.machine, _version, self.entry, _phoff, shoff, self.flags,
+         _ehsize, _phentsize, _phnum, shentsize, shnum,
+         shstrndx) = unpack_from(header, data, 16)
+
+        raw = [unpack_from(shdr, data, shoff + i * shentsize) for i in range(shnum)]
+        names = raw[shstrndx][4] if shnum else 0
+        self.sections = [
+            Section(self._string(names + s[0]), s[1], s[2], s[3], s[4], s[5], s[6], s[9])
+            for s in raw
+        ]
+
+    @classmethod
+    def open(cls, path):
+        return cls(map_file(path))
+
+    def close(self):
+        self.data.release()
+        if isinstance(self._buf, mmap.mmap):
+            try:
+                self._buf.close()
+            except BufferError:
+                # Section views are still alive, the mapping goes away
+                # with the last of them.
+                pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _string(self, offset):
+        end = self._buf.find(b"\0", offset)
+        return bytes(self.data[offset:end]).decode("utf-8", "replace")
+
+    @property
+    def xlen(self):
+        return 4 if self.elf_class == ELFCLASS32 else 8
+
+    @property
+    def is_riscv(self):
+        return self.machine == EM_RISCV
+
+    @property
+    def isa(self):
+        arch = None
+        for section in self.sections:
+            if section.type == SHT_RISCV_ATTRIBUTES:
+                arch = attributes_arch(self.section_data(section))
+                break
+        return isa_from_elf(self.xlen, self.flags, arch)
+
+    def section(self, name):
+        for section in self.sections:
+            if section.name == name:
+                return section
+        return None
+
+    def executable_sections(self):
+        return [
+            s for s in self.sections
+            if s.flags & SHF_EXECINSTR and s.type != SHT_NOBITS and s.size
+        ]
+
+    def allocated_sections(self):
+        return [s for s in self.sections if s.flags & SHF_ALLOC and s.type != SHT_NOBITS and s.size]
+
+    def section_data(self, section):
+        # A view into the mapping, not a copy.
+        if section.type == SHT_NOBITS:
+            return self.data[0:0]
+        return self.data[section.offset:section.offset + section.size]
+
+    def function_symbols(self):
+        # (addr, name) of the STT_FUNC symbols in .symtab, empty if the file
+        # is stripped.
+        fmt, (name, value, info) = SYMBOL_FORMATS[self.elf_class]
+        result = []
+        for section in self.sections:
+            if section.type != SHT_SYMTAB or not section.entsize:
+                continue
+            strings = self.sections[section.link].offset
+            for i in range(section.size // section.entsize):
+                sym = unpack_from(fmt, self.data, section.offset + i * section.entsize)
+                if sym[info] & 0xf == STT_FUNC and sym[value]:
+                    result.append((sym[value], self._string(strings + sym[name])))
+        return result
+
+
+def elf_isa(read):
+    # Isa of a RISC-V ELF file, None if it isn't one. Only the headers and
+    # .riscv.attributes are read, through read(offset, size) -> bytes.
+    try:
+        ident = read(0, 16)
+        if ident[:4] != b"\x7fELF" or ident[5] != ELFDATA2LSB or ident[4] not in FORMATS:
+            return None
+        header, shdr = FORMATS[ident[4]]
+        (_type, machine, _version, _entry, _phoff, shoff, flags,
+         _ehsize, _phentsize, _phnum, shentsize, shnum,
+         _shstrndx) = unpack_from(header, read(16, 48), 0)
+        if machine != EM_RISCV:
+            return None
+        table = read(shoff, shnum * shentsize)
+        arch = None
+        for i in range(shnum):
+            s = unpack_from(shdr, table, i * shentsize)
+            if s[1] == SHT_RISCV_ATTRIBUTES:
+                arch = attributes_arch(read(s[4], s[5]))
+                break
+    except (IndexError, StructError):
+        return None
+    return isa_from_elf(4 if ident[4] == ELFCLASS32 else 8, flags, arch)
@@ -0,0 +1,478 @@
+from struct import Struct
+
+from .variants.rv32 import CSR_SEMS, DECODERS, MEMORY_WIDTHS, InstructionType
+
+
+PAGE_BITS = 12
+PAGE_SIZE = 1 << PAGE_BITS
+PAGE_MASK = PAGE_SIZE - 1
+
+# Longest basic block, in instructions.
+MAX_BLOCK = 64
+
+UNPACK = {
+    (size, signed): Struct("<" + (fmt.lower() if signed else fmt)).unpack_from
+    for size, fmt in ((1, "B"), (2, "H"), (4, "I"), (8, "Q"))
+    for signed in (False, True)
+}
+PACK = {size: Struct("<" + fmt).pack_into for size, fmt in ((1, "B"), (2, "H"), (4, "I"), (8, "Q"))}
+
+# Counters readable through the user CSRs cycle, time and instret (and
+# their high halves on RV32). All three count retired instructions.
+COUNTER_CSRS = {0xc00, 0xc01, 0xc02}
+COUNTER_HIGH_CSRS = {0xc80, 0xc81, 0xc82}
+
+
+class EmulatorError(Exception):
+    pass
+
+
+class MemoryFault(EmulatorError):
+    def __init__(self, addr, size, write=False):
+        super().__init__(f"{'write' if write else 'read'} of {size} bytes @ {addr:#x}")
+        self.addr = addr
+        self.size = size
+        self.write = write
+
+
+class IllegalInstruction(EmulatorError):
+    def __init__(self, pc):
+        super().__init__(f"illegal or unsupported instruction @ {pc:#x}")
+        self.pc = pc
+
+
+class Trap(EmulatorError):
+    # An ecall or ebreak without a hook.
+    def __init__(self, cause, pc):
+        super().__init__(f"{cause} @ {pc:#x}")
+        self.cause = cause
+        self.pc = pc
+
+
+class Memory(object):
+    # Sparse memory of 4K pages, only the mapped ones exist. Writes to
+    # pages holding translated code are reported through on_code_write.
+    def __init__(self):
+        self.pages = {}
+        self.code_pages = set()
+        self.on_code_write = None
+
+    def map(self, addr, size, data=None):
+        for page in range(addr >> PAGE_BITS, (addr + max(size, 1) - 1 >> PAGE_BITS) + 1):
+            if page not in self.pages:
+                self.pages[page] = bytearray(PAGE_SIZE)
+        if data is not None:
+            self.write(addr, data)
+
+    def is_mapped(self, addr):
+        return addr >> PAGE_BITS in self.pages
+
+    def read(self, addr, size):
+        out = bytearray()
+        while size:
+            page = self.pages.get(addr >> PAGE_BITS)
+            if page is None:
+                raise MemoryFault(addr, size)
+            offset = addr & PAGE_MASK
+            chunk = min(size, PAGE_SIZE - offset)
+            out += page[offset:offset + chunk]
+            addr += chunk
+            size -= chunk
+        return bytes(out)
+
+    def write(self, addr, data):
+        data = memoryview(data).cast("B")
+        while data:
+            page_number = addr >> PAGE_BITS
+            page = self.pages.get(page_number)
+            if page is None:
+                raise MemoryFault(addr, len(data), write=True)
+            if page_number in self.code_pages:
+                self.on_code_write(page_number)
+            offset = addr & PAGE_MASK
+            chunk = min(len(data), PAGE_SIZE - offset)
+            page[offset:offset + chunk] = data[:chunk]
+            addr += chunk
+            data = data[chunk:]
+
+    def load(self, addr, size, signed=False):
+        page = self.pages.get(addr >> PAGE_BITS)
+        offset = addr & PAGE_MASK
+        if page is None or offset + size > PAGE_SIZE:
+            return int.from_bytes(self.read(addr, size), "little", signed=signed)
+        return UNPACK[size, signed](page, offset)[0]
+
+    def store(self, addr, size, value):
+        value &= (1 << size * 8) - 1
+        page_number = addr >> PAGE_BITS
+        page = self.pages.get(page_number)
+        offset = addr & PAGE_MASK
+        if page is None or offset + size > PAGE_SIZE:
+            self.write(addr, value.to_bytes(size, "little"))
+            return
+        if page_number in self.code_pages:
+            self.on_code_write(page_number)
+        PACK[size](page, offset, value)
+
+
+def _div(a, b):
+    # Signed division rounding towards zero, with the RISC-V results for
+    # division by zero. Overflow wraps to the dividend once masked.
+    if not b:
+        return -1
+    q = abs(a) // abs(b)
+    return -q if (a < 0) != (b < 0) else q
+
+
+def _rem(a, b):
+    if not b:
+        return a
+    r = abs(a) % abs(b)
+    return -r if a < 0 else r
+
+
+class Block(object):
+    __slots__ = ("pc", "end", "length", "code", "links", "valid")
+
+    def __init__(self, pc, end, length, code):
+        self.pc = pc
+        self.end = end
+        self.length = length
+        self.code = code
+        # next pc -> Block, filled in as the exits are taken.
+        self.links = {}
+        self.valid = True
+
+
+class Translator(object):
+    # Turns the instructions of a basic block into the source of one Python
+    # function, def block(x): ... return next_pc, with registers, widths and
+    # immediates folded into constants.
+    def __init__(self, xlen):
+        self.xlen = xlen
+        self.bits = xlen * 8
+        self.mask = (1 << self.bits) - 1
+        self.handlers = {
+            "load": self._load, "store": self._store,
+            "lui": self._lui, "auipc": self._auipc,
+            # Code writes drop the stale translations right away, so
+            # fence.i has nothing left to do.
+            "fence": self._nop, "fence.i": self._nop,
+        }
+
+    @staticmethod
+    def _reg(r, width_mask=None):
+        if not r:
+            return "0"
+        if width_mask is not None:
+            return f"(x[{r}] & {width_mask:#x})"
+        return f"x[{r}]"
+
+    def _width(self, sem):
+        # sem -> (base sem, operand width in bits), the *W and *D
+        # instructions work on the low 32/64 bits.
+        if sem in ALU_EXPRS:
+            return sem, self.bits
+        if sem[-1] in "wd" and sem[:-1] in ALU_EXPRS:
+            return sem[:-1], 32 if sem[-1] == "w" else 64
+        return None, None
+
+    def _alu(self, insn):
+        base, width = self._width(insn.sem)
+        if base is None or width > self.bits:
+            return None
+        if not insn.rd:
+            return []
+        width_mask = (1 << width) - 1 if width < self.bits else None
+        a = self._reg(insn.rs1, width_mask)
+        if insn.insn_type == InstructionType.RType:
+            b = self._reg(insn.rs2, width_mask)
+            if base in SHIFT_EXPRS:
+                b = f"({b} & {width - 1})"
+        else:
+            b = f"{insn.imm & (1 << width) - 1:#x}"
+        mask = (1 << width) - 1
+        sign = 1 << width - 1
+        expr = ALU_EXPRS[base].format(a=a, b=b, m=f"{mask:#x}", s=f"{sign:#x}", w=width)
+        if width < self.bits:
+            expr = f"((({expr}) ^ {sign:#x}) - {sign:#x}) & {self.mask:#x}"
+        return [f"x[{insn.rd}] = {expr}"]
+
+    def _address(self, insn):
+        if not insn.imm:
+            return self._reg(insn.rs1)
+        return f"({self._reg(insn.rs1)} + {insn.imm:#x}) & {self.mask:#x}"
+
+    def _load(self, insn):
+        size, signed = MEMORY_WIDTHS[insn.mnemonic]
+        if size > self.xlen:
+            return None
+        if not insn.rd:
+            # Still performed, for the fault.
+            return [f"load({self._address(insn)}, {size})"]
+        value = f"load({self._address(insn)}, {size}, {signed})"
+        if signed:
+            value = f"{value} & {self.mask:#x}"
+        return [f"x[{insn.rd}] = {value}"]
+
+    def _store(self, insn):
+        size, _signed = MEMORY_WIDTHS[insn.mnemonic]
+        if size > self.xlen:
+            return None
+        return [f"store({self._address(insn)}, {size}, {self._reg(insn.rs2)})"]
+
+    def _lui(self, insn):
+        return [f"x[{insn.rd}] = {insn.imm & self.mask:#x}"] if insn.rd else []
+
+    def _auipc(self, insn, addr=None):
+        return [f"x[{insn.rd}] = {addr + insn.imm & self.mask:#x}"] if insn.rd else []
+
+    def _nop(self, insn):
+        return []
+
+    def _csr(self, insn):
+        if insn.sem[-1] == "i":
+            value = f"{insn.rs1:#x}"
+        else:
+            value = self._reg(insn.rs1)
+        call = f"csr({insn.imm:#x}, {insn.sem.rstrip('i')!r}, {value})"
+        return [f"x[{insn.rd}] = {call}" if insn.rd else call]
+
+    def body(self, insn, addr):
+        # Source lines of a straight-line instruction, None when it has to
+        # end the block or is not supported.
+        sem = insn.sem
+        if sem == "auipc":
+            return self._auipc(insn, addr)
+        handler = self.handlers.get(sem)
+        if handler is not None:
+            return handler(insn)
+        if sem in CSR_SEMS:
+            return self._csr(insn)
+        if insn.insn_type in (InstructionType.RType, InstructionType.IType):
+            if insn.spec.regs and "f" in insn.spec.regs:
+                return None
+            return self._alu(insn)
+        return None
+
+    def exit(self, insn, addr):
+        # Source lines ending the block with the instruction at addr, None
+        # if it is not a control transfer.
+        sem = insn.sem
+        next_pc = addr + insn.length & self.mask
+        if insn.insn_type == InstructionType.BType:
+            a, b = self._reg(insn.rs1), self._reg(insn.rs2)
+            if sem in SIGNED_BRANCHES:
+                sign = 1 << self.bits - 1
+                a = f"({a} ^ {sign:#x})"
+                b = f"({b} ^ {sign:#x})"
+            target = addr + insn.imm & self.mask
+            return [f"if {a} {BRANCH_OPS[sem]} {b}:", f"    return {target:#x}",
+                    f"return {next_pc:#x}"]
+        if sem == "jal":
+            lines = [f"x[{insn.rd}] = {next_pc:#x}"] if insn.rd else []
+            return lines + [f"return {addr + insn.imm & self.mask:#x}"]
+        if sem == "jalr":
+            # The target has to be read before rd is overwritten.
+            lines = [f"t = {self._address(insn)} & {self.mask - 1:#x}"]
+            if insn.rd:
+                lines.append(f"x[{insn.rd}] = {next_pc:#x}")
+            return lines + ["return t"]
+        if sem in ("ecall", "ebreak"):
+            return [f"return trap({sem!r}, {addr:#x}, {next_pc:#x})"]
+        return None
+
+
+# Expressions of the ALU sems on operands a and b masked to the operand
+# width w, with m the width mask and s its sign bit.
+ALU_EXPRS = {
+    "add": "({a} + {b}) & {m}",
+    "sub": "({a} - {b}) & {m}",
+    "xor": "{a} ^ {b}",
+    "or": "{a} | {b}",
+    "and": "{a} & {b}",
+    "sll": "({a} << {b}) & {m}",
+    "srl": "{a} >> {b}",
+    "sra": "((({a} ^ {s}) - {s}) >> {b}) & {m}",
+    "slt": "int(({a} ^ {s}) < ({b} ^ {s}))",
+    "sltu": "int({a} < {b})",
+    "mul": "({a} * {b}) & {m}",
+    "mulh": "((({a} ^ {s}) - {s}) * (({b} ^ {s}) - {s}) >> {w}) & {m}",
+    "mulhsu": "((({a} ^ {s}) - {s}) * {b} >> {w}) & {m}",
+    "mulhu": "{a} * {b} >> {w}",
+    "div": "div(({a} ^ {s}) - {s}, ({b} ^ {s}) - {s}) & {m}",
+    "divu": "({a} // {b} if {b} else {m})",
+    "rem": "rem(({a} ^ {s}) - {s}, ({b} ^ {s}) - {s}) & {m}",
+    "remu": "({a} % {b} if {b} else {a})",
+}
+
+SHIFT_EXPRS = {"sll", "srl", "sra"}
+
+# Flipping the sign bit of both operands turns a signed comparison into an
+# unsigned one.
+BRANCH_OPS = {"eq": "==", "ne": "!=", "lt": "<", "ge": ">=", "ltu": "<", "geu": ">="}
+SIGNED_BRANCHES = {"lt", "ge"}
+
+
+class Emulator(object):
+    # RV32IM (xlen=4) or RV64IM (xlen=8) interpreter. Basic blocks are
+    # translated to Python functions once, cached by address and chained to
+    # the blocks they branch to, so hot loops run without decoding.
+    def __init__(self, xlen=4, memory=None, ecall=None, ebreak=None):
+        if xlen not in (4, 8):
+            raise ValueError(f"unsupported XLEN {xlen * 8}")
+        self.xlen = xlen
+        self.mask = (1 << xlen * 8) - 1
+        self.decoder = DECODERS[(xlen, None)]
+        self.translator = Translator(xlen)
+        self.memory = memory if memory is not None else Memory()
+        self.memory.on_code_write = self.invalidate_page
+        # Hooks called with the emulator, pc pointing at the ecall/ebreak.
+        # Execution resumes after it unless the hook sets pc or calls stop().
+        self.hooks = {"ecall": ecall, "ebreak": ebreak}
+        self.x = [0] * 32
+        self.pc = 0
+        self.csrs = {}
+        self.instret = 0
+        self.stopped = False
+        self.blocks = {}
+        self.page_blocks = {}
+        self.translations = 0
+        self.invalidations = 0
+        self.namespace = {
+            "load": self.memory.load, "store": self.memory.store,
+            "div": _div, "rem": _rem, "csr": self._csr, "trap": self._trap,
+        }
+
+    def stop(self):
+        self.stopped = True
+
+    def _trap(self, cause, pc, next_pc):
+        hook = self.hooks[cause]
+        if hook is None:
+            raise Trap(cause, pc)
+        self.pc = pc
+        hook(self)
+        return next_pc if self.pc == pc else self.pc
+
+    def _csr(self, csr, op, value):
+        if csr in COUNTER_CSRS:
+            return self.instret & self.mask
+        if csr in COUNTER_HIGH_CSRS and self.xlen == 4:
+            return self.instret >> 32 & self.mask
+        old = self.csrs.get(csr, 0)
+        if op == "csrrw":
+            self.csrs[csr] = value
+        elif op == "csrrs":
+            self.csrs[csr] = old | value
+        else:
+            self.csrs[csr] = old & ~value & self.mask
+        return old
+
+    def _fetch(self, pc):
+        try:
+            data = self.memory.read(pc, 4)
+        except MemoryFault:
+            # A compressed instruction at the end of the mapped memory.
+            data = self.memory.read(pc, 2)
+        return self.decoder.from_bytes(data, pc)
+
+    def translate(self, pc):
+        translator = self.translator
+        lines = []
+        addr = pc
+        length = 0
+        tail = None
+        while length < MAX_BLOCK:
+            insn = self._fetch(addr)
+            if insn is None:
+                break
+            body = translator.body(insn, addr)
+            if body is not None:
+                lines += body
+                addr += insn.length
+                length += 1
+                continue
+            tail = translator.exit(insn, addr)
+            if tail is not None:
+                lines += tail
+                addr += insn.length
+                length += 1
+            break
+        if not length:
+            raise IllegalInstruction(pc)
+        if tail is None:
+            # Ends before an instruction that cannot be translated or after
+            # MAX_BLOCK instructions, the next block starts there.
+            lines.append(f"return {addr:#x}")
+
+        source = "def block(x):\n" + "".join(f"    {line}\n" for line in lines)
+        namespace = dict(self.namespace)
+        exec(compile(source, f"<block {pc:#x}>", "exec"), namespace)
+        block = Block(pc, addr, length, namespace["block"])
+        self.blocks[pc] = block
+        for page in range(pc >> PAGE_BITS, ((addr - 1) >> PAGE_BITS) + 1):
+            self.page_blocks.setdefault(page, []).append(block)
+            self.memory.code_pages.add(page)
+        self.translations += 1
+        return block
+
+    def invalidate_page(self, page):
+        # Drops the translations of code on a written page. Links to them
+        # are dropped lazily, when the chaining block sees they are invalid.
+        # Like on hardware without fence.i, the running block finishes with
+        # its stale code.
+        for block in self.page_blocks.pop(page, ()):
+            block.valid = False
+            if self.blocks.get(block.pc) is block:
+                del self.blocks[block.pc]
+        self.memory.code_pages.discard(page)
+        self.invalidations += 1
+
+    def flush(self):
+        for page in list(self.page_blocks):
+            self.invalidate_page(page)
+
+    def run(self, pc=None, max_insns=None, until=None):
+        # Runs from pc (default: self.pc) until stop() is called, `until` is
+        # reached or at least max_insns instructions have retired. Returns
+        # the number of instructions executed. On an exception, pc is the
+        # start of the block it was raised in, or the address that could
+        # not be translated.
+        if pc is not None:
+            self.pc = pc
+        self.stopped = False
+        x = self.x
+        blocks = self.blocks
+        limit = max_insns if max_insns is not None else float("inf")
+        executed = 0
+        pc = self.pc
+        block = blocks.get(pc) or self.translate(pc)
+        try:
+            while pc != until:
+                pc = block.code(x)
+                executed += block.length
+                if self.stopped or executed >= limit or pc == until:
+                    break
+                links = block.links
+                block = links.get(pc)
+                if block is None or not block.valid:
+                    block = links[pc] = blocks.get(pc) or self.translate(pc)
+        finally:
+            self.pc = pc
+            self.instret += executed
+        return executed
+
+    def call(self, addr, *args, stack=None, max_insns=None):
+        # Calls the function at addr with integer arguments in a0-a7 and
+        # returns a0. It returns to address 0, which is never executed.
+        if len(args) > 8:
+            raise ValueError("at most 8 arguments")
+        x = self.x
+        for i, arg in enumerate(args):
+            x[10 + i] = arg & self.mask
+        if stack is not None:
+            x[2] = stack
+        x[1] = 0
+        self.run(addr, max_insns=max_insns, until=0)
+        return x[10]
@@ -0,0 +1,183 @@
+from .variants.rv32 import (
+    CSR_SEMS, INSTRUCTIONS, RD_MASK, REG_FILES, RESERVED_ROUNDING_MODES, RS1_MASK, RS2_MASK,
+    InstructionType, has_rounding_mode, shamt_width
+)
+from .variants.rvc import expansion_table
+
+
+RS3_MASK = 0b11111 << 27
+
+# Rounding mode of floating point rows that leave funct3 to it: dynamic.
+RM_DYN = 0b111
+# The valid rounding modes.
+ROUNDING_MODES = tuple(rm for rm in range(8) if rm not in RESERVED_ROUNDING_MODES)
+
+SPECS = {spec.mnemonic: spec for spec in INSTRUCTIONS}
+
+# Register operands: (shift, bits, index into InsnSpec.regs).
+REGISTERS = {
+    "rd": (7, RD_MASK, 0), "rs1": (15, RS1_MASK, 1), "rs2": (20, RS2_MASK, 2),
+    "rs3": (27, RS3_MASK, 3),
+}
+
+# Operands of each format, the names encode() takes them by.
+FORMAT_OPERANDS = {
+    InstructionType.RType: ("rd", "rs1", "rs2"),
+    InstructionType.IType: ("rd", "rs1", "imm"),
+    InstructionType.SType: ("rs1", "rs2", "imm"),
+    InstructionType.BType: ("rs1", "rs2", "imm"),
+    InstructionType.UType: ("rd", "imm"),
+    InstructionType.JType: ("rd", "imm"),
+    InstructionType.R4Type: ("rd", "rs1", "rs2", "rs3"),
+}
+
+
+# Immediate placement by kind. Plain shifts and masks, so they work on
+# Python ints and NumPy integer arrays alike.
+def place_i(imm):
+    return (imm & 0xfff) << 20
+
+
+def place_s(imm):
+    return (((imm >> 5) & 0x7f) << 25) | ((imm & 0x1f) << 7)
+
+
+def place_b(imm):
+    return ((((imm >> 12) & 1) << 31) | (((imm >> 5) & 0x3f) << 25) |
+            (((imm >> 1) & 0xf) << 8) | (((imm >> 11) & 1) << 7))
+
+
+def place_u(imm):
+    return imm & 0xfffff000
+
+
+def place_j(imm):
+    return ((((imm >> 20) & 1) << 31) | (((imm >> 1) & 0x3ff) << 21) |
+            (((imm >> 11) & 1) << 20) | (((imm >> 12) & 0xff) << 12))
+
+
+# kind -> (place, bits, lowest, highest, alignment). Shift amounts are
+# "shift" with their range from the XLEN.
+IMMEDIATES = {
+    "i": (place_i, 0xfff00000, -0x800, 0x7ff, 1),
+    "csr": (place_i, 0xfff00000, 0, 0xfff, 1),
+    "s": (place_s, 0xfe000f80, -0x800, 0x7ff, 1),
+    "b": (place_b, 0xfe000f80, -0x1000, 0xffe, 2),
+    "u": (place_u, 0xfffff000, -0x80000000, 0x7ffff000, 0x1000),
+    "j": (place_j, 0xfffff000, -0x100000, 0xffffe, 2),
+}
+
+
+def imm_kind(spec, xlen):
+    # Key into IMMEDIATES, "shift" or None for rows without an immediate.
+    fmt = spec.fmt
+    if fmt == InstructionType.IType:
+        if shamt_width(spec, xlen) is not None:
+            return "shift"
+        return "csr" if spec.sem in CSR_SEMS else "i"
+    return {
+        InstructionType.SType: "s",
+        InstructionType.BType: "b",
+        InstructionType.UType: "u",
+        InstructionType.JType: "j",
+    }.get(fmt)
+
+
+def imm_range(spec, xlen):
+    # (place, bits, lowest, highest, alignment) of the immediate of spec.
+    kind = imm_kind(spec, xlen)
+    if kind == "shift":
+        width = shamt_width(spec, xlen)
+        return place_i, ((1 << width) - 1) << 20, 0, (1 << width) - 1, 1
+    return IMMEDIATES[kind]
+
+
+_operands = {}
+
+
+def operands(spec, xlen=4):
+    # Names of the operands of spec, the fields its mask leaves free.
+    key = (spec, xlen)
+    result = _operands.get(key)
+    if result is None:
+        result = []
+        for name in FORMAT_OPERANDS[spec.fmt]:
+            bits = imm_range(spec, xlen)[1] if name == "imm" else REGISTERS[name][1]
+            if bits & ~spec.mask:
+                result.append(name)
+        result = _operands[key] = tuple(result)
+    return result
+
+
+def _register(value, reg_file, mnemonic):
+    if isinstance(value, str):
+        names = REG_FILES[reg_file]
+        if value in names:
+            return names.index(value)
+        if value[:1] == reg_file and value[1:].isdigit():
+            value = int(value[1:])
+        else:
+            raise ValueError(f"{mnemonic}: {value!r} is not an {reg_file} register")
+    if not isinstance(value, int) or not 0 <= value < 32:
+        raise ValueError(f"{mnemonic}: register {value!r} out of range")
+    return value
+
+
+def encode(mnemonic, *, xlen=4, rm=RM_DYN, **fields):
+    # The 32-bit word of mnemonic with the operands of operands() given by
+    # name, e.g. encode("sw", rs1="sp", rs2="a0", imm=8) for sw a0, 8(sp):
+    # registers as numbers or names ("a0", "x10", "fa0"), the immediate as
+    # the decoder reports it (byte offsets for branches and jumps,
+    # sign-extended upper immediates with their low 12 bits clear).
+    spec = SPECS.get(mnemonic)
+    if spec is None:
+        raise ValueError(f"unknown mnemonic {mnemonic!r}")
+    if spec.xlen > xlen * 8:
+        raise ValueError(f"{mnemonic} needs RV{spec.xlen}")
+    names = operands(spec, xlen)
+    if set(fields) != set(names):
+        raise ValueError(f"{mnemonic} takes {', '.join(names) or 'no operands'}")
+
+    word = spec.match
+    for name in names:
+        value = fields[name]
+        if name == "imm":
+            place, _bits, lowest, highest, align = imm_range(spec, xlen)
+            if not isinstance(value, int) or not lowest <= value <= highest or value % align:
+                raise ValueError(f"{mnemonic}: immediate {value!r} out of range")
+            word |= place(value)
+        else:
+            shift, _bits, index = REGISTERS[name]
+            word |= _register(value, spec.regs[index], mnemonic) << shift
+    if has_rounding_mode(spec):
+        if rm not in ROUNDING_MODES:
+            raise ValueError(f"{mnemonic}: invalid rounding mode {rm!r}")
+        word |= rm << 12
+    return word
+
+
+_compressions = {}
+
+
+def compression_table(xlen):
+    # 32-bit word -> the lowest compressed halfword expanding to it.
+    table = _compressions.get(xlen)
+    if table is None:
+        table = {}
+        expansions = expansion_table(xlen * 8)
+        for half in range(len(expansions) - 1, -1, -1):
+            if expansions[half]:
+                table[expansions[half]] = half
+        table = _compressions[xlen] = table
+    return table
+
+
+def compress(word, xlen=4):
+    # The compressed form of word, None if it has none.
+    return compression_table(xlen).get(word)
+
+
+def assemble(words):
+    # Little endian code of words, halfwords for compressed instructions.
+    return b"".join(
+        w.to_bytes(4 if w & 0b11 == 0b11 else 2, "little") for w in words)
@@ -0,0 +1,22 @@
+from enum import Enum
+
+
+# Mirrors binaryninja's BranchType, the plugin maps these by name.
+class BranchType(Enum):
+    UnconditionalBranch = 0
+    FalseBranch = 1
+    TrueBranch = 2
+    CallDestination = 3
+    FunctionReturn = 4
+    SystemCall = 5
+    IndirectBranch = 6
+    ExceptionBranch = 7
+
+
+class InstructionInfo(object):
+    def __init__(self):
+        self.length = 0
+        self.branches = []
+
+    def add_branch(self, branch_type, target=None):
+        self.branches.append((branch_type, target))
@@ -1,15 +1,101 @@
-from binaryninja.log import log_debug
+import atexit
+import logging
+import threading
 
-from .variants.rv32 import from_bytes as from_bytes_rv32
+from .variants.rv32 import DECODERS, get_decoder
+
+
+log = logging.getLogger(__name__)
+
+
+class InvalidRegion(object):
+    # Undecodable words are collected into regions of nearby addresses and
+    # each region is logged once, when a word outside of it comes along,
+    # instead of once per word. Data or padding inside of code would
+    # otherwise cost far more in logging than valid code costs to decode.
+    MAX_GAP = 32
+    SAMPLES = 4
+
+    def __init__(self, log=log):
+        self.log = log
+        self.start = None
+        self.end = None
+        self.count = 0
+        self.samples = []
+
+    def add(self, data, addr):
+        start = self.start
+        if start is not None and start <= addr <= self.end + self.MAX_GAP:
+            # Analysis revisits addresses, those are only counted once.
+            if addr > self.end:
+                self.end = addr
+                self.count += 1
+                if len(self.samples) < self.SAMPLES:
+                    self.samples.append(bytes(data[:4]))
+            return
+        self.flush()
+        self.start = self.end = addr
+        self.count = 1
+        self.samples = [bytes(data[:4])]
+
+    def flush(self):
+        if self.start is None:
+            return
+        self.log.debug("%d invalid instruction(s) @ %08x-%08x, e.g. %s",
+                       self.count, self.start, self.end,
+                       " ".join(s.hex() for s in self.samples))
+        self.start = self.end = None
+        self.count = 0
+        self.samples = []
+
+
+class InvalidRegions(object):
+    # One InvalidRegion per thread, analysis threads each walk their own
+    # functions and would only break up each other's regions.
+    def __init__(self, log=log):
+        self.log = log
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._regions = []
+
+    def _region(self):
+        try:
+            return self._local.region
+        except AttributeError:
+            region = self._local.region = InvalidRegion(self.log)
+            with self._lock:
+                self._regions.append(region)
+            return region
+
+    def add(self, data, addr):
+        self._region().add(data, addr)
+
+    def flush(self):
+        self._region().flush()
+
+    def flush_all(self):
+        with self._lock:
+            for region in self._regions:
+                region.flush()
+
+
+invalid_regions = InvalidRegions()
+atexit.register(invalid_regions.flush_all)
 
 
 def from_bytes(data, addr, xlen, flen):
     ret = None
-    if ret is None and xlen == 4:
-        ret = from_bytes_rv32(data, addr)
+    decoder = DECODERS.get((xlen, flen)) or get_decoder(xlen, flen)
+    if decoder is not None:
+        ret = decoder.from_bytes(data, addr)
 
     if ret is None:
-        log_debug(f"Wrong Instruction {data} @ {addr:08x}")
+        invalid_regions.add(data, addr)
 
     return ret
 
+
+def decode_buffer(buf, base_addr, xlen, flen):
+    # NumPy is only needed for bulk decoding, not by the plugin itself.
+    from .bulk import decode_buffer as decode_buffer_bulk
+    return decode_buffer_bulk(buf, base_addr, xlen, flen)
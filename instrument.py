@@ -0,0 +1,216 @@
+import json
+import os
+import sys
+import threading
+
+from collections import Counter
+from time import perf_counter_ns
+
+from .cache import decode_cache
+
+
+# Setting either to anything but "" or "0" turns instrumentation on, the
+# second also writes the results there as JSON when the process exits.
+ENV_VAR = "RISCV_INSTRUMENT"
+JSON_ENV_VAR = "RISCV_INSTRUMENT_JSON"
+
+CALLBACKS = (
+    "get_instruction_info", "get_instruction_text", "get_instruction_low_level_il",
+)
+
+
+class CallStats(object):
+    def __init__(self):
+        self.calls = 0
+        self.total_ns = 0
+        # ns.bit_length() -> calls, bucket b holds latencies in [2^(b-1), 2^b).
+        self.histogram = Counter()
+
+    def record(self, elapsed_ns):
+        self.calls += 1
+        self.total_ns += elapsed_ns
+        self.histogram[elapsed_ns.bit_length()] += 1
+
+    def merge(self, other):
+        self.calls += other.calls
+        self.total_ns += other.total_ns
+        self.histogram.update(other.histogram)
+
+    def percentile(self, p):
+        # Upper bound of the bucket holding the p-th percentile, in ns.
+        seen = 0
+        for bucket in sorted(self.histogram):
+            seen += self.histogram[bucket]
+            if seen >= p / 100 * self.calls:
+                return 1 << bucket
+        return 0
+
+    def to_dict(self):
+        return {
+            "calls": self.calls,
+            "total_ns": self.total_ns,
+            "mean_ns": self.total_ns / self.calls if self.calls else 0,
+            "histogram_ns": {1 << b: n for b, n in sorted(self.histogram.items())},
+        }
+
+
+class ThreadStats(object):
+    def __init__(self):
+        self.callbacks = {name: CallStats() for name in CALLBACKS}
+        self.mnemonics = Counter()
+        self.formats = Counter()
+        self.invalid = 0
+        # Set while get_instruction_info runs, the decodes it makes are
+        # the ones counted.
+        self.in_info = False
+
+    def record_decode(self, insn):
+        if insn is None:
+            self.invalid += 1
+        else:
+            self.mnemonics[insn.mnemonic] += 1
+            self.formats[insn.insn_type.name] += 1
+
+
+class Instrumentation(object):
+    # Counts are kept per thread, the analysis threads would otherwise
+    # lose updates to each other or need a lock around every callback.
+    # They are summed up when read.
+    def __init__(self, cache=decode_cache):
+        self.cache = cache
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._threads = []
+
+    def local(self):
+        try:
+            return self._local.stats
+        except AttributeError:
+            stats = self._local.stats = ThreadStats()
+            with self._lock:
+                self._threads.append(stats)
+            return stats
+
+    def record_decode(self, insn):
+        self.local().record_decode(insn)
+
+    @property
+    def callbacks(self):
+        merged = {name: CallStats() for name in CALLBACKS}
+        for stats in list(self._threads):
+            for name, s in stats.callbacks.items():
+                merged[name].merge(s)
+        return merged
+
+    @property
+    def mnemonics(self):
+        return sum((stats.mnemonics for stats in list(self._threads)), Counter())
+
+    @property
+    def formats(self):
+        return sum((stats.formats for stats in list(self._threads)), Counter())
+
+    @property
+    def invalid(self):
+        return sum(stats.invalid for stats in list(self._threads))
+
+    def to_dict(self):
+        return {
+            "callbacks": {name: s.to_dict() for name, s in self.callbacks.items()},
+            "cache": self.cache.stats(),
+            "mnemonics": dict(self.mnemonics.most_common()),
+            "formats": dict(self.formats.most_common()),
+            "invalid": self.invalid,
+        }
+
+    def to_json(self):
+        return json.dumps(self.to_dict(), indent=2)
+
+    def summary(self):
+        lines = [f"{'callback':<30}{'calls':>12}{'mean ns':>10}{'p50 ns':>10}{'p99 ns':>10}"]
+        for name, s in self.callbacks.items():
+            mean = s.total_ns // s.calls if s.calls else 0
+            lines.append(f"{name:<30}{s.calls:>12}{mean:>10}"
+                         f"{s.percentile(50):>10}{s.percentile(99):>10}")
+        cache = self.cache.stats()
+        lines.append(f"decode cache: {cache['hits']} hits, {cache['misses']} misses, "
+                     f"{cache['hit_rate']:.1%} hit rate")
+        decoded = sum(self.mnemonics.values())
+        lines.append(f"decoded: {decoded} valid, {self.invalid} invalid")
+        lines.append("formats: " + ", ".join(
+            f"{name} {count}" for name, count in self.formats.most_common()))
+        lines.append("top mnemonics: " + ", ".join(
+            f"{name} {count}" for name, count in self.mnemonics.most_common(10)))
+        return "\n".join(lines)
+
+
+stats = Instrumentation()
+
+
+def enabled(setting=False):
+    return setting or any(
+        os.environ.get(var, "") not in ("", "0") for var in (ENV_VAR, JSON_ENV_VAR))
+
+
+def _wrap(method, name, stats):
+    def wrapper(self, *args):
+        start = perf_counter_ns()
+        result = method(self, *args)
+        stats.local().callbacks[name].record(perf_counter_ns() - start)
+        return result
+    wrapper.__wrapped__ = method
+    return wrapper
+
+
+def _wrap_info(method, name, stats):
+    # Instruction info is requested once per instruction by the analysis,
+    # so it is where the decode counts are taken, from the decode
+    # _wrap_decode sees it make.
+    def wrapper(self, data, addr):
+        local = stats.local()
+        local.in_info = True
+        start = perf_counter_ns()
+        try:
+            result = method(self, data, addr)
+        finally:
+            local.in_info = False
+        local.callbacks[name].record(perf_counter_ns() - start)
+        return result
+    wrapper.__wrapped__ = method
+    return wrapper
+
+
+def _wrap_decode(decode, stats):
+    def wrapper(data, addr, xlen, flen):
+        insn = decode(data, addr, xlen, flen)
+        local = stats.local()
+        if local.in_info:
+            local.record_decode(insn)
+        return insn
+    wrapper.__wrapped__ = decode
+    return wrapper
+
+
+def instrument(arch_class, stats=stats):
+    # Replaces the callbacks of arch_class (and the subclasses inheriting
+    # them) with timed ones. Nothing is wrapped unless this is called, so
+    # instrumentation costs nothing when it is off.
+    for name in CALLBACKS:
+        method = getattr(arch_class, name)
+        if name == "get_instruction_info":
+            wrapper = _wrap_info(method, name, stats)
+        else:
+            wrapper = _wrap(method, name, stats)
+        setattr(arch_class, name, wrapper)
+    # The decode counts come from stats.cache, wrapped on the instance so
+    # other caches are left alone.
+    stats.cache.decode = _wrap_decode(stats.cache.decode, stats)
+
+
+def report(stats=stats):
+    path = os.environ.get(JSON_ENV_VAR)
+    if path:
+        with open(path, "w") as f:
+            f.write(stats.to_json())
+    else:
+        print(stats.summary(), file=sys.stderr)
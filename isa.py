@@ -0,0 +1,136 @@
+import re
+
+from collections import namedtuple
+
+
+# Extensions implied by the G shorthand.
+G_EXTENSIONS = ("i", "m", "a", "f", "d", "zicsr", "zifencei")
+
+FLOAT_EXTENSIONS = (("q", 16), ("d", 8), ("f", 4))
+FLEN_SUFFIXES = {None: "", 4: "f", 8: "d", 16: "q"}
+
+# e_flags
+EF_RISCV_RVC = 0x1
+EF_RISCV_FLOAT_ABI = 0x6
+FLOAT_ABI_FLENS = {0x0: None, 0x2: 4, 0x4: 8, 0x6: 16}
+
+# .riscv.attributes
+TAG_FILE = 1
+TAG_RISCV_ARCH = 5
+
+_VERSION = re.compile(r"\d+p\d+$")
+_SINGLE = re.compile(r"([a-z])(?:\d+(?:p\d+)?)?")
+_BASE = re.compile(r"rv(32|64|128)(.*)$")
+
+
+class Isa(namedtuple("Isa", ["xlen", "flen", "extensions"])):
+    # xlen and flen in bytes like everywhere else, flen is None without F.
+    __slots__ = ()
+
+    @property
+    def variant(self):
+        # Name of the architecture registered for this ISA.
+        return f"riscv{self.xlen * 8}{FLEN_SUFFIXES[self.flen]}"
+
+
+def flen_of(extensions):
+    for ext, flen in FLOAT_EXTENSIONS:
+        if ext in extensions:
+            return flen
+    return None
+
+
+def parse_isa(arch):
+    # "rv64imafdc_zicsr", "rv32i2p1_m2p0_c2p0" or "rv64gc" -> Isa, None if
+    # it isn't an ISA string.
+    match = _BASE.match(arch.strip().lower())
+    if match is None:
+        return None
+    xlen = int(match.group(1)) // 8
+    extensions = set()
+    for i, part in enumerate(match.group(2).split("_")):
+        if not part:
+            continue
+        if i and part[0] in "zsxh":
+            extensions.add(_VERSION.sub("", part))
+            continue
+        # The base ISA and single letter extensions, each with an optional
+        # version. Multi-letter ones may follow without an underscore.
+        pos = 0
+        while pos < len(part):
+            if part[pos] in "zsxh" and (i or pos):
+                extensions.add(_VERSION.sub("", part[pos:]))
+                break
+            single = _SINGLE.match(part, pos)
+            if single is None:
+                return None
+            if single.group(1) == "g":
+                extensions.update(G_EXTENSIONS)
+            else:
+                extensions.add(single.group(1))
+            pos = single.end()
+    return Isa(xlen, flen_of(extensions), frozenset(extensions))
+
+
+def _uleb128(data, pos):
+    value = shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7f) << shift
+        shift += 7
+        if not byte & 0x80:
+            return value, pos
+
+
+def attributes_arch(data):
+    # Tag_RISCV_arch of the contents of a .riscv.attributes section, None
+    # without one.
+    data = bytes(data)
+    if not data or data[0] != ord("A"):
+        return None
+    pos = 1
+    try:
+        while pos + 4 <= len(data):
+            length = int.from_bytes(data[pos:pos + 4], "little")
+            end = pos + length
+            vendor_end = data.index(b"\0", pos + 4)
+            vendor = data[pos + 4:vendor_end]
+            sub = vendor_end + 1
+            while vendor == b"riscv" and sub < end:
+                tag, attr = _uleb128(data, sub)
+                sub_end = sub + int.from_bytes(data[attr:attr + 4], "little")
+                attr += 4
+                while tag == TAG_FILE and attr < sub_end:
+                    tag_attr, attr = _uleb128(data, attr)
+                    # Odd tags are strings, even ones numbers.
+                    if tag_attr % 2:
+                        value_end = data.index(b"\0", attr)
+                        if tag_attr == TAG_RISCV_ARCH:
+                            return data[attr:value_end].decode("ascii", "replace")
+                        attr = value_end + 1
+                    else:
+                        _value, attr = _uleb128(data, attr)
+                sub = sub_end
+            if length <= 0:
+                break
+            pos = end
+    except (IndexError, ValueError):
+        pass
+    return None
+
+
+def isa_from_elf(elf_xlen, flags, arch=None):
+    # The ISA of an ELF file from its .riscv.attributes arch string if
+    # there is one, from its class and float ABI otherwise. The float ABI
+    # is a lower bound, soft float code may still run on an FPU.
+    isa = parse_isa(arch) if arch else None
+    if isa is not None:
+        return isa
+    flen = FLOAT_ABI_FLENS[flags & EF_RISCV_FLOAT_ABI]
+    extensions = {"i"}
+    if flags & EF_RISCV_RVC:
+        extensions.add("c")
+    if flen is not None:
+        extensions.update(ext for ext, ext_flen in FLOAT_EXTENSIONS if ext_flen <= flen)
+    return Isa(elf_xlen, flen, frozenset(extensions))
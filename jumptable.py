@@ -0,0 +1,240 @@
+import struct
+
+from collections import deque, namedtuple
+
+from .insn import from_bytes
+from .variants.rv32 import MEMORY_WIDTHS, insn_length
+
+
+# Instructions before a jr searched for the dispatch sequence and its bound.
+WINDOW = 24
+# Tables larger than this are taken for a misdetection.
+MAX_ENTRIES = 1 << 16
+# Entries read from a table without a bounds check, while they stay valid.
+MAX_UNBOUNDED = 1024
+
+# (entry size, sign-extended) -> struct format
+ENTRY_FORMATS = {
+    (1, False): "B", (1, True): "b", (2, False): "H", (2, True): "h",
+    (4, False): "I", (4, True): "i", (8, False): "Q", (8, True): "q",
+}
+
+
+JumpTable = namedtuple("JumpTable", ["source", "table", "entry_size", "relative", "count", "targets"])
+
+
+def _writes(insn, reg):
+    regs = insn.spec.regs
+    return bool(regs) and regs[0] == "x" and insn.rd == reg
+
+
+def _writer(window, reg, before):
+    # Index of the last instruction before `before` that writes reg, -1 if
+    # there is none in the window.
+    for i in range(before - 1, -1, -1):
+        if _writes(window[i][1], reg):
+            return i
+    return -1
+
+
+def _constant(window, reg, before, depth=4):
+    # Value of reg at `before` if it's built by li/lui/auipc/addi, None
+    # otherwise.
+    if not reg:
+        return 0
+    i = _writer(window, reg, before)
+    if i < 0 or not depth:
+        return None
+    addr, insn = window[i]
+    sem = insn.sem
+    if sem == "lui":
+        return insn.imm
+    if sem == "auipc":
+        return addr + insn.imm
+    if insn.mnemonic == "addi":
+        base = _constant(window, insn.rs1, i, depth - 1)
+        return None if base is None else base + insn.imm
+    return None
+
+
+def _bound(window, index, before):
+    # Number of cases from the bounds check on index before `before`, None
+    # without one. Returns (count, branch index).
+    for i in range(before - 1, -1, -1):
+        insn = window[i][1]
+        if _writes(insn, index):
+            return None
+        sem = insn.sem
+        if sem == "ltu" or sem == "geu":
+            rs1, rs2 = insn.rs1, insn.rs2
+            if rs1 == index:
+                # bgeu idx, n -> default / bltu idx, n -> case
+                limit = _constant(window, rs2, i)
+                return None if limit is None else (limit, i)
+            if rs2 == index:
+                # bltu n - 1, idx -> default / bgeu n - 1, idx -> case
+                limit = _constant(window, rs1, i)
+                return None if limit is None else (limit + 1, i)
+        elif sem == "eq" or sem == "ne":
+            # sltiu t, idx, n + beqz/bnez t
+            reg = insn.rs1 if not insn.rs2 else insn.rs2 if not insn.rs1 else None
+            if reg is None:
+                continue
+            j = _writer(window, reg, i)
+            if j >= 0:
+                test = window[j][1]
+                if test.mnemonic == "sltiu" and test.rs1 == index:
+                    return test.imm, i
+    return None
+
+
+def _scaled_index(window, reg, before):
+    # (index register, shift, instruction index) of an index scaled by
+    # slli, or by slli 32 + srli to zero-extend it on RV64.
+    i = _writer(window, reg, before)
+    if i < 0:
+        return reg, 0, before
+    insn = window[i][1]
+    if insn.mnemonic == "slli":
+        return insn.rs1, insn.imm, i
+    if insn.mnemonic == "srli":
+        j = _writer(window, insn.rs1, i)
+        if j >= 0 and window[j][1].mnemonic == "slli" and window[j][1].imm == 32:
+            return window[j][1].rs1, 32 - insn.imm, j
+    return reg, 0, before
+
+
+def find_jump_table(window, read, xlen, valid_target=None):
+    # Recognizes the table dispatch ending window, a sequence of (addr,
+    # insn) in execution order:
+    #
+    #     bgeu   idx, n, default     # or bltu n - 1, idx / sltiu + beqz
+    #     slli   idx, idx, 2
+    #     lui    base, %hi(table)    # or auipc, %pcrel_hi(table)
+    #     addi   base, base, %lo(table)
+    #     add    idx, idx, base
+    #     lw     target, 0(idx)
+    #     add    target, target, base  # tables of offsets only
+    #     jr     target
+    #
+    # The table is read with read(addr, size) -> bytes or None. Without a
+    # bounds check, entries are read as long as valid_target(addr) holds.
+    # Returns a JumpTable, None if window doesn't end in one.
+    last = len(window) - 1
+    if last < 0:
+        return None
+    source, jump = window[last]
+    if jump.sem != "jalr" or jump.rd or jump.imm or jump.rs1 == 1:
+        return None
+    mask = (1 << xlen * 8) - 1
+
+    i = _writer(window, jump.rs1, last)
+    if i < 0:
+        return None
+    insn = window[i][1]
+    relative = None
+    if insn.mnemonic == "add":
+        for value, base in ((insn.rs1, insn.rs2), (insn.rs2, insn.rs1)):
+            j = _writer(window, value, i)
+            if j >= 0 and window[j][1].sem == "load":
+                relative = _constant(window, base, i)
+                if relative is not None:
+                    i = j
+                    break
+        if relative is None:
+            return None
+    load = window[i][1]
+    if load.sem != "load":
+        return None
+    width = MEMORY_WIDTHS.get(load.mnemonic)
+    if width is None or width not in ENTRY_FORMATS:
+        return None
+    size, signed = width
+
+    j = _writer(window, load.rs1, i)
+    if j < 0:
+        return None
+    insn = window[j][1]
+    if insn.mnemonic != "add":
+        return None
+    for offset, base in ((insn.rs1, insn.rs2), (insn.rs2, insn.rs1)):
+        table = _constant(window, base, j)
+        if table is not None:
+            break
+    else:
+        return None
+    table = (table + load.imm) & mask
+    index, shift, k = _scaled_index(window, offset, j)
+    if 1 << shift != size:
+        return None
+
+    fmt = ENTRY_FORMATS[width]
+    bound = _bound(window, index, k)
+    if bound is not None:
+        count = bound[0]
+        if not 0 < count <= MAX_ENTRIES:
+            return None
+        data = read(table, count * size)
+        if data is None or len(data) < count * size:
+            return None
+        entries = struct.unpack(f"<{count}{fmt}", data)
+        targets = [(e + relative if relative is not None else e) & mask & ~1 for e in entries]
+    elif valid_target is not None:
+        targets = []
+        unpack = struct.Struct("<" + fmt).unpack
+        while len(targets) < MAX_UNBOUNDED:
+            data = read(table + len(targets) * size, size)
+            if data is None or len(data) < size:
+                break
+            target = unpack(data)[0]
+            target = (target + relative if relative is not None else target) & mask & ~1
+            if not valid_target(target):
+                break
+            targets.append(target)
+        if not targets:
+            return None
+        count = len(targets)
+    else:
+        return None
+    return JumpTable(source, table, size, relative is not None, count, targets)
+
+
+def buffer_reader(data, base_addr):
+    # read(addr, size) over a bytes-like object loaded at base_addr.
+    data = memoryview(data)
+    end = base_addr + len(data)
+
+    def read(addr, size):
+        if addr < base_addr or addr + size > end:
+            return None
+        return data[addr - base_addr:addr - base_addr + size]
+    return read
+
+
+def scan_jump_tables(data, base_addr, xlen, flen, read=None, valid_target=None):
+    # Yields the jump tables of a linear sweep over data. Tables are read
+    # from data itself unless read is given.
+    if read is None:
+        read = buffer_reader(data, base_addr)
+    data = memoryview(data)
+    window = deque(maxlen=WINDOW)
+    offset = 0
+    while offset < len(data):
+        raw = data[offset:offset + 4]
+        addr = base_addr + offset
+        insn = from_bytes(raw, addr, xlen, flen)
+        if insn is None:
+            window.clear()
+            offset += insn_length(raw)
+            continue
+        window.append((addr, insn))
+        offset += insn.length
+        sem = insn.sem
+        if sem == "jalr":
+            if not insn.rd:
+                table = find_jump_table(window, read, xlen, valid_target)
+                if table is not None:
+                    yield table
+            window.clear()
+        elif sem == "jal" and not insn.rd:
+            window.clear()
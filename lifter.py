@@ -1,12 +1,371 @@
-from .insn import from_bytes
+import threading
+
+from binaryninja import LLIL_TEMP, LowLevelILLabel
+
+from .cache import decode_cache
+from .pairs import PAIR_SEMS, UPPER_SEMS, previous_insn, resolve_pair
+from .variants.rv32 import CSR_SEMS, GP_REGS, INSTRUCTIONS, MEMORY_WIDTHS, InstructionType
+
+
+# CSR accesses are lifted to these intrinsics, the immediate forms included.
+CSR_INTRINSICS = ("csrrw", "csrrs", "csrrc")
+
+
+def _read(il, size, reg):
+    if not reg:
+        return il.const(size, 0)
+    return il.reg(size, GP_REGS[reg])
+
+
+def _operand(il, size, width, reg):
+    # Register operand of an op working on the low `width` bytes (the *W
+    # and *D instructions).
+    if not reg:
+        return il.const(width, 0)
+    if width == size:
+        return il.reg(size, GP_REGS[reg])
+    return il.low_part(width, il.reg(size, GP_REGS[reg]))
+
+
+def _address(il, size, insn, target=None):
+    # target is the address when it is known, e.g. from an auipc pair.
+    if target is not None:
+        return il.const_pointer(size, target)
+    base = _read(il, size, insn.rs1)
+    if not insn.imm:
+        return base
+    return il.add(size, base, il.const(size, insn.imm))
+
+
+def _unimplemented(insn, addr, il):
+    il.append(il.unimplemented())
+
+
+def _mul_high(signed_a, signed_b):
+    def op(il, n, a, b):
+        a = il.sign_extend(2 * n, a) if signed_a else il.zero_extend(2 * n, a)
+        b = il.sign_extend(2 * n, b) if signed_b else il.zero_extend(2 * n, b)
+        return il.low_part(n, il.logical_shift_right(
+            2 * n, il.mult(2 * n, a, b), il.const(1, 8 * n)))
+    return op
+
+
+def _bool(compare):
+    def op(il, n, a, b):
+        return il.bool_to_int(n, compare(il, n, a, b))
+    return op
+
+
+ALU_OPS = {
+    "add": lambda il, n, a, b: il.add(n, a, b),
+    "sub": lambda il, n, a, b: il.sub(n, a, b),
+    "xor": lambda il, n, a, b: il.xor_expr(n, a, b),
+    "or": lambda il, n, a, b: il.or_expr(n, a, b),
+    "and": lambda il, n, a, b: il.and_expr(n, a, b),
+    "sll": lambda il, n, a, b: il.shift_left(n, a, b),
+    "srl": lambda il, n, a, b: il.logical_shift_right(n, a, b),
+    "sra": lambda il, n, a, b: il.arith_shift_right(n, a, b),
+    "slt": _bool(lambda il, n, a, b: il.compare_signed_less_than(n, a, b)),
+    "sltu": _bool(lambda il, n, a, b: il.compare_unsigned_less_than(n, a, b)),
+    "mul": lambda il, n, a, b: il.mult(n, a, b),
+    "mulh": _mul_high(True, True),
+    "mulhsu": _mul_high(True, False),
+    "mulhu": _mul_high(False, False),
+    "div": lambda il, n, a, b: il.div_signed(n, a, b),
+    "divu": lambda il, n, a, b: il.div_unsigned(n, a, b),
+    "rem": lambda il, n, a, b: il.mod_signed(n, a, b),
+    "remu": lambda il, n, a, b: il.mod_unsigned(n, a, b),
+}
+
+SHIFT_OPS = {"sll", "srl", "sra"}
+
+BRANCH_OPS = {
+    "eq": lambda il, n, a, b: il.compare_equal(n, a, b),
+    "ne": lambda il, n, a, b: il.compare_not_equal(n, a, b),
+    "lt": lambda il, n, a, b: il.compare_signed_less_than(n, a, b),
+    "ge": lambda il, n, a, b: il.compare_signed_greater_equal(n, a, b),
+    "ltu": lambda il, n, a, b: il.compare_unsigned_less_than(n, a, b),
+    "geu": lambda il, n, a, b: il.compare_unsigned_greater_equal(n, a, b),
+}
+
+
+def _alu_op(sem, size):
+    # sem -> (base sem, operand width). The *W and *D instructions work on
+    # the low 32/64 bits and sign-extend the result.
+    if sem in ALU_OPS:
+        return sem, size
+    if sem[-1] == "w" and sem[:-1] in ALU_OPS:
+        return sem[:-1], 4
+    if sem[-1] == "d" and sem[:-1] in ALU_OPS:
+        return sem[:-1], 8
+    return None, None
+
+
+def _emit_alu(size, spec):
+    base, width = _alu_op(spec.sem, size)
+    if base is None:
+        return None
+    op = ALU_OPS[base]
+    mask_shift = base in SHIFT_OPS and spec.fmt == InstructionType.RType
+
+    if spec.fmt == InstructionType.RType:
+        def emit(insn, addr, il):
+            if not insn.rd:
+                il.append(il.nop())
+                return
+            b = _operand(il, size, width, insn.rs2)
+            if mask_shift:
+                # Only the low log2(width * 8) bits of rs2 are used.
+                b = il.and_expr(width, b, il.const(width, width * 8 - 1))
+            result = op(il, width, _operand(il, size, width, insn.rs1), b)
+            if width != size:
+                result = il.sign_extend(size, result)
+            il.append(il.set_reg(size, GP_REGS[insn.rd], result))
+    else:
+        def emit(insn, addr, il):
+            if not insn.rd:
+                il.append(il.nop())
+                return
+            result = op(il, width, _operand(il, size, width, insn.rs1),
+                        il.const(width, insn.imm))
+            if width != size:
+                result = il.sign_extend(size, result)
+            il.append(il.set_reg(size, GP_REGS[insn.rd], result))
+    return emit
+
+
+def _emit_load(size, spec):
+    width, signed = MEMORY_WIDTHS[spec.mnemonic]
+    extend = "sign_extend" if signed else "zero_extend"
+
+    def emit(insn, addr, il, target=None):
+        if not insn.rd:
+            il.append(il.nop())
+            return
+        value = il.load(width, _address(il, size, insn, target))
+        if width < size:
+            value = getattr(il, extend)(size, value)
+        il.append(il.set_reg(size, GP_REGS[insn.rd], value))
+    return emit
+
+
+def _emit_store(size, spec):
+    width, _signed = MEMORY_WIDTHS[spec.mnemonic]
+
+    def emit(insn, addr, il, target=None):
+        value = _operand(il, size, width, insn.rs2)
+        il.append(il.store(width, _address(il, size, insn, target), value))
+    return emit
+
+
+def _emit_branch(size, spec):
+    compare = BRANCH_OPS[spec.sem]
+
+    def emit(insn, addr, il):
+        cond = compare(il, size, _read(il, size, insn.rs1), _read(il, size, insn.rs2))
+        true_addr = addr + insn.imm
+        true_label = il.get_label_for_address(il.arch, true_addr)
+        false_label = il.get_label_for_address(il.arch, addr + insn.length)
+        new_true = true_label is None
+        new_false = false_label is None
+        if new_true:
+            true_label = LowLevelILLabel()
+        if new_false:
+            false_label = LowLevelILLabel()
+        il.append(il.if_expr(cond, true_label, false_label))
+        if new_true:
+            il.mark_label(true_label)
+            il.append(il.jump(il.const_pointer(size, true_addr)))
+        if new_false:
+            il.mark_label(false_label)
+    return emit
+
+
+def _emit_lui(size, spec):
+    def emit(insn, addr, il):
+        if not insn.rd:
+            il.append(il.nop())
+            return
+        il.append(il.set_reg(size, GP_REGS[insn.rd], il.const(size, insn.imm)))
+    return emit
+
+
+def _emit_auipc(size, spec):
+    def emit(insn, addr, il):
+        if not insn.rd:
+            il.append(il.nop())
+            return
+        il.append(il.set_reg(
+            size, GP_REGS[insn.rd], il.const_pointer(size, addr + insn.imm)))
+    return emit
+
+
+def _jump_or_call(size, insn, addr, target, il):
+    # jal, or a jalr whose target is known.
+    if not insn.rd:
+        label = il.get_label_for_address(il.arch, target)
+        if label is not None:
+            il.append(il.goto(label))
+        else:
+            il.append(il.jump(il.const_pointer(size, target)))
+        return
+    if insn.rd != 1:
+        il.append(il.set_reg(
+            size, GP_REGS[insn.rd], il.const_pointer(size, addr + insn.length)))
+    il.append(il.call(il.const_pointer(size, target)))
+
+
+def _emit_jal(size, spec):
+    def emit(insn, addr, il):
+        _jump_or_call(size, insn, addr, addr + insn.imm, il)
+    return emit
+
+
+def _emit_jalr(size, spec):
+    def emit(insn, addr, il):
+        if not insn.rd:
+            if insn.rs1 == 1 and not insn.imm:
+                il.append(il.ret(il.reg(size, "ra")))
+            else:
+                il.append(il.jump(_address(il, size, insn)))
+            return
+        target = _address(il, size, insn)
+        if insn.rd != 1:
+            # The target has to be read before rd is overwritten.
+            il.append(il.set_reg(size, LLIL_TEMP(0), target))
+            target = il.reg(size, LLIL_TEMP(0))
+            il.append(il.set_reg(
+                size, GP_REGS[insn.rd], il.const_pointer(size, addr + insn.length)))
+        il.append(il.call(target))
+    return emit
+
+
+def _emit_csr(size, spec):
+    intrinsic = spec.sem.rstrip("i")
+    immediate = spec.sem[-1] == "i"
+
+    def emit(insn, addr, il):
+        if immediate:
+            value = il.const(size, insn.rs1)
+        else:
+            value = _read(il, size, insn.rs1)
+        outputs = [GP_REGS[insn.rd]] if insn.rd else []
+        il.append(il.intrinsic(outputs, intrinsic, [il.const(2, insn.imm), value]))
+    return emit
+
+
+def _emit_fixed(expr):
+    def factory(size, spec):
+        def emit(insn, addr, il):
+            il.append(getattr(il, expr)())
+        return emit
+    return factory
+
+
+EMITTER_FACTORIES = {
+    "load": _emit_load,
+    "store": _emit_store,
+    "lui": _emit_lui,
+    "auipc": _emit_auipc,
+    "jal": _emit_jal,
+    "jalr": _emit_jalr,
+    "ecall": _emit_fixed("system_call"),
+    "ebreak": _emit_fixed("breakpoint"),
+    "fence": _emit_fixed("nop"),
+    "fence.i": _emit_fixed("nop"),
+}
+
+
+def _emitter(size, spec):
+    if spec.regs and "f" in spec.regs:
+        return None
+    if spec.fmt == InstructionType.BType:
+        return _emit_branch(size, spec)
+    if spec.sem in CSR_SEMS:
+        return _emit_csr(size, spec)
+    factory = EMITTER_FACTORIES.get(spec.sem)
+    if factory is not None:
+        return factory(size, spec)
+    return _emit_alu(size, spec)
+
+
+_emitters = {}
+
+
+def emitters(xlen):
+    # mnemonic -> emit(insn, addr, il) for every instruction with a lifting,
+    # built once per XLEN.
+    table = _emitters.get(xlen)
+    if table is None:
+        table = _emitters[xlen] = {}
+        for spec in INSTRUCTIONS:
+            if spec.xlen <= xlen * 8:
+                emit = _emitter(xlen, spec)
+                if emit is not None:
+                    table[spec.mnemonic] = emit
+    return table
+
+
+def _emit_pair(size, insn, addr, value, il, table):
+    # insn completing a lui/auipc pair with the constant value.
+    if insn.sem == "jalr":
+        # auipc + jalr, a call or tail call to a known function.
+        _jump_or_call(size, insn, addr, value, il)
+    elif insn.sem in ("load", "store"):
+        # A load or store at a constant address, floating point ones
+        # aren't lifted.
+        emit = table.get(insn.mnemonic)
+        if emit is None:
+            _unimplemented(insn, addr, il)
+        else:
+            emit(insn, addr, il, value)
+    elif insn.rd:
+        # lui/auipc + addi, an address or constant.
+        il.append(il.set_reg(size, GP_REGS[insn.rd], il.const_pointer(size, value)))
+    else:
+        il.append(il.nop())
+
 
 class RiscVLifter(object):
-    def __init__(self, XLen, FLen=None):
+    def __init__(self, XLen, FLen=None, cache=decode_cache):
         self.XLen = XLen
         self.FLen = FLen
+        self.cache = cache
+        # Built on the first lifted instruction, not at plugin load.
+        self.emitters = None
+        # (end, rd, length) of the last lui/auipc each thread lifted.
+        # Instructions of a block are lifted in order, so it is usually
+        # right before the one completing the pair.
+        self._upper = threading.local()
+
+    def _pair_value(self, insn, addr, il):
+        # The constant of insn completing an auipc/lui pair, or None. Only
+        # looked for when the lui/auipc lifted last ends at addr and sets
+        # rs1, and then read from the view of the function being lifted, so
+        # it is the instruction really preceding addr there.
+        upper = getattr(self._upper, "last", None)
+        if upper is None or upper[0] != addr or upper[1] != insn.rs1:
+            return None
+        func = getattr(il, "source_function", None)
+        if func is None:
+            return None
+        prev_addr, prev = previous_insn(func.view.read, addr, upper[2], self.XLen, self.FLen)
+        return resolve_pair(insn, addr, prev, prev_addr, self.XLen)
 
     def get_insn_low_level_il(self, data, addr, il):
-        insn = from_bytes(data, addr, self.XLen, self.FLen)
+        insn = self.cache.decode(data, addr, self.XLen, self.FLen)
         if insn is None:
             return None
-        return insn.lift_insn(addr, il)
+        table = self.emitters
+        if table is None:
+            table = self.emitters = emitters(self.XLen)
+        sem = insn.sem
+        if sem in UPPER_SEMS:
+            self._upper.last = (addr + insn.length, insn.rd, insn.length)
+        elif sem in PAIR_SEMS:
+            value = self._pair_value(insn, addr, il)
+            if value is not None:
+                _emit_pair(self.XLen, insn, addr, value, il, table)
+                return insn.length
+        table.get(insn.mnemonic, _unimplemented)(insn, addr, il)
+        return insn.length
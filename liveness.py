@@ -0,0 +1,143 @@
+from collections import deque, namedtuple
+
+from .calling_conventions import RiscVWithFloats, RiscVWithoutFloats
+from .sweep import linear_sweep
+from .variants.rv32 import FP_REGS, GP_REGS, REG_FILE_BASES
+
+
+# Register name -> bit in the def/use masks of RiscVInstruction.def_use().
+REG_BITS = dict(
+    [(name, REG_FILE_BASES["x"] + i) for i, name in enumerate(GP_REGS)] +
+    [(name, REG_FILE_BASES["f"] + i) for i, name in enumerate(FP_REGS)])
+
+
+def reg_mask(names):
+    mask = 0
+    for name in names:
+        mask |= 1 << REG_BITS[name]
+    return mask
+
+
+def reg_names(mask):
+    mask = int(mask)
+    return [name for name, bit in REG_BITS.items() if mask >> bit & 1]
+
+
+# A calling convention as masks. At a call the callee may define every
+# caller saved register and uses the argument registers.
+ConventionMasks = namedtuple(
+    "ConventionMasks", ["caller_saved", "callee_saved", "args", "returns", "implicit"])
+
+
+def convention_masks(convention):
+    # The masks of a calling convention class from calling_conventions.py.
+    returns = (
+        convention.int_return_reg, convention.high_int_return_reg,
+        convention.float_return_arg, convention.high_float_return_arg)
+    return ConventionMasks(
+        reg_mask(convention.caller_saved_regs),
+        reg_mask(convention.callee_saved_regs),
+        reg_mask(convention.int_arg_regs + convention.float_arg_regs),
+        reg_mask([r for r in returns if r]),
+        reg_mask(convention.implicitly_defined_regs))
+
+
+# By whether the variant has floating point registers.
+CONVENTIONS = {
+    False: convention_masks(RiscVWithoutFloats),
+    True: convention_masks(RiscVWithFloats),
+}
+
+
+def block_def_use(masks):
+    # (defs, upward exposed uses) of a block from the (defs, uses) of its
+    # instructions in order: what it writes, and what it reads before
+    # writing it.
+    defs = exposed = 0
+    for d, u in masks:
+        exposed |= u & ~defs
+        defs |= d
+    return defs, exposed
+
+
+def live_in(masks, live_out):
+    # Registers live at the start of a block, given those live at its end.
+    defs, exposed = block_def_use(masks)
+    return exposed | (live_out & ~defs)
+
+
+def liveness(summaries, successors, exit_live=0):
+    # live_in and live_out of every block from their block_def_use()
+    # summaries and successor lists (block indices). Blocks without
+    # successors have exit_live live at their end, e.g. the return
+    # registers and the callee saved ones.
+    count = len(summaries)
+    summaries = [(int(d), int(u)) for d, u in summaries]
+    predecessors = [[] for _ in range(count)]
+    for block, succs in enumerate(successors):
+        for succ in succs:
+            predecessors[succ].append(block)
+    live_ins = [0] * count
+    live_outs = [0] * count
+    work = deque(range(count - 1, -1, -1))
+    queued = [True] * count
+    while work:
+        block = work.popleft()
+        queued[block] = False
+        succs = successors[block]
+        out = exit_live if not succs else 0
+        for succ in succs:
+            out |= live_ins[succ]
+        defs, exposed = summaries[block]
+        live_outs[block] = out
+        new = exposed | (out & ~defs)
+        if new != live_ins[block]:
+            live_ins[block] = new
+            for pred in predecessors[block]:
+                if not queued[pred]:
+                    queued[pred] = True
+                    work.append(pred)
+    return live_ins, live_outs
+
+
+def call_def_use(insn, convention):
+    # (defs, uses) of insn, a call also defines the caller saved registers
+    # and uses the arguments of convention.
+    defs, uses = insn.def_use()
+    if insn.sem in ("jal", "jalr") and insn.rd:
+        defs |= convention.caller_saved
+        uses |= convention.args
+    return defs, uses
+
+
+def cfg_liveness(cfg, image, exit_live=None):
+    # live_in and live_out of every block of a ControlFlowGraph built from
+    # image, calls taken per the default calling convention. Registers live
+    # where a block leaves its function default to the return values and
+    # the callee saved registers.
+    convention = CONVENTIONS[cfg.flen is not None]
+    if exit_live is None:
+        exit_live = convention.returns | convention.callee_saved
+    blocks = cfg.blocks
+    summaries = []
+    for start, end in zip(blocks["start"], blocks["end"]):
+        start, end = int(start), int(end)
+        data = image.read(start, end - start)
+        summaries.append(block_def_use(
+            call_def_use(insn, convention)
+            for _addr, _raw, insn in linear_sweep(data, start, cfg.xlen, cfg.flen)
+            if insn is not None))
+    successors = [[] for _ in summaries]
+    for src, dst in zip(cfg.edges["src"], cfg.edges["dst"]):
+        if dst >= 0:
+            successors[int(src)].append(int(dst))
+    return liveness(summaries, successors, exit_live)
+
+
+def clobbered(masks, preserved):
+    # The registers of the mask preserved (e.g. the callee saved ones) that
+    # any of the (defs, uses) masks writes.
+    result = 0
+    for d, _u in masks:
+        result |= d
+    return result & preserved
@@ -0,0 +1,59 @@
+from .info import BranchType
+from .variants.rv32 import DECODERS, get_decoder
+
+
+# The first half of a pair, leaving a constant in rd.
+UPPER_SEMS = {"lui", "auipc"}
+# The second half, adding its immediate to that constant in rs1.
+PAIR_SEMS = {"jalr", "load", "store", "add", "addw"}
+# Of the "add" and "addw" rows only the immediate forms.
+PAIR_MNEMONICS = {"addi", "addiw"}
+
+
+def resolve_pair(insn, addr, prev, prev_addr, xlen):
+    # The constant insn at addr adds to, loads from, stores to or jumps to
+    # when prev, the instruction right before it, is the lui/auipc of a
+    # pair, e.g. the target of a PC-relative call (auipc ra + jalr ra) or
+    # the value built by la/li (lui + addi, or addiw on RV64). None if
+    # they aren't a pair.
+    if prev is None or prev_addr + prev.length != addr:
+        return None
+    sem = insn.sem
+    if sem not in PAIR_SEMS or (sem in ("add", "addw") and insn.mnemonic not in PAIR_MNEMONICS):
+        return None
+    rs1 = insn.rs1
+    if not rs1 or prev.sem not in UPPER_SEMS or prev.rd != rs1:
+        return None
+    value = prev.imm + insn.imm
+    if prev.sem == "auipc":
+        value += prev_addr
+    if sem == "addw":
+        value = ((value & 0xffffffff) ^ 0x80000000) - 0x80000000
+    elif sem == "jalr":
+        value &= ~1
+    return value & ((1 << xlen * 8) - 1)
+
+
+def previous_insn(read, addr, size, xlen, flen):
+    # (addr, insn) of the size byte instruction ending at addr, decoded from
+    # what read(addr, size) returns, or (None, None). Not reported as
+    # invalid when it doesn't decode, it was never disassembled.
+    prev_addr = addr - size
+    if prev_addr < 0:
+        return None, None
+    data = read(prev_addr, size)
+    if not data or len(data) < size:
+        return None, None
+    decoder = DECODERS.get((xlen, flen)) or get_decoder(xlen, flen)
+    prev = decoder.from_bytes(bytes(data), prev_addr)
+    if prev is None or prev.length != size:
+        return None, None
+    return prev_addr, prev
+
+
+def pair_branch(insn, target):
+    # The branch of a jalr with a resolved target: a call when it links, a
+    # tail call otherwise.
+    if insn.rd:
+        return BranchType.CallDestination, target
+    return BranchType.UnconditionalBranch, target
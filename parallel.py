@@ -0,0 +1,102 @@
+import os
+
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+from .sweep import FORMATTERS, linear_sweep
+
+
+# Bytes of code per task. Large enough that a task's output outweighs the
+# cost of sending it back, small enough to keep every worker busy.
+DEFAULT_CHUNK_SIZE = 1 << 20
+
+# Tasks in flight per worker, bounds the output held back for ordering.
+TASKS_PER_WORKER = 4
+
+# Shared memory blocks a worker has attached to, by name.
+_attached = {}
+
+
+def chunk_starts(data, first, stop, chunk_size=DEFAULT_CHUNK_SIZE):
+    # Offsets into data of roughly chunk_size apart instructions of a
+    # linear sweep from first to stop, starting with first. The length of
+    # every instruction (or invalid word) comes from the low bits of its
+    # first halfword, so halfword i starts an instruction iff the run of
+    # 32-bit halfwords just before it has an even length: the halfword
+    # following a compressed instruction or the upper half of a 32-bit one
+    # always starts the next one.
+    chunk_size += chunk_size & 1
+    starts = [first]
+    prev = first
+    pos = first + chunk_size
+    while pos < stop:
+        j = pos - 2
+        while j >= prev and data[j] & 0b11 == 0b11:
+            j -= 2
+        # prev and the halfword after j both start an instruction.
+        run = pos - (j + 2 if j >= prev else prev)
+        if run & 2:
+            pos += 2
+        if pos >= stop:
+            break
+        starts.append(pos)
+        prev = pos
+        pos += chunk_size
+    return starts
+
+
+def _sweep_chunk(name, size, base_addr, xlen, flen, start, end, fmt_name):
+    # Runs in a worker: the formatted lines of [start, end) of the code in
+    # the shared memory block name.
+    shm = _attached.get(name)
+    if shm is None:
+        shm = _attached[name] = shared_memory.SharedMemory(name)
+    data = shm.buf[:size]
+    fmt = FORMATTERS[fmt_name]
+    try:
+        return "".join(
+            [fmt(addr, raw, insn) + "\n" for addr, raw, insn in
+             linear_sweep(data, base_addr, xlen, flen, start, end)])
+    finally:
+        data.release()
+
+
+def parallel_sweep(regions, fmt_name, workers=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    # Yields the output of linear_sweep() over every (data, base_addr, xlen,
+    # flen, start, end) region formatted by FORMATTERS[fmt_name], the same
+    # text a serial run produces, in pieces. Each region is copied into a
+    # shared memory block once, workers read it from there, and their
+    # results are yielded in order.
+    workers = workers or os.cpu_count() or 1
+    blocks = []
+    pending = deque()
+    try:
+        with ProcessPoolExecutor(workers) as pool:
+            for data, base_addr, xlen, flen, start, end in regions:
+                data = memoryview(data).cast("B")
+                size = len(data)
+                first = 0 if start is None else min(max(start - base_addr, 0), size)
+                stop = size if end is None else max(min(end - base_addr, size), 0)
+                if first >= stop:
+                    continue
+                shm = shared_memory.SharedMemory(create=True, size=size)
+                blocks.append(shm)
+                shm.buf[:size] = data
+
+                starts = chunk_starts(data, first, stop, chunk_size)
+                for i, offset in enumerate(starts):
+                    stop_offset = starts[i + 1] if i + 1 < len(starts) else stop
+                    pending.append(pool.submit(
+                        _sweep_chunk, shm.name, size, base_addr, xlen, flen,
+                        base_addr + offset, base_addr + stop_offset, fmt_name))
+                    while len(pending) >= workers * TASKS_PER_WORKER:
+                        yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+    finally:
+        for future in pending:
+            future.cancel()
+        for shm in blocks:
+            shm.close()
+            shm.unlink()
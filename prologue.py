@@ -0,0 +1,121 @@
+import numpy as np
+
+from collections import namedtuple
+
+from .bulk import decode_buffer
+from .variants.rv32 import INSTRUCTIONS
+
+
+RA, SP, S0 = 1, 2, 8
+
+# An instruction to look for around a frame allocation. Fields left None
+# match anything; imm is an int or "negative"/"positive". window is the
+# (first, last) instruction relative to the allocation it may be at,
+# (-1, -1) being the one before it. Compressed instructions are matched
+# as their expansion, c.addi16sp as addi and c.swsp/c.sdsp as sw/sd.
+Pattern = namedtuple(
+    "Pattern", ["name", "mnemonics", "rd", "rs1", "rs2", "imm", "window", "weight"],
+    defaults=(None, None, None, None, (0, 0), 1.0))
+
+# addi sp, sp, -N: every candidate is one.
+FRAME = Pattern("frame", ("addi", "addiw"), rd=SP, rs1=SP, imm="negative", weight=1.0)
+
+PATTERNS = (
+    Pattern("save ra", ("sw", "sd"), rs1=SP, rs2=RA, window=(1, 4), weight=2.0),
+    Pattern("save s0", ("sw", "sd"), rs1=SP, rs2=S0, window=(1, 6), weight=1.0),
+    Pattern("frame pointer", ("addi",), rd=S0, rs1=SP, imm="positive", window=(1, 8), weight=1.0),
+    Pattern("after ret", ("jalr",), rd=0, rs1=RA, imm=0, window=(-1, -1), weight=1.0),
+    Pattern("after jump", ("jal",), rd=0, window=(-1, -1), weight=0.5),
+)
+
+# A frame allocation and the save of ra.
+DEFAULT_MIN_SCORE = 3.0
+
+Candidate = namedtuple("Candidate", ["addr", "score", "frame_size", "matches"])
+
+
+def _spec_mask(mnemonics):
+    # Lookup table over spec indices, the last entry for invalid words.
+    mask = np.zeros(len(INSTRUCTIONS) + 1, dtype=np.bool_)
+    for i, spec in enumerate(INSTRUCTIONS):
+        if spec.mnemonic in mnemonics:
+            mask[i] = True
+    return mask
+
+
+def _match(decoded, pattern):
+    hit = _spec_mask(pattern.mnemonics)[decoded.spec]
+    hit &= decoded.valid
+    for field in ("rd", "rs1", "rs2"):
+        value = getattr(pattern, field)
+        if value is not None:
+            hit &= getattr(decoded, field) == value
+    imm = pattern.imm
+    if imm == "negative":
+        hit &= decoded.imm < 0
+    elif imm == "positive":
+        hit &= decoded.imm > 0
+    elif imm is not None:
+        hit &= decoded.imm == imm
+    return hit
+
+
+def _near(hit, window):
+    # near[i] is set if hit is set for any instruction i + k, k in window.
+    near = np.zeros_like(hit)
+    first, last = window
+    for k in range(first, last + 1):
+        if k > 0:
+            near[:-k] |= hit[k:]
+        elif k < 0:
+            near[-k:] |= hit[:k]
+        else:
+            near |= hit
+    return near
+
+
+def score_prologues(decoded, patterns=PATTERNS, frame=FRAME):
+    # Score of every instruction of a DecodedBuffer as a function start:
+    # 0 unless it matches frame, frame.weight plus the weight of every
+    # pattern found around it otherwise. Returns the scores and a bit per
+    # pattern of what matched.
+    anchor = _match(decoded, frame)
+    scores = np.where(anchor, frame.weight, 0.0)
+    matched = np.zeros(len(anchor), dtype=np.uint32)
+    for bit, pattern in enumerate(patterns):
+        near = _near(_match(decoded, pattern), pattern.window) & anchor
+        scores += near * pattern.weight
+        matched |= near.astype(np.uint32) << bit
+    return scores, matched
+
+
+def rank_prologues(decoded, patterns=PATTERNS, frame=FRAME, min_score=DEFAULT_MIN_SCORE):
+    # The frame allocations scoring at least min_score, best first, as
+    # arrays: addresses, scores, frame sizes and pattern bits.
+    scores, matched = score_prologues(decoded, patterns, frame)
+    found = np.nonzero(scores >= min_score)[0]
+    # Highest score first, lowest address first among equal ones.
+    found = found[np.lexsort((found, -scores[found]))]
+    return {
+        "addr": decoded.addr[found], "score": scores[found],
+        "frame_size": -decoded.imm[found].astype(np.int64), "matched": matched[found],
+    }
+
+
+def candidates(ranked, patterns=PATTERNS):
+    names = {}
+    for bits in np.unique(ranked["matched"]).tolist():
+        names[bits] = tuple(p.name for bit, p in enumerate(patterns) if bits >> bit & 1)
+    return [
+        Candidate(addr, score, frame_size, names[bits])
+        for addr, score, frame_size, bits in zip(
+            ranked["addr"].tolist(), ranked["score"].tolist(),
+            ranked["frame_size"].tolist(), ranked["matched"].tolist())
+    ]
+
+
+def scan_prologues(buf, base_addr, xlen, flen, patterns=PATTERNS, frame=FRAME,
+                   min_score=DEFAULT_MIN_SCORE):
+    # Candidate function starts of a raw image, best first.
+    decoded = decode_buffer(buf, base_addr, xlen, flen)
+    return candidates(rank_prologues(decoded, patterns, frame, min_score), patterns)
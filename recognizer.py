@@ -0,0 +1,61 @@
+from binaryninja import FunctionRecognizer
+
+from .cache import decode_cache
+from .isa import FLEN_SUFFIXES
+from .jumptable import WINDOW, find_jump_table
+
+
+FLENS = {suffix: flen for flen, suffix in FLEN_SUFFIXES.items() if suffix}
+
+
+class RiscVJumpTableRecognizer(FunctionRecognizer):
+    # Resolves jr through a jump table to the case targets, so switch
+    # statements get all their cases analyzed. Runs on every function
+    # after its blocks are known, only blocks ending in a jr are looked at.
+    def recognize_low_level_il(self, data, func, il):
+        arch = func.arch
+        xlen = arch.default_int_size
+        flen = FLENS.get(arch.name[-1])
+        for block in func.basic_blocks:
+            window = self._window(data, block, xlen, flen)
+            if not window:
+                continue
+            source = window[-1][0]
+            table = find_jump_table(window, data.read, xlen, data.is_offset_executable)
+            if table is None:
+                continue
+            targets = list(dict.fromkeys(table.targets))
+            known = [b.dest_addr for b in func.get_indirect_branches_at(source)]
+            if known != targets:
+                func.set_auto_indirect_branches(source, [(arch, t) for t in targets], arch)
+        return False
+
+    def _window(self, data, block, xlen, flen):
+        # The instructions of block if it ends in a jr, after those of the
+        # block falling through into it (or its only predecessor), which
+        # usually holds the bounds check.
+        insns = self._decode(data, block.start, block.end, xlen, flen)
+        if not insns:
+            return None
+        last = insns[-1][1]
+        if last.sem != "jalr" or last.rd:
+            return None
+        edges = block.incoming_edges
+        prev = next((e.source for e in edges if e.source.end == block.start), None)
+        if prev is None and len(edges) == 1:
+            prev = edges[0].source
+        if prev is not None:
+            insns = self._decode(data, prev.start, prev.end, xlen, flen) + insns
+        return insns[-WINDOW:]
+
+    def _decode(self, data, start, end, xlen, flen):
+        raw = data.read(start, end - start)
+        insns = []
+        offset = 0
+        while offset < len(raw):
+            insn = decode_cache.decode(raw[offset:offset + 4], start + offset, xlen, flen)
+            if insn is None:
+                return []
+            insns.append((start + offset, insn))
+            offset += insn.length
+        return insns
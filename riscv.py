@@ -1,7 +1,9 @@
-from binaryninja import Architecture, Endianness, RegisterInfo
+from binaryninja import (
+    Architecture, Endianness, IntrinsicInfo, IntrinsicInput, RegisterInfo, Type
+)
 
 from .disas import RiscVDisassembler
-from .lifter import RiscVLifter
+from .lifter import CSR_INTRINSICS, RiscVLifter
 
 
 GP_REGS = ["zero", "ra", "sp", "gp", "tp"] + \
@@ -14,19 +16,39 @@ FP_REGS = [f"fs{x}" for x in range(12)] + \
     [f"ft{x}" for x in range(12)]
 
 
+def _regs(xlen, flen=None):
+    regs = {x: RegisterInfo(x, xlen) for x in GP_REGS}
+    if flen is not None:
+        regs.update({x: RegisterInfo(x, flen) for x in FP_REGS})
+    return regs
+
+
+def _csr_intrinsics(xlen):
+    # csrrw/csrrs/csrrc(csr, value) -> previous value of the CSR
+    inputs = [
+        IntrinsicInput(Type.int(2, False), "csr"),
+        IntrinsicInput(Type.int(xlen, False), "value"),
+    ]
+    return {
+        name: IntrinsicInfo(inputs, [Type.int(xlen, False)]) for name in CSR_INTRINSICS
+    }
+
+
 class RiscV32(Architecture):
     name = "riscv32"
 
     default_int_size = 4
     max_instr_length = 4
+    instr_alignment = 2
 
     endianness = Endianness.LittleEndian
 
     disassembler = RiscVDisassembler(4)
     lifter = RiscVLifter(4)
 
-    regs = {x: RegisterInfo(x, 4) for x in GP_REGS}
+    regs = _regs(4)
     stack_pointer = "sp"
+    intrinsics = _csr_intrinsics(4)
 
     def get_instruction_info(self, data, addr):
         return self.disassembler.get_insn_info(data, addr)
@@ -39,21 +61,21 @@ class RiscV32(Architecture):
 
 class RiscV32F(RiscV32):
     name = "riscv32f"
-    RiscV32.regs.update({x: RegisterInfo(x, 4) for x in FP_REGS})
+    regs = _regs(4, 4)
 
     disassembler = RiscVDisassembler(4, 4)
     lifter = RiscVLifter(4, 4)
 
 class RiscV32D(RiscV32):
     name = "riscv32d"
-    RiscV32.regs.update({x: RegisterInfo(x, 8) for x in FP_REGS})
+    regs = _regs(4, 8)
 
     disassembler = RiscVDisassembler(4, 8)
     lifter = RiscVLifter(4, 8)
 
 class RiscV32Q(RiscV32):
     name = "riscv32q"
-    RiscV32.regs.update({x: RegisterInfo(x, 16) for x in FP_REGS})
+    regs = _regs(4, 16)
 
     disassembler = RiscVDisassembler(4, 16)
     lifter = RiscVLifter(4, 16)
@@ -61,28 +83,29 @@ class RiscV32Q(RiscV32):
 
 class RiscV64(RiscV32):
     name = "riscv64"
-    regs = {x: RegisterInfo(x, 8) for x in GP_REGS}
+    regs = _regs(8)
+    intrinsics = _csr_intrinsics(8)
 
     disassembler = RiscVDisassembler(8)
     lifter = RiscVLifter(8)
 
 class RiscV64F(RiscV64):
     name = "riscv64f"
-    RiscV64.regs.update({x: RegisterInfo(x, 4) for x in FP_REGS})
+    regs = _regs(8, 4)
 
     disassembler = RiscVDisassembler(8, 4)
     lifter = RiscVLifter(8, 4)
 
 class RiscV64D(RiscV64):
     name = "riscv64d"
-    RiscV64.regs.update({x: RegisterInfo(x, 8) for x in FP_REGS})
+    regs = _regs(8, 8)
 
     disassembler = RiscVDisassembler(8, 8)
     lifter = RiscVLifter(8, 8)
 
 class RiscV64Q(RiscV64):
     name = "riscv64q"
-    RiscV32.regs.update({x: RegisterInfo(x, 16) for x in FP_REGS})
+    regs = _regs(8, 16)
 
     disassembler = RiscVDisassembler(8, 16)
     lifter = RiscVLifter(8, 16)
@@ -90,28 +113,29 @@ class RiscV64Q(RiscV64):
 
 class RiscV128(RiscV64):
     name = "riscv128"
-    regs = {x: RegisterInfo(x, 16) for x in GP_REGS}
+    regs = _regs(16)
+    intrinsics = _csr_intrinsics(16)
 
     disassembler = RiscVDisassembler(16)
     lifter = RiscVLifter(16)
 
 class RiscV128F(RiscV128):
     name = "riscv128f"
-    RiscV128.regs.update({x: RegisterInfo(x, 4) for x in FP_REGS})
+    regs = _regs(16, 4)
 
     disassembler = RiscVDisassembler(16, 4)
     lifter = RiscVLifter(16, 4)
 
 class RiscV128D(RiscV128):
     name = "riscv128d"
-    RiscV128.regs.update({x: RegisterInfo(x, 8) for x in FP_REGS})
+    regs = _regs(16, 8)
 
     disassembler = RiscVDisassembler(16, 8)
     lifter = RiscVLifter(16, 8)
 
 class RiscV128Q(RiscV128):
     name = "riscv128q"
-    RiscV128.regs.update({x: RegisterInfo(x, 16) for x in FP_REGS})
+    regs = _regs(16, 16)
 
     disassembler = RiscVDisassembler(16, 16)
     lifter = RiscVLifter(16, 16)
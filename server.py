@@ -0,0 +1,306 @@
+import asyncio
+import ipaddress
+import json
+import os
+import re
+import socket
+import stat
+import struct
+
+from concurrent.futures import ThreadPoolExecutor
+
+from .sweep import linear_sweep
+from .tokens import render
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+# Frames are a big endian uint32 length and the payload. The top bit of
+# the length marks msgpack payloads, JSON otherwise; replies use the
+# codec of their request.
+HEADER = struct.Struct(">I")
+MSGPACK_BIT = 1 << 31
+MAX_FRAME = 64 << 20
+MAX_ITEMS = 4096
+
+# Requests of a connection read ahead of the one being answered. Past
+# that the server stops reading and TCP pushes back on the client.
+PIPELINE = 8
+# Batches decoded at once over all connections.
+DEFAULT_WORKERS = 4
+
+OUTPUTS = ("text", "info")
+
+_VARIANT = re.compile(r"riscv(32|64|128)([fdq]?)$")
+FLENS = {"": None, "f": 4, "d": 8, "q": 16}
+
+
+class ProtocolError(Exception):
+    pass
+
+
+def parse_variant(name):
+    # "riscv64d" -> (8, 8), the registered architecture names.
+    match = _VARIANT.match(name or "")
+    if match is None:
+        raise ProtocolError(f"unknown variant {name!r}")
+    return int(match.group(1)) // 8, FLENS[match.group(2)]
+
+
+def parse_address(address):
+    # "unix:/path", "/path" or "tcp:host:port", "host:port" -> (kind, value).
+    if address.startswith("unix:"):
+        return "unix", address[5:]
+    if address.startswith("tcp:"):
+        address = address[4:]
+    elif "/" in address or ":" not in address:
+        return "unix", address
+    host, _, port = address.rpartition(":")
+    host = host.strip("[]") or "127.0.0.1"
+    # There is no authentication, only serve this machine.
+    if host != "localhost" and not ipaddress.ip_address(host).is_loopback:
+        raise ValueError(f"{host} is not a loopback address")
+    return "tcp", (host, int(port))
+
+
+def encode(message, packed):
+    payload = msgpack.packb(message) if packed else json.dumps(message).encode()
+    if len(payload) > MAX_FRAME:
+        raise ProtocolError(f"frame of {len(payload)} bytes")
+    return HEADER.pack(len(payload) | (MSGPACK_BIT if packed else 0)) + payload
+
+
+def decode(payload, packed):
+    if packed:
+        if msgpack is None:
+            raise ProtocolError("msgpack is not installed")
+        return msgpack.unpackb(payload)
+    return json.loads(payload)
+
+
+def disassemble(item):
+    # One batch item: {"data": bytes or hex string, "addr": int, "variant":
+    # "riscv32", "outputs": ["text", "info"]} -> one dict per instruction
+    # of a linear sweep over data.
+    data = item.get("data")
+    if isinstance(data, str):
+        data = bytes.fromhex(data)
+    if not isinstance(data, (bytes, bytearray)):
+        raise ProtocolError("data must be bytes or a hex string")
+    addr = item.get("addr", 0)
+    if not isinstance(addr, int) or addr < 0:
+        raise ProtocolError("addr must be a non-negative int")
+    xlen, flen = parse_variant(item.get("variant", "riscv32"))
+    outputs = item.get("outputs", ())
+    if any(o not in OUTPUTS for o in outputs):
+        raise ProtocolError(f"outputs must be in {OUTPUTS}")
+    text = "text" in outputs
+    info = "info" in outputs
+
+    result = []
+    for insn_addr, raw, insn in linear_sweep(data, addr, xlen, flen):
+        if insn is None:
+            result.append({"addr": insn_addr, "length": len(raw), "valid": False})
+            continue
+        entry = {"addr": insn_addr, "length": insn.length, "valid": True, "mnemonic": insn.mnemonic}
+        if text:
+            # [mnemonic, operands], as it comes out of JSON or msgpack.
+            entry["text"] = list(render(insn.get_text(insn_addr)[0]))
+        if info:
+            entry["branches"] = [
+                [branch_type.name, target] for branch_type, target in insn.get_info(insn_addr).branches
+            ]
+        result.append(entry)
+    return result
+
+
+def handle(request):
+    # {"id": ..., "items": [...]} -> {"id": ..., "results": [...]}, or an
+    # "error" instead of the results if any item is bad.
+    if not isinstance(request, dict) or not isinstance(request.get("items"), list):
+        return {"id": None, "error": "expected {\"id\": ..., \"items\": [...]}"}
+    items = request["items"]
+    if len(items) > MAX_ITEMS:
+        return {"id": request.get("id"), "error": f"more than {MAX_ITEMS} items"}
+    try:
+        results = [disassemble(item) for item in items]
+    except (ProtocolError, ValueError, TypeError, AttributeError) as e:
+        return {"id": request.get("id"), "error": str(e)}
+    return {"id": request.get("id"), "results": results}
+
+
+class Server(object):
+    # Serves batches to any number of connections from one process, so
+    # the decoders and their tables are built once and stay warm. Batches
+    # run on a thread pool to keep the event loop responsive; each
+    # connection is answered in order.
+    def __init__(self, workers=DEFAULT_WORKERS, pipeline=PIPELINE):
+        self.executor = ThreadPoolExecutor(workers)
+        self.slots = asyncio.Semaphore(workers)
+        self.pipeline = pipeline
+        self.connections = 0
+        self.requests = 0
+
+    async def _read_frames(self, reader, queue):
+        try:
+            while True:
+                header = await reader.readexactly(HEADER.size)
+                length, = HEADER.unpack(header)
+                packed = bool(length & MSGPACK_BIT)
+                length &= ~MSGPACK_BIT
+                if length > MAX_FRAME:
+                    await queue.put((None, packed, f"frame of {length} bytes"))
+                    break
+                # Blocks once pipeline requests are waiting.
+                await queue.put((await reader.readexactly(length), packed, None))
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        await queue.put(None)
+
+    async def _answer(self, payload, packed):
+        try:
+            request = decode(payload, packed)
+        except (ProtocolError, ValueError) as e:
+            return {"id": None, "error": f"bad frame: {e}"}
+        async with self.slots:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.executor, handle, request)
+
+    async def connection(self, reader, writer):
+        self.connections += 1
+        queue = asyncio.Queue(self.pipeline)
+        frames = asyncio.ensure_future(self._read_frames(reader, queue))
+        try:
+            while True:
+                frame = await queue.get()
+                if frame is None:
+                    break
+                payload, packed, fatal = frame
+                if packed and msgpack is None:
+                    packed = False
+                    reply = {"id": None, "error": "msgpack is not installed"}
+                elif fatal is not None:
+                    reply = {"id": None, "error": fatal}
+                else:
+                    reply = await self._answer(payload, packed)
+                self.requests += 1
+                try:
+                    writer.write(encode(reply, packed))
+                except ProtocolError as e:
+                    writer.write(encode({"id": reply.get("id"), "error": str(e)}, packed))
+                # Stops here while the client doesn't read its replies.
+                await writer.drain()
+                if fatal is not None:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            frames.cancel()
+            writer.close()
+
+    async def start(self, address):
+        kind, where = parse_address(address)
+        if kind == "unix":
+            _remove_stale_socket(where)
+            return await asyncio.start_unix_server(self.connection, where)
+        return await asyncio.start_server(self.connection, *where)
+
+    async def serve(self, address, ready=None):
+        server = await self.start(address)
+        if ready is not None:
+            ready(server)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            kind, where = parse_address(address)
+            if kind == "unix":
+                _remove_stale_socket(where)
+
+
+def _remove_stale_socket(path):
+    # A socket file left by a server that is gone, not one still in use.
+    if not os.path.exists(path) or not stat.S_ISSOCK(os.stat(path).st_mode):
+        return
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.connect(path)
+    except ConnectionRefusedError:
+        os.unlink(path)
+    except OSError:
+        pass
+    finally:
+        probe.close()
+
+
+def serve(address, workers=DEFAULT_WORKERS):
+    try:
+        asyncio.run(Server(workers).serve(address))
+    except KeyboardInterrupt:
+        pass
+
+
+class Client(object):
+    # Blocking client for one connection. packed picks msgpack frames,
+    # which carry the data as bytes instead of hex.
+    def __init__(self, address, packed=False, timeout=None):
+        if packed and msgpack is None:
+            raise ProtocolError("msgpack is not installed")
+        kind, where = parse_address(address)
+        if kind == "unix":
+            self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.sock.settimeout(timeout)
+            self.sock.connect(where)
+        else:
+            self.sock = socket.create_connection(where, timeout)
+        self.packed = packed
+        self.next_id = 0
+
+    def close(self):
+        self.sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _recv(self, size):
+        chunks = []
+        while size:
+            chunk = self.sock.recv(min(size, 1 << 20))
+            if not chunk:
+                raise ConnectionError("connection closed by the server")
+            chunks.append(chunk)
+            size -= len(chunk)
+        return b"".join(chunks)
+
+    def send(self, items):
+        # Sends a batch without waiting for the reply, returns its id.
+        self.next_id += 1
+        if not self.packed:
+            items = [
+                item if isinstance(item["data"], str) else dict(item, data=bytes(item["data"]).hex())
+                for item in items
+            ]
+        self.sock.sendall(encode({"id": self.next_id, "items": items}, self.packed))
+        return self.next_id
+
+    def receive(self):
+        length, = HEADER.unpack(self._recv(HEADER.size))
+        packed = bool(length & MSGPACK_BIT)
+        reply = decode(self._recv(length & ~MSGPACK_BIT), packed)
+        if "error" in reply:
+            raise ProtocolError(reply["error"])
+        return reply["results"]
+
+    def request(self, items):
+        self.send(items)
+        return self.receive()
+
+    def disassemble(self, data, addr=0, variant="riscv32", outputs=("text",)):
+        return self.request([{"data": data, "addr": addr, "variant": variant, "outputs": list(outputs)}])[0]
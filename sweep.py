@@ -0,0 +1,49 @@
+import json
+
+from .insn import from_bytes, invalid_regions
+from .variants.rv32 import insn_length
+from .tokens import render
+
+
+def linear_sweep(data, base_addr, xlen, flen, start=None, end=None):
+    data = memoryview(data)
+    start = base_addr if start is None else max(start, base_addr)
+    end = base_addr + len(data) if end is None else min(end, base_addr + len(data))
+
+    offset = start - base_addr
+    stop = end - base_addr
+    while offset < stop:
+        raw = data[offset:offset + 4]
+        addr = base_addr + offset
+        insn = from_bytes(raw, addr, xlen, flen)
+        length = insn.length if insn is not None else insn_length(raw)
+        yield addr, bytes(raw[:length]), insn
+        offset += length
+    invalid_regions.flush()
+
+
+def format_objdump(addr, raw, insn):
+    word = f"{int.from_bytes(raw, 'little'):0{len(raw) * 2}x}"
+    if insn is None:
+        directive = ".word" if len(raw) == 4 else ".short"
+        return f"{addr:8x}:\t{word:<18}\t{directive}\t0x{word}"
+    mnemonic, operands = render(insn.get_text(addr)[0])
+    if operands:
+        return f"{addr:8x}:\t{word:<18}\t{mnemonic}\t{operands}"
+    return f"{addr:8x}:\t{word:<18}\t{mnemonic}"
+
+
+def format_json(addr, raw, insn):
+    entry = {"addr": addr, "bytes": raw.hex(), "length": len(raw)}
+    if insn is None:
+        entry["valid"] = False
+    else:
+        mnemonic, operands = render(insn.get_text(addr)[0])
+        entry.update(valid=True, mnemonic=mnemonic, operands=operands)
+    return json.dumps(entry)
+
+
+FORMATTERS = {
+    "objdump": format_objdump,
+    "json": format_json,
+}
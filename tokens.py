@@ -0,0 +1,35 @@
+from collections import namedtuple
+from enum import Enum
+
+
+# Mirrors the subset of binaryninja's InstructionTextTokenType used by the
+# decoder, the plugin maps these by name.
+class TokenType(Enum):
+    TextToken = 0
+    InstructionToken = 1
+    OperandSeparatorToken = 2
+    RegisterToken = 3
+    IntegerToken = 4
+    PossibleAddressToken = 5
+    BeginMemoryOperandToken = 6
+    EndMemoryOperandToken = 7
+
+
+Token = namedtuple("Token", ["type", "text", "value"], defaults=(0,))
+
+# Tokens are immutable, so punctuation is shared by every rendered line.
+SPACE = Token(TokenType.TextToken, " ")
+SEPARATOR = Token(TokenType.OperandSeparatorToken, ", ")
+TEXT_SEPARATOR = Token(TokenType.TextToken, ", ")
+PAREN_OPEN = Token(TokenType.TextToken, "(")
+PAREN_CLOSE = Token(TokenType.TextToken, ")")
+MEMORY_BEGIN = Token(TokenType.BeginMemoryOperandToken, "(")
+MEMORY_END = Token(TokenType.EndMemoryOperandToken, ")")
+
+
+def render(tokens):
+    # Splits rendered tokens into (mnemonic, operands) the way objdump
+    # prints them.
+    mnemonic = tokens[0].text.strip()
+    operands = "".join(t.text for t in tokens[1:]).strip()
+    return mnemonic, operands
@@ -1,10 +1,16 @@
-from binaryninja.enums import BranchType
-from binaryninja.function import InstructionInfo
-from binaryninja.function import InstructionTextToken as Token
-from binaryninja.function import InstructionTextTokenType as TokenType
+import threading
 
+from collections import namedtuple
 from enum import Enum
-from struct import unpack
+from functools import partial
+from struct import unpack_from
+
+from ..info import BranchType, InstructionInfo
+from ..tokens import (
+    MEMORY_BEGIN, MEMORY_END, PAREN_CLOSE, PAREN_OPEN, SEPARATOR, SPACE,
+    TEXT_SEPARATOR, Token, TokenType
+)
+from .rvc import expansion_table
 
 
 OPCODE_MASK = 0b1111111 << 0
@@ -14,39 +20,24 @@ RS1_MASK = 0b11111 << 15
 RS2_MASK = 0b11111 << 20
 FUNCT7_MASK = 0b1111111 << 25
 
+# Bits which select a cell in the decode table: opcode, funct3 and funct7.
+DISPATCH_MASK = OPCODE_MASK | FUNCT3_MASK | FUNCT7_MASK
+
 GP_REGS = [
     "zero", "ra", "sp", "gp", "tp", "t0", "t1", "t2", "s0", "s1", "a0", "a1",
     "a2", "a3", "a4", "a5", "a6", "a7", "s2", "s3", "s4", "s5", "s6", "s7",
     "s8", "s9", "s10", "s11", "t3", "t4", "t5", "t6"
 ]
 
-r_type_opcodes = {
-    0b0110011
-}
-
-i_type_opcodes = {
-    0b1100111, 0b0000011, 0b0010011, 0b1110011, 0b0001111
-}
-
-s_type_opcodes = {
-    0b0100011
-}
-
-b_type_opcodes = {
-    0b1100011
-}
-
-u_type_opcodes = {
-    0b0110111, 0b0010111
-}
-
-j_type_opcodes = {
-    0b1101111
-}
+FP_REGS = [
+    "ft0", "ft1", "ft2", "ft3", "ft4", "ft5", "ft6", "ft7", "fs0", "fs1",
+    "fa0", "fa1", "fa2", "fa3", "fa4", "fa5", "fa6", "fa7", "fs2", "fs3",
+    "fs4", "fs5", "fs6", "fs7", "fs8", "fs9", "fs10", "fs11", "ft8", "ft9",
+    "ft10", "ft11"
+]
 
-branch_instructions = {
-    0b1101111, 0b1100111, 0b1100011, 0b1110011
-}
+# Register file of an operand as used in InsnSpec.regs.
+REG_FILES = {"x": GP_REGS, "f": FP_REGS}
 
 
 def _get_opcode(insn):
@@ -91,243 +82,472 @@ class InstructionType(Enum):
     BType = 3,
     UType = 4,
     JType = 5,
+    R4Type = 6,
+
+
+InsnSpec = namedtuple(
+    "InsnSpec", ["mnemonic", "mask", "match", "fmt", "ext", "xlen", "sem", "regs"],
+    defaults=(None,))
+
+R = InstructionType.RType
+I = InstructionType.IType
+S = InstructionType.SType
+B = InstructionType.BType
+U = InstructionType.UType
+J = InstructionType.JType
+R4 = InstructionType.R4Type
+
+# One row per instruction. `xlen` is the smallest XLEN the instruction exists
+# in, `sem` names the operation independent of the encoding (addi and add are
+# both "add") so that consumers don't have to switch on mnemonics. `regs`
+# gives the register file ("x", "f" or "-" for unused) of rd, rs1, rs2 and
+# rs3 where it differs from the integer default of the format.
+INSTRUCTIONS = [
+    InsnSpec("lui",        0x0000007f, 0x00000037, U, "I",        32, "lui"),
+    InsnSpec("auipc",      0x0000007f, 0x00000017, U, "I",        32, "auipc"),
+    InsnSpec("jal",        0x0000007f, 0x0000006f, J, "I",        32, "jal"),
+    InsnSpec("jalr",       0x0000707f, 0x00000067, I, "I",        32, "jalr"),
+
+    InsnSpec("beq",        0x0000707f, 0x00000063, B, "I",        32, "eq"),
+    InsnSpec("bne",        0x0000707f, 0x00001063, B, "I",        32, "ne"),
+    InsnSpec("blt",        0x0000707f, 0x00004063, B, "I",        32, "lt"),
+    InsnSpec("bge",        0x0000707f, 0x00005063, B, "I",        32, "ge"),
+    InsnSpec("bltu",       0x0000707f, 0x00006063, B, "I",        32, "ltu"),
+    InsnSpec("bgeu",       0x0000707f, 0x00007063, B, "I",        32, "geu"),
+
+    InsnSpec("lb",         0x0000707f, 0x00000003, I, "I",        32, "load"),
+    InsnSpec("lh",         0x0000707f, 0x00001003, I, "I",        32, "load"),
+    InsnSpec("lw",         0x0000707f, 0x00002003, I, "I",        32, "load"),
+    InsnSpec("lbu",        0x0000707f, 0x00004003, I, "I",        32, "load"),
+    InsnSpec("lhu",        0x0000707f, 0x00005003, I, "I",        32, "load"),
+
+    InsnSpec("sb",         0x0000707f, 0x00000023, S, "I",        32, "store"),
+    InsnSpec("sh",         0x0000707f, 0x00001023, S, "I",        32, "store"),
+    InsnSpec("sw",         0x0000707f, 0x00002023, S, "I",        32, "store"),
+
+    InsnSpec("addi",       0x0000707f, 0x00000013, I, "I",        32, "add"),
+    InsnSpec("slti",       0x0000707f, 0x00002013, I, "I",        32, "slt"),
+    InsnSpec("sltiu",      0x0000707f, 0x00003013, I, "I",        32, "sltu"),
+    InsnSpec("xori",       0x0000707f, 0x00004013, I, "I",        32, "xor"),
+    InsnSpec("ori",        0x0000707f, 0x00006013, I, "I",        32, "or"),
+    InsnSpec("andi",       0x0000707f, 0x00007013, I, "I",        32, "and"),
+    InsnSpec("slli",       0xfe00707f, 0x00001013, I, "I",        32, "sll"),
+    InsnSpec("srli",       0xfe00707f, 0x00005013, I, "I",        32, "srl"),
+    InsnSpec("srai",       0xfe00707f, 0x40005013, I, "I",        32, "sra"),
+
+    InsnSpec("add",        0xfe00707f, 0x00000033, R, "I",        32, "add"),
+    InsnSpec("sub",        0xfe00707f, 0x40000033, R, "I",        32, "sub"),
+    InsnSpec("sll",        0xfe00707f, 0x00001033, R, "I",        32, "sll"),
+    InsnSpec("slt",        0xfe00707f, 0x00002033, R, "I",        32, "slt"),
+    InsnSpec("sltu",       0xfe00707f, 0x00003033, R, "I",        32, "sltu"),
+    InsnSpec("xor",        0xfe00707f, 0x00004033, R, "I",        32, "xor"),
+    InsnSpec("srl",        0xfe00707f, 0x00005033, R, "I",        32, "srl"),
+    InsnSpec("sra",        0xfe00707f, 0x40005033, R, "I",        32, "sra"),
+    InsnSpec("or",         0xfe00707f, 0x00006033, R, "I",        32, "or"),
+    InsnSpec("and",        0xfe00707f, 0x00007033, R, "I",        32, "and"),
+
+    InsnSpec("fence",      0x000fffff, 0x0000000f, I, "I",        32, "fence"),
+    InsnSpec("ecall",      0xffffffff, 0x00000073, I, "I",        32, "ecall"),
+    InsnSpec("ebreak",     0xffffffff, 0x00100073, I, "I",        32, "ebreak"),
+
+    InsnSpec("fence.i",    0xffffffff, 0x0000100f, I, "Zifencei", 32, "fence.i"),
+
+    InsnSpec("csrrw",      0x0000707f, 0x00001073, I, "Zicsr",    32, "csrrw"),
+    InsnSpec("csrrs",      0x0000707f, 0x00002073, I, "Zicsr",    32, "csrrs"),
+    InsnSpec("csrrc",      0x0000707f, 0x00003073, I, "Zicsr",    32, "csrrc"),
+    InsnSpec("csrrwi",     0x0000707f, 0x00005073, I, "Zicsr",    32, "csrrwi"),
+    InsnSpec("csrrsi",     0x0000707f, 0x00006073, I, "Zicsr",    32, "csrrsi"),
+    InsnSpec("csrrci",     0x0000707f, 0x00007073, I, "Zicsr",    32, "csrrci"),
+
+    InsnSpec("mul",        0xfe00707f, 0x02000033, R, "M",        32, "mul"),
+    InsnSpec("mulh",       0xfe00707f, 0x02001033, R, "M",        32, "mulh"),
+    InsnSpec("mulhsu",     0xfe00707f, 0x02002033, R, "M",        32, "mulhsu"),
+    InsnSpec("mulhu",      0xfe00707f, 0x02003033, R, "M",        32, "mulhu"),
+    InsnSpec("div",        0xfe00707f, 0x02004033, R, "M",        32, "div"),
+    InsnSpec("divu",       0xfe00707f, 0x02005033, R, "M",        32, "divu"),
+    InsnSpec("rem",        0xfe00707f, 0x02006033, R, "M",        32, "rem"),
+    InsnSpec("remu",       0xfe00707f, 0x02007033, R, "M",        32, "remu"),
+
+    InsnSpec("sret",       0xffffffff, 0x10200073, I, "S",        32, "sret"),
+    InsnSpec("mret",       0xffffffff, 0x30200073, I, "S",        32, "mret"),
+    InsnSpec("wfi",        0xffffffff, 0x10500073, I, "S",        32, "wfi"),
+    InsnSpec("sfence.vma", 0xfe007fff, 0x12000073, R, "S",        32, "sfence.vma", "-xx"),
+
+    InsnSpec("lwu",        0x0000707f, 0x00006003, I, "I",        64, "load"),
+    InsnSpec("ld",         0x0000707f, 0x00003003, I, "I",        64, "load"),
+    InsnSpec("sd",         0x0000707f, 0x00003023, S, "I",        64, "store"),
+    InsnSpec("addiw",      0x0000707f, 0x0000001b, I, "I",        64, "addw"),
+    InsnSpec("slliw",      0xfe00707f, 0x0000101b, I, "I",        64, "sllw"),
+    InsnSpec("srliw",      0xfe00707f, 0x0000501b, I, "I",        64, "srlw"),
+    InsnSpec("sraiw",      0xfe00707f, 0x4000501b, I, "I",        64, "sraw"),
+    InsnSpec("addw",       0xfe00707f, 0x0000003b, R, "I",        64, "addw"),
+    InsnSpec("subw",       0xfe00707f, 0x4000003b, R, "I",        64, "subw"),
+    InsnSpec("sllw",       0xfe00707f, 0x0000103b, R, "I",        64, "sllw"),
+    InsnSpec("srlw",       0xfe00707f, 0x0000503b, R, "I",        64, "srlw"),
+    InsnSpec("sraw",       0xfe00707f, 0x4000503b, R, "I",        64, "sraw"),
+
+    InsnSpec("mulw",       0xfe00707f, 0x0200003b, R, "M",        64, "mulw"),
+    InsnSpec("divw",       0xfe00707f, 0x0200403b, R, "M",        64, "divw"),
+    InsnSpec("divuw",      0xfe00707f, 0x0200503b, R, "M",        64, "divuw"),
+    InsnSpec("remw",       0xfe00707f, 0x0200603b, R, "M",        64, "remw"),
+    InsnSpec("remuw",      0xfe00707f, 0x0200703b, R, "M",        64, "remuw"),
+
+    InsnSpec("lq",         0x0000707f, 0x0000200f, I, "I",       128, "load"),
+    InsnSpec("sq",         0x0000707f, 0x00004023, S, "I",       128, "store"),
+    InsnSpec("ldu",        0x0000707f, 0x00007003, I, "I",       128, "load"),
+    InsnSpec("addid",      0x0000707f, 0x0000005b, I, "I",       128, "addd"),
+    InsnSpec("sllid",      0xfc00707f, 0x0000105b, I, "I",       128, "slld"),
+    InsnSpec("srlid",      0xfc00707f, 0x0000505b, I, "I",       128, "srld"),
+    InsnSpec("sraid",      0xfc00707f, 0x4000505b, I, "I",       128, "srad"),
+    InsnSpec("addd",       0xfe00707f, 0x0000007b, R, "I",       128, "addd"),
+    InsnSpec("subd",       0xfe00707f, 0x4000007b, R, "I",       128, "subd"),
+    InsnSpec("slld",       0xfe00707f, 0x0000107b, R, "I",       128, "slld"),
+    InsnSpec("srld",       0xfe00707f, 0x0000507b, R, "I",       128, "srld"),
+    InsnSpec("srad",       0xfe00707f, 0x4000507b, R, "I",       128, "srad"),
+
+    InsnSpec("muld",       0xfe00707f, 0x0200007b, R, "M",       128, "muld"),
+    InsnSpec("divd",       0xfe00707f, 0x0200407b, R, "M",       128, "divd"),
+    InsnSpec("divud",      0xfe00707f, 0x0200507b, R, "M",       128, "divud"),
+    InsnSpec("remd",       0xfe00707f, 0x0200607b, R, "M",       128, "remd"),
+    InsnSpec("remud",      0xfe00707f, 0x0200707b, R, "M",       128, "remud"),
+]
+
+
+def _fp_rows(p, fmt, ext, mem, mv):
+    # The F, D and Q rows only differ in the 2-bit fmt field, the memory
+    # width and the integer move mnemonic suffix.
+    def f7(funct5):
+        return ((funct5 << 2) | fmt) << 25
+
+    rows = [
+        InsnSpec(f"fl{mem[0]}",      0x0000707f, (mem[1] << 12) | 0x07, I, ext, 32, "load", "fx"),
+        InsnSpec(f"fs{mem[0]}",      0x0000707f, (mem[1] << 12) | 0x27, S, ext, 32, "store", "-xf"),
+        InsnSpec(f"fmadd.{p}",       0x0600007f, (fmt << 25) | 0x43, R4, ext, 32, "fmadd", "ffff"),
+        InsnSpec(f"fmsub.{p}",       0x0600007f, (fmt << 25) | 0x47, R4, ext, 32, "fmsub", "ffff"),
+        InsnSpec(f"fnmsub.{p}",      0x0600007f, (fmt << 25) | 0x4b, R4, ext, 32, "fnmsub", "ffff"),
+        InsnSpec(f"fnmadd.{p}",      0x0600007f, (fmt << 25) | 0x4f, R4, ext, 32, "fnmadd", "ffff"),
+        InsnSpec(f"fadd.{p}",        0xfe00007f, f7(0x00) | 0x53, R, ext, 32, "fadd", "fff"),
+        InsnSpec(f"fsub.{p}",        0xfe00007f, f7(0x01) | 0x53, R, ext, 32, "fsub", "fff"),
+        InsnSpec(f"fmul.{p}",        0xfe00007f, f7(0x02) | 0x53, R, ext, 32, "fmul", "fff"),
+        InsnSpec(f"fdiv.{p}",        0xfe00007f, f7(0x03) | 0x53, R, ext, 32, "fdiv", "fff"),
+        InsnSpec(f"fsqrt.{p}",       0xfff0007f, f7(0x0b) | 0x53, R, ext, 32, "fsqrt", "ff"),
+        InsnSpec(f"fsgnj.{p}",       0xfe00707f, f7(0x04) | 0x0053, R, ext, 32, "fsgnj", "fff"),
+        InsnSpec(f"fsgnjn.{p}",      0xfe00707f, f7(0x04) | 0x1053, R, ext, 32, "fsgnjn", "fff"),
+        InsnSpec(f"fsgnjx.{p}",      0xfe00707f, f7(0x04) | 0x2053, R, ext, 32, "fsgnjx", "fff"),
+        InsnSpec(f"fmin.{p}",        0xfe00707f, f7(0x05) | 0x0053, R, ext, 32, "fmin", "fff"),
+        InsnSpec(f"fmax.{p}",        0xfe00707f, f7(0x05) | 0x1053, R, ext, 32, "fmax", "fff"),
+        InsnSpec(f"fle.{p}",         0xfe00707f, f7(0x14) | 0x0053, R, ext, 32, "fle", "xff"),
+        InsnSpec(f"flt.{p}",         0xfe00707f, f7(0x14) | 0x1053, R, ext, 32, "flt", "xff"),
+        InsnSpec(f"feq.{p}",         0xfe00707f, f7(0x14) | 0x2053, R, ext, 32, "feq", "xff"),
+        InsnSpec(f"fclass.{p}",      0xfff0707f, f7(0x1c) | 0x1053, R, ext, 32, "fclass", "xf"),
+        InsnSpec(f"fcvt.w.{p}",      0xfff0007f, f7(0x18) | (0 << 20) | 0x53, R, ext, 32, "fcvt.x.f", "xf"),
+        InsnSpec(f"fcvt.wu.{p}",     0xfff0007f, f7(0x18) | (1 << 20) | 0x53, R, ext, 32, "fcvt.x.f", "xf"),
+        InsnSpec(f"fcvt.l.{p}",      0xfff0007f, f7(0x18) | (2 << 20) | 0x53, R, ext, 64, "fcvt.x.f", "xf"),
+        InsnSpec(f"fcvt.lu.{p}",     0xfff0007f, f7(0x18) | (3 << 20) | 0x53, R, ext, 64, "fcvt.x.f", "xf"),
+        InsnSpec(f"fcvt.{p}.w",      0xfff0007f, f7(0x1a) | (0 << 20) | 0x53, R, ext, 32, "fcvt.f.x", "fx"),
+        InsnSpec(f"fcvt.{p}.wu",     0xfff0007f, f7(0x1a) | (1 << 20) | 0x53, R, ext, 32, "fcvt.f.x", "fx"),
+        InsnSpec(f"fcvt.{p}.l",      0xfff0007f, f7(0x1a) | (2 << 20) | 0x53, R, ext, 64, "fcvt.f.x", "fx"),
+        InsnSpec(f"fcvt.{p}.lu",     0xfff0007f, f7(0x1a) | (3 << 20) | 0x53, R, ext, 64, "fcvt.f.x", "fx"),
+    ]
+    if mv is not None:
+        rows += [
+            InsnSpec(f"fmv.x.{mv[0]}", 0xfff0707f, f7(0x1c) | 0x53, R, ext, mv[1], "fmv.x.f", "xf"),
+            InsnSpec(f"fmv.{mv[0]}.x", 0xfff0707f, f7(0x1e) | 0x53, R, ext, mv[1], "fmv.f.x", "fx"),
+        ]
+    return rows
+
+
+INSTRUCTIONS += _fp_rows("s", 0b00, "F", ("w", 0b010), ("w", 32))
+INSTRUCTIONS += _fp_rows("d", 0b01, "D", ("d", 0b011), ("d", 64))
+INSTRUCTIONS += _fp_rows("q", 0b11, "Q", ("q", 0b100), None)
+
+INSTRUCTIONS += [
+    InsnSpec("fcvt.s.d",   0xfff0007f, 0x40100053, R, "D",        32, "fcvt.f.f", "ff"),
+    InsnSpec("fcvt.d.s",   0xfff0007f, 0x42000053, R, "D",        32, "fcvt.f.f", "ff"),
+    InsnSpec("fcvt.s.q",   0xfff0007f, 0x40300053, R, "Q",        32, "fcvt.f.f", "ff"),
+    InsnSpec("fcvt.q.s",   0xfff0007f, 0x46000053, R, "Q",        32, "fcvt.f.f", "ff"),
+    InsnSpec("fcvt.d.q",   0xfff0007f, 0x42300053, R, "Q",        32, "fcvt.f.f", "ff"),
+    InsnSpec("fcvt.q.d",   0xfff0007f, 0x46100053, R, "Q",        32, "fcvt.f.f", "ff"),
+]
 
+DEFAULT_REGS = {
+    InstructionType.RType: "xxx",
+    InstructionType.IType: "xx",
+    InstructionType.SType: "-xx",
+    InstructionType.BType: "-xx",
+    InstructionType.UType: "x",
+    InstructionType.JType: "x",
+    InstructionType.R4Type: "ffff",
+}
+
+INSTRUCTIONS = [
+    s if s.regs else s._replace(regs=DEFAULT_REGS[s.fmt]) for s in INSTRUCTIONS
+]
+
+# Shift immediates: XLEN wide shifts have log2(XLEN) bit shift amounts, the
+# *W/*D variants 5 and 6 bits.
+SHIFT_SEMS = {"sll", "srl", "sra"}
+SHIFT_WIDTHS = {
+    "sll": None, "srl": None, "sra": None,
+    "sllw": 5, "srlw": 5, "sraw": 5,
+    "slld": 6, "srld": 6, "srad": 6,
+}
+XLEN_SHIFT_WIDTHS = {4: 5, 8: 6, 16: 7}
+FP_EXTENSIONS = {"F": 4, "D": 8, "Q": 16}
+CSR_SEMS = {"csrrw", "csrrs", "csrrc", "csrrwi", "csrrsi", "csrrci"}
+SYSTEM_SEMS = {"ecall", "ebreak", "sret", "mret", "wfi"}
+
+# Interned tokens for every mnemonic, pseudo-instruction and register.
+PSEUDO_MNEMONICS = ("nop", "li", "mv", "j", "jr")
+MNEMONIC_TOKENS = {
+    m: Token(TokenType.InstructionToken, m.ljust(8))
+    for m in [s.mnemonic for s in INSTRUCTIONS] + list(PSEUDO_MNEMONICS)
+}
+RET_TOKEN = Token(TokenType.InstructionToken, "ret")
+REG_TOKENS = {
+    reg_file: tuple(Token(TokenType.RegisterToken, name) for name in names)
+    for reg_file, names in REG_FILES.items()
+}
 
+# Loads and stores: mnemonic -> (bytes accessed, loaded value sign-extended).
+MEMORY_WIDTHS = {
+    "lb": (1, True), "lh": (2, True), "lw": (4, True), "ld": (8, True),
+    "lq": (16, True), "lbu": (1, False), "lhu": (2, False), "lwu": (4, False),
+    "ldu": (8, False), "sb": (1, False), "sh": (2, False), "sw": (4, False),
+    "sd": (8, False), "sq": (16, False), "flw": (4, False), "fld": (8, False),
+    "flq": (16, False), "fsw": (4, False), "fsd": (8, False), "fsq": (16, False),
+}
+
+# Register bitmasks: bits 0-31 are x0-x31, bits 32-63 f0-f31. x0 is
+# hardwired to zero, so it is never defined or used.
+REG_FILE_BASES = {"x": 0, "f": 32}
+REG_FIELDS = ("rd", "rs1", "rs2", "rs3")
+# Rows whose register fields are reserved or hold immediates.
+NO_REG_SEMS = SYSTEM_SEMS | {"fence", "fence.i"}
+
+_register_operands = {}
+
+
+def register_operands(spec):
+    # Register file ("x", "f") or None of the rd, rs1, rs2 and rs3 fields
+    # of spec. rd is written, the others are read.
+    files = _register_operands.get(spec)
+    if files is None:
+        if spec.sem in NO_REG_SEMS:
+            files = (None,) * 4
+        else:
+            files = [f if f != "-" else None for f in spec.regs.ljust(4, "-")]
+            if spec.sem in CSR_SEMS and spec.sem[-1] == "i":
+                # rs1 is an unsigned immediate.
+                files[1] = None
+            files = tuple(files)
+        files = _register_operands[spec] = files
+    return files
+
+
+# Decoded instructions don't depend on their address, so they are shared
+# between all occurrences of the same word and must not be mutated.
 class RiscVInstruction(object):
-    length = 0
-    opcode = 0
+    __slots__ = ("spec", "mnemonic", "sem", "length", "tokens", "masks")
+
     insn_type = InstructionType.NoType
 
-    def __init__(self):
-        pass
+    def __init__(self, spec):
+        self.spec = spec
+        self.mnemonic = spec.mnemonic
+        self.sem = spec.sem
+        self.length = 4
+
+    @property
+    def opcode(self):
+        return self.spec.match & OPCODE_MASK
 
     def get_info(self, _addr):
         return InstructionInfo()
 
+    def render(self):
+        # The address independent tokens, rendered once per instruction.
+        return ()
+
     def get_text(self, _addr):
-        pass
+        try:
+            tokens = self.tokens
+        except AttributeError:
+            tokens = self.tokens = tuple(self.render())
+        return (tokens, self.length)
+
+    def def_use(self):
+        # (defs, uses) register bitmasks, computed once per instruction.
+        try:
+            return self.masks
+        except AttributeError:
+            pass
+        defs = uses = 0
+        for i, reg_file in enumerate(register_operands(self.spec)):
+            if reg_file is None:
+                continue
+            reg = getattr(self, REG_FIELDS[i])
+            if reg or reg_file != "x":
+                if i:
+                    uses |= 1 << (reg + REG_FILE_BASES[reg_file])
+                else:
+                    defs |= 1 << (reg + REG_FILE_BASES[reg_file])
+        self.masks = (defs, uses)
+        return self.masks
 
-    def lift_insn(self, _addr, _il):
-        pass
+    @property
+    def defs(self):
+        return self.def_use()[0]
+
+    @property
+    def uses(self):
+        return self.def_use()[1]
 
 
 class RTypeInstruction(RiscVInstruction):
-    length = 4
+    __slots__ = ("rd", "rs1", "rs2")
+
     insn_type = InstructionType.RType
 
-    mnemonics = {
-        0b000: {
-            0b0000000: "add",
-            0b0100000: "sub",
-        },
-        0b001: {
-            0b0000000: "sll",
-        },
-        0b010: {
-            0b0000000: "slt",
-        },
-        0b011: {
-            0b0000000: "sltu",
-        },
-        0b100: {
-            0b0000000: "xor",
-        },
-        0b101: {
-            0b0000000: "srl",
-            0b0100000: "sra",
-        },
-        0b110: {
-            0b0000000: "or",
-        },
-        0b111: {
-            0b0000000: "and",
-        },
-    }
-
-    def __init__(self, opcode, rd, rs1, rs2, funct3, funct7):
-        self.opcode = opcode
+    def __init__(self, spec, rd, rs1, rs2):
+        self.spec = spec
+        self.mnemonic = spec.mnemonic
+        self.sem = spec.sem
+        self.length = 4
         self.rd = rd
         self.rs1 = rs1
         self.rs2 = rs2
-        self.funct3 = funct3
-        self.funct7 = funct7
 
     def get_info(self, _addr):
         info = super().get_info(_addr)
         info.length = self.length
         return info
 
-    def get_text(self, _addr):
-        op = Token(TokenType.InstructionToken,
-                   self.mnemonics[self.funct3][self.funct7].ljust(8))
-        space = Token(TokenType.TextToken, " ")
-        sep = Token(TokenType.OperandSeparatorToken, ", ")
-        rd = Token(TokenType.RegisterToken, GP_REGS[self.rd])
-        rs1 = Token(TokenType.RegisterToken, GP_REGS[self.rs1])
-        rs2 = Token(TokenType.RegisterToken, GP_REGS[self.rs2])
-        result = [
-            op, space, rd, sep, rs1, sep, rs2
-        ]
-        return (result, self.length)
+    def render(self):
+        result = [MNEMONIC_TOKENS[self.mnemonic], SPACE]
+        for reg_file, reg in zip(self.spec.regs, (self.rd, self.rs1, self.rs2)):
+            if reg_file != "-":
+                result.append(REG_TOKENS[reg_file][reg])
+                result.append(SEPARATOR)
+        result.pop()
+        return result
+
+
+class R4TypeInstruction(RiscVInstruction):
+    __slots__ = ("rd", "rs1", "rs2", "rs3")
+
+    insn_type = InstructionType.R4Type
+
+    def __init__(self, spec, rd, rs1, rs2, rs3):
+        self.spec = spec
+        self.mnemonic = spec.mnemonic
+        self.sem = spec.sem
+        self.length = 4
+        self.rd = rd
+        self.rs1 = rs1
+        self.rs2 = rs2
+        self.rs3 = rs3
 
-    def lift_insn(self, addr, il):
-        expr = il.unimplemented()
-        il.append(expr)
+    def get_info(self, _addr):
+        info = super().get_info(_addr)
+        info.length = self.length
+        return info
 
-        return self.length
+    def render(self):
+        regs = REG_TOKENS["f"]
+        return [
+            MNEMONIC_TOKENS[self.mnemonic], SPACE, regs[self.rd], SEPARATOR,
+            regs[self.rs1], SEPARATOR, regs[self.rs2], SEPARATOR, regs[self.rs3],
+        ]
 
 
 class ITypeInstruction(RiscVInstruction):
-    length = 4
+    __slots__ = ("rd", "rs1", "imm")
+
     insn_type = InstructionType.IType
 
-    mnemonics = {
-        0b0000011: {
-            0b000: "lb",
-            0b001: "lh",
-            0b010: "lw",
-            0b100: "lbu",
-            0b101: "lhu",
-        },
-        0b0001111: {
-            0b000: "fence",
-        },
-        0b0010011: {
-            0b000:  "addi",
-            0b001:  "slli",
-            0b010:  "slti",
-            0b011:  "sltiu",
-            0b100:  "xori",
-            0b101:  "srli",
-            0b110:  "ori",
-            0b111:  "andi",
-            0b1101: "srai",
-        },
-
-    }
-
-    def __init__(self, opcode, rd, rs1, funct3, imm, shmt):
-        self.opcode = opcode
+    def __init__(self, spec, rd, rs1, imm):
+        self.spec = spec
+        self.mnemonic = spec.mnemonic
+        self.sem = spec.sem
+        self.length = 4
         self.rd = rd
         self.rs1 = rs1
-        self.funct3 = funct3
         self.imm = imm
-        self.shmt = shmt
 
     def get_info(self, _addr):
         info = super().get_info(_addr)
         info.length = self.length
 
-        if self.opcode in branch_instructions:
-            if self.opcode == 0b1110011 and not self.imm:
-                # ECALL
-                info.add_branch(BranchType.SystemCall)
-            elif self.opcode == 0b1110011 and self.imm:
-                # EBREAK
-                info.add_branch(BranchType.ExceptionBranch)
-            elif self.opcode == 0b1100111:
-                # JALR
+        if self.sem == "ecall":
+            info.add_branch(BranchType.SystemCall)
+        elif self.sem == "ebreak":
+            info.add_branch(BranchType.ExceptionBranch)
+        elif self.sem == "jalr" and not self.rd:
+            # With a link register jalr is an indirect call, which falls
+            # through as far as the control flow graph is concerned.
+            if self.rs1 == 1 and not self.imm:
+                info.add_branch(BranchType.FunctionReturn)
+            else:
                 info.add_branch(BranchType.IndirectBranch)
 
         return info
 
-    def get_text(self, _addr):
-        result = []
-        space = Token(TokenType.TextToken, " ")
-        sep = Token(TokenType.OperandSeparatorToken, ", ")
-        rd = Token(TokenType.RegisterToken, GP_REGS[self.rd])
-        rs1 = Token(TokenType.RegisterToken, GP_REGS[self.rs1])
-
-        if self.opcode in branch_instructions:
-            if self.opcode == 0b1110011 and not self.imm:
-                # ECALL
-                result.append(
-                    Token(TokenType.InstructionToken, "ecall".ljust(8)))
-            elif self.opcode == 0b1110011 and self.imm:
-                # EBREAK
-                result.append(
-                    Token(TokenType.InstructionToken, "ebreak".ljust(8)))
-            elif self.opcode == 0b1100111:
-                # JALR
-                if self.rd:
-                    tgt = (self.imm + self.rs1) & ((1 << 32) - 2)
-                    result.append(
-                        Token(TokenType.InstructionToken, "jalr".ljust(8)))
-                    result.append(space)
-                    result.append(
-                        Token(TokenType.RegisterToken, GP_REGS[self.rd]))
-                    result.append(sep)
-                    result.append(Token(TokenType.IntegerToken,
-                                  hex(self.imm), value=self.imm))
-                    result.append(Token(TokenType.TextToken, "("))
-                    result.append(
-                        Token(TokenType.RegisterToken, GP_REGS[self.rs1]))
-                    result.append(Token(TokenType.TextToken, ")"))
-                else:
-                    result.append(Token(TokenType.InstructionToken, "ret"))
-
-        elif self.opcode == 0b0000011:
-            result.append(Token(TokenType.InstructionToken,
-                          self.mnemonics[self.opcode][self.funct3].ljust(8)))
-            result.append(space)
-            result.append(rd)
-            result.append(sep)
-            result.append(Token(TokenType.IntegerToken,
-                          hex(self.imm), value=self.imm))
-            result.append(Token(TokenType.BeginMemoryOperandToken, "("))
-            result.append(rs1)
-            result.append(Token(TokenType.EndMemoryOperandToken, ")"))
-
-        else:
-            op = self.opcode
-            if self.shmt is not None:
-                op |= (self.imm >> 10) << 4
-
-            mnemonic = self.mnemonics[op][self.funct3]
-            if mnemonic == "addi" and self.imm == 0 and self.rs1 == 0 and self.rd == 0:
-                mnemonic == "nop"
-            elif mnemonic == "addi" and self.rs1 == 0:
-                mnemonic = "li"
-            elif mnemonic == "addi" and self.imm == 0:
-                mnemonic = "mv"
-
-            result.append(Token(TokenType.InstructionToken, mnemonic.ljust(8)))
-            if mnemonic != "nop":
-                result.append(space)
-                result.append(rd)
-                if mnemonic != "li":
-                    result.append(sep)
-                    result.append(rs1)
-                if mnemonic != "mv":
-                    result.append(sep)
-                    val = self.imm if self.shmt is None else self.shmt
-                    result.append(
-                        Token(TokenType.IntegerToken, hex(val), value=val))
-
-        return (result, self.length)
-
-    def lift_insn(self, addr, il):
-        expr = il.unimplemented()
-        il.append(expr)
-
-        return self.length
+    def render(self):
+        regs = self.spec.regs
+        rd = REG_TOKENS[regs[0]][self.rd]
+        rs1 = REG_TOKENS[regs[1]][self.rs1]
+        imm = Token(TokenType.IntegerToken, hex(self.imm), value=self.imm)
+        sem = self.sem
+
+        if sem in SYSTEM_SEMS or sem == "fence" or sem == "fence.i":
+            return [MNEMONIC_TOKENS[self.mnemonic]]
+
+        if sem == "jalr":
+            if self.rd:
+                return [
+                    MNEMONIC_TOKENS["jalr"], SPACE, rd, SEPARATOR,
+                    imm, PAREN_OPEN, rs1, PAREN_CLOSE,
+                ]
+            if self.rs1 == 1 and not self.imm:
+                return [RET_TOKEN]
+            if self.imm:
+                return [MNEMONIC_TOKENS["jr"], SPACE, imm, PAREN_OPEN, rs1, PAREN_CLOSE]
+            return [MNEMONIC_TOKENS["jr"], SPACE, rs1]
+
+        if sem == "load":
+            return [
+                MNEMONIC_TOKENS[self.mnemonic], SPACE, rd, SEPARATOR,
+                imm, MEMORY_BEGIN, rs1, MEMORY_END,
+            ]
+
+        if sem in CSR_SEMS:
+            if sem[-1] == "i":
+                rs1 = Token(TokenType.IntegerToken, hex(self.rs1), value=self.rs1)
+            return [MNEMONIC_TOKENS[self.mnemonic], SPACE, rd, SEPARATOR, imm, SEPARATOR, rs1]
+
+        if self.mnemonic == "addi":
+            if self.imm == 0 and self.rs1 == 0 and self.rd == 0:
+                return [MNEMONIC_TOKENS["nop"]]
+            if self.rs1 == 0:
+                return [MNEMONIC_TOKENS["li"], SPACE, rd, SEPARATOR, imm]
+            if self.imm == 0:
+                return [MNEMONIC_TOKENS["mv"], SPACE, rd, SEPARATOR, rs1]
+        return [MNEMONIC_TOKENS[self.mnemonic], SPACE, rd, SEPARATOR, rs1, SEPARATOR, imm]
 
 
 class STypeInstruction(RiscVInstruction):
-    length = 4
-    insn_type = InstructionType.SType
+    __slots__ = ("rs1", "rs2", "imm")
 
-    mnemonics = {
-        0b000: "sb",
-        0b001: "sh",
-        0b010: "sw",
-    }
+    insn_type = InstructionType.SType
 
-    def __init__(self, opcode, rs1, rs2, funct3, imm):
-        self.opcode = opcode
+    def __init__(self, spec, rs1, rs2, imm):
+        self.spec = spec
+        self.mnemonic = spec.mnemonic
+        self.sem = spec.sem
+        self.length = 4
         self.rs1 = rs1
         self.rs2 = rs2
-        self.funct3 = funct3
         self.imm = imm
 
     def get_info(self, _addr):
@@ -335,91 +555,66 @@ class STypeInstruction(RiscVInstruction):
         info.length = self.length
         return info
 
-    def get_text(self, _addr):
-        space = Token(TokenType.TextToken, " ")
-        sep = Token(TokenType.OperandSeparatorToken, ", ")
-
-        result = []
-        result.append(Token(TokenType.InstructionToken,
-                      self.mnemonics[self.funct3].ljust(8)))
-        result.append(space)
-        result.append(Token(TokenType.RegisterToken, GP_REGS[self.rs2]))
-        result.append(sep)
-        result.append(Token(TokenType.IntegerToken,
-                      hex(self.imm), value=self.imm))
-        result.append(Token(TokenType.BeginMemoryOperandToken, "("))
-        result.append(Token(TokenType.RegisterToken, GP_REGS[self.rs1]))
-        result.append(Token(TokenType.EndMemoryOperandToken, ")"))
-        return (result, self.length)
-
-    def lift_insn(self, addr, il):
-        expr = il.unimplemented()
-        il.append(expr)
-
-        return self.length
+    def render(self):
+        return [
+            MNEMONIC_TOKENS[self.mnemonic], SPACE,
+            REG_TOKENS[self.spec.regs[2]][self.rs2], SEPARATOR,
+            Token(TokenType.IntegerToken, hex(self.imm), value=self.imm),
+            MEMORY_BEGIN, REG_TOKENS["x"][self.rs1], MEMORY_END,
+        ]
 
 
 class BTypeInstruction(RiscVInstruction):
-    length = 4
+    __slots__ = ("rs1", "rs2", "imm")
+
     insn_type = InstructionType.BType
 
-    mnemonics = {
-        0b000: "beq",
-        0b001: "bne",
-        0b100: "blt",
-        0b101: "bge",
-        0b110: "bltu",
-        0b111: "bgeu",
-    }
-
-    def __init__(self, opcode, rs1, rs2, funct3, imm):
-        self.opcode = opcode
+    def __init__(self, spec, rs1, rs2, imm):
+        self.spec = spec
+        self.mnemonic = spec.mnemonic
+        self.sem = spec.sem
+        self.length = 4
         self.rs1 = rs1
         self.rs2 = rs2
-        self.funct3 = funct3
         self.imm = imm
 
     def get_info(self, addr):
         info = super().get_info(addr)
         info.length = self.length
         info.add_branch(BranchType.TrueBranch,  target=addr + self.imm)
-        info.add_branch(BranchType.FalseBranch, target=addr + 4)
+        info.add_branch(BranchType.FalseBranch, target=addr + self.length)
         return info
 
-    def get_text(self, addr):
-        space = Token(TokenType.TextToken, " ")
-        sep = Token(TokenType.OperandSeparatorToken, ", ")
-
-        result = []
-        result.append(Token(TokenType.InstructionToken,
-                      self.mnemonics[self.funct3].ljust(8)))
-        result.append(space)
-        result.append(Token(TokenType.RegisterToken, GP_REGS[self.rs1]))
-        result.append(sep)
-        result.append(Token(TokenType.RegisterToken, GP_REGS[self.rs2]))
-        result.append(sep)
-        result.append(Token(TokenType.PossibleAddressToken,
-                      hex(self.imm + addr), value=self.imm + addr))
-        return (result, self.length)
-
-    def lift_insn(self, addr, il):
-        expr = il.unimplemented()
-        il.append(expr)
+    def render(self):
+        regs = REG_TOKENS["x"]
+        return [
+            MNEMONIC_TOKENS[self.mnemonic], SPACE,
+            regs[self.rs1], SEPARATOR, regs[self.rs2], SEPARATOR,
+        ]
 
-        return self.length
+    def get_text(self, addr):
+        # Only the target depends on the address, it is appended to the
+        # rendered template.
+        try:
+            tokens = self.tokens
+        except AttributeError:
+            tokens = self.tokens = tuple(self.render())
+        target = addr + self.imm
+        return (
+            tokens + (Token(TokenType.PossibleAddressToken, hex(target), value=target),),
+            self.length)
 
 
 class UTypeInstruction(RiscVInstruction):
-    length = 4
-    insn_type = InstructionType.UType
+    __slots__ = ("rd", "imm")
 
-    mnemonics = {
-        0b0110111: "lui",
-        0b0010111: "auipc",
-    }
+    insn_type = InstructionType.UType
 
-    def __init__(self, opcode, rd, imm):
-        self.opcode = opcode
+    def __init__(self, spec, rd, imm):
+        self.spec = spec
+        self.mnemonic = spec.mnemonic
+        self.sem = spec.sem
+        self.length = 4
         self.rd = rd
         self.imm = imm
 
@@ -428,132 +623,346 @@ class UTypeInstruction(RiscVInstruction):
         info.length = self.length
         return info
 
-    def get_text(self, _addr):
-        space = Token(TokenType.TextToken, " ")
-        sep = Token(TokenType.OperandSeparatorToken, ", ")
-
-        result = []
-        result.append(Token(TokenType.InstructionToken,
-                      self.mnemonics[self.opcode].ljust(8)))
-        result.append(space)
-        result.append(Token(TokenType.RegisterToken, GP_REGS[self.rd]))
-        result.append(sep)
-        result.append(Token(TokenType.IntegerToken,
-                      hex(self.imm), value=self.imm))
-        return (result, self.length)
-
-    def lift_insn(self, addr, il):
-        expr = il.unimplemented()
-        il.append(expr)
-
-        return self.length
+    def render(self):
+        imm = self.imm & 0xffffffff
+        return [
+            MNEMONIC_TOKENS[self.mnemonic], SPACE, REG_TOKENS["x"][self.rd], SEPARATOR,
+            Token(TokenType.IntegerToken, hex(imm), value=imm),
+        ]
 
 
 class JTypeInstruction(RiscVInstruction):
-    length = 4
-    insn_type = InstructionType.JType
+    __slots__ = ("rd", "imm")
 
-    mnemonics = {
-        0b1101111: "jal",
-        0b11101111: "j",
-    }
+    insn_type = InstructionType.JType
 
-    def __init__(self, opcode, rd, imm):
-        self.opcode = opcode
+    def __init__(self, spec, rd, imm):
+        self.spec = spec
+        self.mnemonic = spec.mnemonic
+        self.sem = spec.sem
+        self.length = 4
         self.rd = rd
         self.imm = imm
 
-    def get_info(self, _addr):
-        info = super().get_info(_addr)
+    def get_info(self, addr):
+        info = super().get_info(addr)
         info.length = self.length
-        info.add_branch(BranchType.CallDestination, target=self.imm)
+        if self.rd:
+            info.add_branch(BranchType.CallDestination, target=addr + self.imm)
+        else:
+            info.add_branch(BranchType.UnconditionalBranch, target=addr + self.imm)
         return info
 
+    def render(self):
+        if not self.rd:
+            return [MNEMONIC_TOKENS["j"], SPACE]
+        return [MNEMONIC_TOKENS[self.mnemonic], SPACE, REG_TOKENS["x"][self.rd], TEXT_SEPARATOR]
+
     def get_text(self, addr):
-        space = Token(TokenType.TextToken, " ")
-        op = self.opcode | ((self.rd == 0) << 7)
+        try:
+            tokens = self.tokens
+        except AttributeError:
+            tokens = self.tokens = tuple(self.render())
+        target = addr + self.imm
+        return (
+            tokens + (Token(TokenType.PossibleAddressToken, hex(target), value=target),),
+            self.length)
 
-        result = []
-        result.append(Token(TokenType.InstructionToken,
-                      self.mnemonics[op].ljust(8)))
-        result.append(space)
-        if self.rd:
-            result.append(Token(TokenType.RegisterToken, GP_REGS[self.rd]))
-            result.append(Token(TokenType.TextToken, ", "))
-        result.append(Token(TokenType.PossibleAddressToken,
-                      hex(self.imm + addr), value=self.imm + addr))
-        return (result, self.length)
 
-    def lift_insn(self, addr, il):
-        expr = il.unimplemented()
-        il.append(expr)
+def _decode_r(spec, insn):
+    return RTypeInstruction(
+        spec, (insn >> 7) & 0b11111, (insn >> 15) & 0b11111, (insn >> 20) & 0b11111)
+
+
+def _decode_i(spec, insn):
+    imm = ((insn >> 20) ^ 0x800) - 0x800
+    return ITypeInstruction(spec, (insn >> 7) & 0b11111, (insn >> 15) & 0b11111, imm)
+
+
+def _decode_i_shift(spec, shamt_mask, insn):
+    return ITypeInstruction(
+        spec, (insn >> 7) & 0b11111, (insn >> 15) & 0b11111, (insn >> 20) & shamt_mask)
+
+
+def _decode_i_csr(spec, insn):
+    return ITypeInstruction(
+        spec, (insn >> 7) & 0b11111, (insn >> 15) & 0b11111, insn >> 20)
+
+
+def _decode_s(spec, insn):
+    imm = (_get_funct7(insn) << 5) | _get_rd(insn)
+    imm = (imm ^ 0x800) - 0x800
+    return STypeInstruction(spec, (insn >> 15) & 0b11111, (insn >> 20) & 0b11111, imm)
+
+
+def _decode_b(spec, insn):
+    imm_1 = _get_rd(insn)
+    imm_2 = _get_funct7(insn)
+    imm = (((imm_2 >> 6) & 1) << 12) | ((imm_1 & 1) << 11) | (
+        (imm_2 & 0b111111) << 5) | (imm_1 & 0b11110)
+    imm = (imm ^ 0x1000) - 0x1000
+    return BTypeInstruction(spec, (insn >> 15) & 0b11111, (insn >> 20) & 0b11111, imm)
+
 
-        return self.length
+def _decode_u(spec, insn):
+    imm = ((insn & 0xfffff000) ^ 0x80000000) - 0x80000000
+    return UTypeInstruction(spec, (insn >> 7) & 0b11111, imm)
 
 
-def from_bytes(insn_bytes, addr):
-    if len(insn_bytes) != 4 or addr % 4 != 0:
+def _decode_j(spec, insn):
+    imm_parts = _get_big_imm(insn)
+
+    imm_1 = imm_parts & 0b11111111
+    imm_2 = (imm_parts >> 8) & 0b1
+    imm_3 = (imm_parts >> 9) & 0b1111111111
+    imm_4 = (imm_parts >> 19) & 0b1
+    imm = (imm_4 << 20) | (imm_1 << 12) | (imm_2 << 11) | (imm_3 << 1)
+    imm = (imm ^ 0x100000) - 0x100000
+    return JTypeInstruction(spec, (insn >> 7) & 0b11111, imm)
+
+
+def _decode_r4(spec, insn):
+    return R4TypeInstruction(
+        spec, (insn >> 7) & 0b11111, (insn >> 15) & 0b11111, (insn >> 20) & 0b11111,
+        insn >> 27)
+
+
+FORMAT_DECODERS = {
+    InstructionType.RType: _decode_r,
+    InstructionType.IType: _decode_i,
+    InstructionType.SType: _decode_s,
+    InstructionType.BType: _decode_b,
+    InstructionType.UType: _decode_u,
+    InstructionType.JType: _decode_j,
+    InstructionType.R4Type: _decode_r4,
+}
+
+
+def shamt_width(spec, xlen):
+    # Bits of the shift amount of a shift-immediate row, None for other rows.
+    if spec.fmt != InstructionType.IType or spec.sem not in SHIFT_WIDTHS:
         return None
-    insn = unpack("<I", insn_bytes)[0]
-    opcode = _get_opcode(insn)
-
-    if opcode in r_type_opcodes:
-        rd = _get_rd(insn)
-        rs1 = _get_rs1(insn)
-        rs2 = _get_rs2(insn)
-        funct3 = _get_funct3(insn)
-        funct7 = _get_funct7(insn)
-        return RTypeInstruction(opcode, rd, rs1, rs2, funct3, funct7)
-
-    elif opcode in i_type_opcodes:
-        rd = _get_rd(insn)
-        rs1 = _get_rs1(insn)
-        funct3 = _get_funct3(insn)
-
-        shmt = None
-        imm = (_get_funct7(insn) << 5) | _get_rs2(insn)
-        if funct3 == 101:
-            shmt = imm & 0b11111
-        imm = _sign_extend(imm, 12)
-
-        return ITypeInstruction(opcode, rd, rs1, funct3, imm, shmt)
-
-    elif opcode in s_type_opcodes:
-        rs1 = _get_rs1(insn)
-        rs2 = _get_rs2(insn)
-        funct3 = _get_funct3(insn)
-        imm = (_get_funct7(insn) << 5) | _get_rd(insn)
-        imm = _sign_extend(imm, 12)
-        return STypeInstruction(opcode, rs1, rs2, funct3, imm)
-
-    elif opcode in b_type_opcodes:
-        imm_1 = _get_rd(insn)
-        imm_2 = _get_funct7(insn)
-        rs1 = _get_rs1(insn)
-        rs2 = _get_rs2(insn)
-        funct3 = _get_funct3(insn)
-        imm = (((imm_2 >> 6) & 1) << 12) | ((imm_1 & 1) << 11) | (
-            (imm_2 & 0b111111) << 5) | (imm_1 & 0b11110)
-        imm = _sign_extend(imm, 12)
-        return BTypeInstruction(opcode, rs1, rs2, funct3, imm)
-
-    elif opcode in u_type_opcodes:
-        imm = _get_big_imm(insn) << 12
-        rd = _get_rd(insn)
-        return UTypeInstruction(opcode, rd, imm)
-
-    elif opcode in j_type_opcodes:
-        imm_parts = _get_big_imm(insn)
-
-        imm_1 = imm_parts & 0b11111111
-        imm_2 = (imm_parts >> 8) & 0b1
-        imm_3 = (imm_parts >> 9) & 0b1111111111
-        imm_4 = (imm_parts >> 19) & 0b1
-        imm = (imm_4 << 20) | (imm_1 << 12) | (imm_2 << 11) | (imm_3 << 1)
-        imm = _sign_extend(imm, 20)
-
-        rd = _get_rd(insn)
-        return JTypeInstruction(opcode, rd, imm)
-
-    else:
+    return SHIFT_WIDTHS[spec.sem] or XLEN_SHIFT_WIDTHS[xlen]
+
+
+# Rounding modes a floating point row leaving funct3 to them can't have.
+RESERVED_ROUNDING_MODES = (0b101, 0b110)
+
+
+def has_rounding_mode(spec):
+    # Whether funct3 of spec is a rounding mode rather than fixed.
+    return (spec.fmt in (InstructionType.RType, InstructionType.R4Type) and
+            not spec.mask & FUNCT3_MASK)
+
+
+def decode_rows(xlen, flen):
+    # (spec, mask) of every row that exists for the given XLEN and FLEN (in
+    # bytes). XLEN wide shift immediates give their funct7 low bits to the
+    # shift amount on RV64 and RV128, so their mask depends on XLEN.
+    rows = []
+    for spec in INSTRUCTIONS:
+        if spec.xlen > xlen * 8:
+            continue
+        if spec.ext in FP_EXTENSIONS and (flen or 0) < FP_EXTENSIONS[spec.ext]:
+            continue
+        mask = spec.mask
+        width = shamt_width(spec, xlen)
+        if width is not None:
+            mask &= ~(((1 << width) - 1) << 20)
+        rows.append((spec, mask))
+    return rows
+
+
+def _format_decoder(spec, xlen):
+    width = shamt_width(spec, xlen)
+    if width is not None:
+        return partial(_decode_i_shift, spec, (1 << width) - 1)
+    if spec.fmt == InstructionType.IType and spec.sem in CSR_SEMS:
+        return partial(_decode_i_csr, spec)
+    return partial(FORMAT_DECODERS[spec.fmt], spec)
+
+
+def _invalid(_insn):
+    return None
+
+
+def _decode_scan(candidates, insn):
+    for mask, match, decode in candidates:
+        if insn & mask == match:
+            return decode(insn)
+    return None
+
+
+# Leaf decoders and table rows are shared between the decoders of all
+# (XLEN, FLEN) pairs wherever they come out identical.
+_leaves = {}
+_shared = {}
+
+
+def compile_decode_table(rows, xlen):
+    # opcode -> funct3 -> funct7 -> decode(insn). Cells whose rows look at
+    # more bits than opcode/funct3/funct7 (e.g. ecall vs ebreak) get a short
+    # mask/match scan, every other cell is a single pre-bound decoder.
+    by_opcode = {}
+    for spec, mask in rows:
+        by_opcode.setdefault(spec.match & OPCODE_MASK, []).append((spec, mask))
+
+    table = [(((_invalid,) * 128),) * 8] * 128
+    for opcode, op_rows in by_opcode.items():
+        op_rows = sorted(op_rows, key=lambda row: -bin(row[1]).count("1"))
+        leaves = []
+        for spec, mask in op_rows:
+            key = (spec, shamt_width(spec, xlen))
+            leaf = _leaves.get(key)
+            if leaf is None:
+                leaf = _leaves[key] = _format_decoder(spec, xlen)
+            leaves.append((spec, mask, leaf))
+
+        # Rows mostly fix funct3 and either fix or ignore funct7, so filling
+        # the cells row by row is much cheaper than testing every cell.
+        cells = [[[] for _funct7 in range(128)] for _funct3 in range(8)]
+        for spec, mask, leaf in leaves:
+            mask3, match3 = (mask >> 12) & 0b111, (spec.match >> 12) & 0b111
+            mask7, match7 = mask >> 25, spec.match >> 25
+            funct7s = [f for f in range(128) if f & mask7 == match7]
+            reserved = RESERVED_ROUNDING_MODES if has_rounding_mode(spec) else ()
+            for funct3 in range(8):
+                if funct3 & mask3 == match3 and funct3 not in reserved:
+                    row = cells[funct3]
+                    for funct7 in funct7s:
+                        row[funct7].append((spec, mask, leaf))
+
+        funct3_table = []
+        for funct3 in range(8):
+            funct7_table = []
+            for cell in cells[funct3]:
+                if not cell:
+                    funct7_table.append(_invalid)
+                elif len(cell) == 1 and cell[0][1] & ~DISPATCH_MASK == 0:
+                    funct7_table.append(cell[0][2])
+                else:
+                    candidates = tuple(
+                        (mask, spec.match, leaf) for spec, mask, leaf in cell)
+                    funct7_table.append(
+                        _shared.setdefault(candidates, partial(_decode_scan, candidates)))
+            funct7_table = tuple(funct7_table)
+            funct3_table.append(_shared.setdefault(funct7_table, funct7_table))
+        table[opcode] = tuple(funct3_table)
+
+    return tuple(table)
+
+
+# Upper bound for interned instructions per decoder, words beyond it are
+# still decoded, just not shared.
+INTERN_LIMIT = 1 << 18
+
+
+def insn_length(insn_bytes):
+    return 4 if insn_bytes[0] & 0b11 == 0b11 else 2
+
+
+class Decoder(object):
+    # The decode functions of one (XLEN, FLEN) pair. They are closures over
+    # that pair's table so the hot path never looks at XLEN or FLEN.
+    def __init__(self, xlen, flen):
+        self.xlen = xlen
+        self.flen = flen
+        self.rows = decode_rows(xlen, flen)
+        self.table = table = compile_decode_table(self.rows, xlen)
+        self.interned = interned = {}
+        xlen_bits = xlen * 8
+        # Major opcodes with at least one row. Anything else, e.g. data or
+        # padding in the middle of code, is rejected on its first byte.
+        opcodes = {spec.match & 0x7f for spec, _ in self.rows}
+        self.valid_opcodes = valid_opcodes = bytes(op in opcodes for op in range(128))
+
+        def decode_word(insn):
+            return table[insn & 0x7f][(insn >> 12) & 0b111][insn >> 25](insn)
+
+        def decode_interned(insn):
+            ret = interned.get(insn)
+            if ret is None:
+                ret = decode_word(insn)
+                if ret is not None and len(interned) < INTERN_LIMIT:
+                    interned[insn] = ret
+            return ret
+
+        def decode_compressed(half):
+            # Compressed instructions are decoded as their 32-bit expansion.
+            # Their low two bits are never 0b11, so they can share the intern
+            # table with full words.
+            ret = interned.get(half)
+            if ret is None:
+                word = expansion_table(xlen_bits)[half]
+                if not word:
+                    return None
+                ret = decode_word(word)
+                if ret is not None:
+                    ret.length = 2
+                    interned[half] = ret
+            return ret
+
+        def from_bytes(insn_bytes, addr):
+            if len(insn_bytes) < 2 or addr % 2 != 0:
+                return None
+            if insn_bytes[0] & 0b11 != 0b11:
+                return decode_compressed(insn_bytes[0] | (insn_bytes[1] << 8))
+            if len(insn_bytes) < 4 or not valid_opcodes[insn_bytes[0] & 0x7f]:
+                return None
+            return decode_interned(unpack_from("<I", insn_bytes)[0])
+
+        self.decode_word = decode_word
+        self.decode_interned = decode_interned
+        self.decode_compressed = decode_compressed
+        self.from_bytes = from_bytes
+
+
+XLENS = (4, 8, 16)
+FLENS = (None, 4, 8, 16)
+
+VARIANTS = frozenset((xlen, flen) for xlen in XLENS for flen in FLENS)
+
+_build_lock = threading.Lock()
+
+
+class Decoders(dict):
+    # (XLEN, FLEN) -> Decoder, built on first use so that only the variants
+    # actually analyzed pay for their tables. dict.get() only returns the
+    # ones built so far, get_decoder() builds them too.
+    def __missing__(self, key):
+        if key not in VARIANTS:
+            raise KeyError(key)
+        # Analysis threads can ask for a new variant at the same time, it
+        # is built once.
+        with _build_lock:
+            decoder = dict.get(self, key)
+            if decoder is None:
+                decoder = self[key] = Decoder(*key)
+        return decoder
+
+
+DECODERS = Decoders()
+
+
+def get_decoder(xlen, flen):
+    if (xlen, flen) not in VARIANTS:
         return None
+    return DECODERS[(xlen, flen)]
+
+
+# The RV32 decoder under its old module level names, also built on first use.
+RV32_ALIASES = {
+    "RV32": lambda d: d,
+    "DECODE_TABLE": lambda d: d.table,
+    "decode_word": lambda d: d.decode_word,
+    "decode_interned": lambda d: d.decode_interned,
+    "decode_compressed": lambda d: d.decode_compressed,
+    "from_bytes": lambda d: d.from_bytes,
+}
+
+
+def __getattr__(name):
+    alias = RV32_ALIASES.get(name)
+    if alias is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    return alias(DECODERS[(4, None)])
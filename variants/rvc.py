@@ -0,0 +1,278 @@
+from array import array
+
+
+LOAD = 0b0000011
+LOAD_FP = 0b0000111
+MISC_MEM = 0b0001111
+OP_IMM = 0b0010011
+OP_IMM_32 = 0b0011011
+STORE = 0b0100011
+STORE_FP = 0b0100111
+OP = 0b0110011
+LUI = 0b0110111
+OP_32 = 0b0111011
+BRANCH = 0b1100011
+JALR = 0b1100111
+JAL = 0b1101111
+SYSTEM = 0b1110011
+
+ILLEGAL = 0
+
+
+def _bits(h, hi, lo):
+    return (h >> lo) & ((1 << (hi - lo + 1)) - 1)
+
+
+def _sign_extend(x, b):
+    m = 1 << (b - 1)
+    x = x & ((1 << b) - 1)
+    return (x ^ m) - m
+
+
+def _r(opcode, rd, funct3, rs1, rs2, funct7):
+    return (funct7 << 25) | (rs2 << 20) | (rs1 << 15) | (funct3 << 12) | (rd << 7) | opcode
+
+
+def _i(opcode, rd, funct3, rs1, imm):
+    return ((imm & 0xfff) << 20) | (rs1 << 15) | (funct3 << 12) | (rd << 7) | opcode
+
+
+def _s(opcode, funct3, rs1, rs2, imm):
+    return (((imm >> 5) & 0x7f) << 25) | (rs2 << 20) | (rs1 << 15) | \
+        (funct3 << 12) | ((imm & 0x1f) << 7) | opcode
+
+
+def _b(opcode, funct3, rs1, rs2, imm):
+    return (((imm >> 12) & 1) << 31) | (((imm >> 5) & 0x3f) << 25) | (rs2 << 20) | \
+        (rs1 << 15) | (funct3 << 12) | (((imm >> 1) & 0xf) << 8) | \
+        (((imm >> 11) & 1) << 7) | opcode
+
+
+def _u(opcode, rd, imm):
+    return (imm & 0xfffff000) | (rd << 7) | opcode
+
+
+def _j(opcode, rd, imm):
+    return (((imm >> 20) & 1) << 31) | (((imm >> 1) & 0x3ff) << 21) | \
+        (((imm >> 11) & 1) << 20) | (((imm >> 12) & 0xff) << 12) | (rd << 7) | opcode
+
+
+def _shamt(h, xlen):
+    shamt = (_bits(h, 12, 12) << 5) | _bits(h, 6, 2)
+    if xlen == 32 and shamt & 0x20:
+        return None
+    if xlen == 128:
+        # RV128C sign-extends the shift amount and encodes 64 as 0.
+        if shamt == 0:
+            return 64
+        if shamt & 0x20:
+            return shamt + 64
+    return shamt
+
+
+def _quadrant0(h, xlen):
+    funct3 = _bits(h, 15, 13)
+    rd = 8 + _bits(h, 4, 2)
+    rs1 = 8 + _bits(h, 9, 7)
+    rs2 = rd
+
+    uimm_w = (_bits(h, 12, 10) << 3) | (_bits(h, 6, 6) << 2) | (_bits(h, 5, 5) << 6)
+    uimm_d = (_bits(h, 12, 10) << 3) | (_bits(h, 6, 5) << 6)
+    uimm_q = (_bits(h, 12, 11) << 4) | (_bits(h, 10, 10) << 8) | (_bits(h, 6, 5) << 6)
+
+    if funct3 == 0b000:
+        # c.addi4spn
+        nzuimm = (_bits(h, 12, 11) << 4) | (_bits(h, 10, 7) << 6) | \
+            (_bits(h, 6, 6) << 2) | (_bits(h, 5, 5) << 3)
+        if not nzuimm:
+            return ILLEGAL
+        return _i(OP_IMM, rd, 0b000, 2, nzuimm)
+    elif funct3 == 0b001:
+        # c.fld / c.lq
+        if xlen == 128:
+            return _i(MISC_MEM, rd, 0b010, rs1, uimm_q)
+        return _i(LOAD_FP, rd, 0b011, rs1, uimm_d)
+    elif funct3 == 0b010:
+        # c.lw
+        return _i(LOAD, rd, 0b010, rs1, uimm_w)
+    elif funct3 == 0b011:
+        # c.flw / c.ld
+        if xlen == 32:
+            return _i(LOAD_FP, rd, 0b010, rs1, uimm_w)
+        return _i(LOAD, rd, 0b011, rs1, uimm_d)
+    elif funct3 == 0b101:
+        # c.fsd / c.sq
+        if xlen == 128:
+            return _s(STORE, 0b100, rs1, rs2, uimm_q)
+        return _s(STORE_FP, 0b011, rs1, rs2, uimm_d)
+    elif funct3 == 0b110:
+        # c.sw
+        return _s(STORE, 0b010, rs1, rs2, uimm_w)
+    elif funct3 == 0b111:
+        # c.fsw / c.sd
+        if xlen == 32:
+            return _s(STORE_FP, 0b010, rs1, rs2, uimm_w)
+        return _s(STORE, 0b011, rs1, rs2, uimm_d)
+    return ILLEGAL
+
+
+def _quadrant1(h, xlen):
+    funct3 = _bits(h, 15, 13)
+    rd = _bits(h, 11, 7)
+    imm6 = _sign_extend((_bits(h, 12, 12) << 5) | _bits(h, 6, 2), 6)
+    jimm = _sign_extend(
+        (_bits(h, 12, 12) << 11) | (_bits(h, 11, 11) << 4) | (_bits(h, 10, 9) << 8) |
+        (_bits(h, 8, 8) << 10) | (_bits(h, 7, 7) << 6) | (_bits(h, 6, 6) << 7) |
+        (_bits(h, 5, 3) << 1) | (_bits(h, 2, 2) << 5), 12)
+
+    if funct3 == 0b000:
+        # c.addi / c.nop
+        return _i(OP_IMM, rd, 0b000, rd, imm6)
+    elif funct3 == 0b001:
+        # c.jal / c.addiw
+        if xlen == 32:
+            return _j(JAL, 1, jimm)
+        if not rd:
+            return ILLEGAL
+        return _i(OP_IMM_32, rd, 0b000, rd, imm6)
+    elif funct3 == 0b010:
+        # c.li
+        return _i(OP_IMM, rd, 0b000, 0, imm6)
+    elif funct3 == 0b011:
+        if rd == 2:
+            # c.addi16sp
+            nzimm = _sign_extend(
+                (_bits(h, 12, 12) << 9) | (_bits(h, 6, 6) << 4) | (_bits(h, 5, 5) << 6) |
+                (_bits(h, 4, 3) << 7) | (_bits(h, 2, 2) << 5), 10)
+            if not nzimm:
+                return ILLEGAL
+            return _i(OP_IMM, 2, 0b000, 2, nzimm)
+        # c.lui
+        nzimm = _sign_extend((_bits(h, 12, 12) << 17) | (_bits(h, 6, 2) << 12), 18)
+        if not nzimm:
+            return ILLEGAL
+        return _u(LUI, rd, nzimm)
+    elif funct3 == 0b100:
+        rd = 8 + _bits(h, 9, 7)
+        rs2 = 8 + _bits(h, 4, 2)
+        funct2 = _bits(h, 11, 10)
+        if funct2 == 0b00 or funct2 == 0b01:
+            # c.srli / c.srai
+            shamt = _shamt(h, xlen)
+            if shamt is None:
+                return ILLEGAL
+            return _i(OP_IMM, rd, 0b101, rd, shamt | (funct2 << 10))
+        elif funct2 == 0b10:
+            # c.andi
+            return _i(OP_IMM, rd, 0b111, rd, imm6)
+        op = _bits(h, 6, 5)
+        if not _bits(h, 12, 12):
+            # c.sub / c.xor / c.or / c.and
+            funct3, funct7 = ((0b000, 0b0100000), (0b100, 0), (0b110, 0), (0b111, 0))[op]
+            return _r(OP, rd, funct3, rd, rs2, funct7)
+        if xlen == 32 or op >= 0b10:
+            return ILLEGAL
+        # c.subw / c.addw
+        return _r(OP_32, rd, 0b000, rd, rs2, 0b0100000 if op == 0b00 else 0)
+    elif funct3 == 0b101:
+        # c.j
+        return _j(JAL, 0, jimm)
+    else:
+        # c.beqz / c.bnez
+        rs1 = 8 + _bits(h, 9, 7)
+        bimm = _sign_extend(
+            (_bits(h, 12, 12) << 8) | (_bits(h, 11, 10) << 3) | (_bits(h, 6, 5) << 6) |
+            (_bits(h, 4, 3) << 1) | (_bits(h, 2, 2) << 5), 9)
+        return _b(BRANCH, funct3 & 0b001, rs1, 0, bimm)
+
+
+def _quadrant2(h, xlen):
+    funct3 = _bits(h, 15, 13)
+    rd = _bits(h, 11, 7)
+    rs2 = _bits(h, 6, 2)
+
+    uimm_w = (_bits(h, 12, 12) << 5) | (_bits(h, 6, 4) << 2) | (_bits(h, 3, 2) << 6)
+    uimm_d = (_bits(h, 12, 12) << 5) | (_bits(h, 6, 5) << 3) | (_bits(h, 4, 2) << 6)
+    uimm_q = (_bits(h, 12, 12) << 5) | (_bits(h, 6, 6) << 4) | (_bits(h, 5, 2) << 6)
+    suimm_w = (_bits(h, 12, 9) << 2) | (_bits(h, 8, 7) << 6)
+    suimm_d = (_bits(h, 12, 10) << 3) | (_bits(h, 9, 7) << 6)
+    suimm_q = (_bits(h, 12, 11) << 4) | (_bits(h, 10, 7) << 6)
+
+    if funct3 == 0b000:
+        # c.slli
+        shamt = _shamt(h, xlen)
+        if shamt is None:
+            return ILLEGAL
+        return _i(OP_IMM, rd, 0b001, rd, shamt)
+    elif funct3 == 0b001:
+        # c.fldsp / c.lqsp
+        if xlen == 128:
+            if not rd:
+                return ILLEGAL
+            return _i(MISC_MEM, rd, 0b010, 2, uimm_q)
+        return _i(LOAD_FP, rd, 0b011, 2, uimm_d)
+    elif funct3 == 0b010:
+        # c.lwsp
+        if not rd:
+            return ILLEGAL
+        return _i(LOAD, rd, 0b010, 2, uimm_w)
+    elif funct3 == 0b011:
+        # c.flwsp / c.ldsp
+        if xlen == 32:
+            return _i(LOAD_FP, rd, 0b010, 2, uimm_w)
+        if not rd:
+            return ILLEGAL
+        return _i(LOAD, rd, 0b011, 2, uimm_d)
+    elif funct3 == 0b100:
+        if not _bits(h, 12, 12):
+            if not rs2:
+                # c.jr
+                if not rd:
+                    return ILLEGAL
+                return _i(JALR, 0, 0b000, rd, 0)
+            # c.mv
+            return _r(OP, rd, 0b000, 0, rs2, 0)
+        if not rs2:
+            if not rd:
+                # c.ebreak
+                return _i(SYSTEM, 0, 0b000, 0, 1)
+            # c.jalr
+            return _i(JALR, 1, 0b000, rd, 0)
+        # c.add
+        return _r(OP, rd, 0b000, rd, rs2, 0)
+    elif funct3 == 0b101:
+        # c.fsdsp / c.sqsp
+        if xlen == 128:
+            return _s(STORE, 0b100, 2, rs2, suimm_q)
+        return _s(STORE_FP, 0b011, 2, rs2, suimm_d)
+    elif funct3 == 0b110:
+        # c.swsp
+        return _s(STORE, 0b010, 2, rs2, suimm_w)
+    else:
+        # c.fswsp / c.sdsp
+        if xlen == 32:
+            return _s(STORE_FP, 0b010, 2, rs2, suimm_w)
+        return _s(STORE, 0b011, 2, rs2, suimm_d)
+
+
+QUADRANTS = (_quadrant0, _quadrant1, _quadrant2)
+
+
+def expand(h, xlen):
+    # Canonical 32-bit encoding of the compressed instruction h, or ILLEGAL.
+    quadrant = h & 0b11
+    if quadrant == 0b11:
+        return ILLEGAL
+    return QUADRANTS[quadrant](h, xlen)
+
+
+_expansion_tables = {}
+
+
+def expansion_table(xlen):
+    # Built on first use, a 64K entry table per XLEN.
+    table = _expansion_tables.get(xlen)
+    if table is None:
+        table = _expansion_tables[xlen] = array(
+            "I", [expand(h, xlen) for h in range(1 << 16)])
+    return table